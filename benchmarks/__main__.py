@@ -0,0 +1,117 @@
+"""Run every benchmark, save the results as JSON and compare them with a baseline.
+
+Run with ``python -m benchmarks`` from the repository root. The run fails with exit status 1 when a metric
+is worse than the baseline by more than the tolerance. Only metrics that do not depend on the machine are
+compared: speedups and other ratios, and costs per KB, node or parse. The parser and the proxy are gated
+by their speed relative to a reference timed in the same run, the standard library's parser and direct
+upstream requests. Throughputs are recorded and printed, and compared too with ``--throughput``, which only
+makes sense against a baseline recorded on the same quiet machine. After an intended change in performance,
+record new numbers with ``python -m benchmarks --update-baseline``.
+"""
+
+import argparse
+import importlib
+import json
+import sys
+import time
+from pathlib import Path
+
+BENCHMARKS: tuple[str, ...] = (
+    "bench_tokenizer",
+    "bench_parser_memory",
+    "bench_allocations",
+    "bench_dom_memory",
+    "bench_selectors",
+    "bench_cookies",
+    "bench_proxy",
+)
+DIRECTORY: Path = Path(__file__).resolve().parent
+BASELINE: Path = DIRECTORY / "baseline.json"
+RESULTS: Path = DIRECTORY / "results.json"
+TOLERANCE: float = 0.3
+# Metrics with these suffixes are rates or gains; all others are costs such as bytes, where lower is better
+HIGHER_IS_BETTER: tuple[str, ...] = ("_per_s", "_speedup", "_ratio")
+# Absolute rates, which vary from one machine, or one moment, to the next
+THROUGHPUT: str = "_per_s"
+
+
+def run_benchmarks(names: tuple[str, ...]) -> dict[str, float]:
+    """Run the named benchmark modules and merge their metrics."""
+    results: dict[str, float] = {}
+    for name in names:
+        start = time.perf_counter()
+        metrics: dict[str, float] = importlib.import_module(f"benchmarks.{name}").run()
+        print(f"{name}: {len(metrics)} metrics in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+        results.update(metrics)
+    return results
+
+
+def regressions(
+    results: dict[str, float],
+    baseline: dict[str, float],
+    tolerance: float,
+    *,
+    throughput: bool = False,
+) -> list[str]:
+    """Describe every metric that is worse than its baseline by more than `tolerance`, as a fraction.
+
+    Throughputs are skipped unless `throughput` is set.
+    """
+    messages: list[str] = []
+    for name, expected in sorted(baseline.items()):
+        if name not in results or (name.endswith(THROUGHPUT) and not throughput):
+            continue
+        value: float = results[name]
+        # A zero baseline, like memory growth, allows a small absolute slack instead
+        allowed: float = tolerance * abs(expected) if expected else 1.0
+        worse_by: float = expected - value if name.endswith(HIGHER_IS_BETTER) else value - expected
+        if worse_by > allowed:
+            messages.append(f"{name}: {value:.2f} against a baseline of {expected:.2f}")
+    return messages
+
+
+def main() -> int:  # noqa: D103
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("benchmarks", nargs="*", help=f"benchmarks to run, all by default: {', '.join(BENCHMARKS)}")
+    parser.add_argument("--baseline", type=Path, default=BASELINE, help="baseline JSON to compare against")
+    parser.add_argument("--output", type=Path, default=RESULTS, help="where to save the results as JSON")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="allowed slowdown, as a fraction")
+    parser.add_argument("--throughput", action="store_true", help="compare throughputs with the baseline too")
+    parser.add_argument("--update-baseline", action="store_true", help="save the results as the new baseline")
+    args = parser.parse_args()
+    if unknown := set(args.benchmarks) - set(BENCHMARKS):
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    results: dict[str, float] = run_benchmarks(tuple(args.benchmarks) or BENCHMARKS)
+    args.output.write_text(json.dumps(results, indent=2, sort_keys=True) + "\n")
+    for name, value in sorted(results.items()):
+        print(f"{name}: {value:.2f}")
+
+    if args.update_baseline:
+        baseline: dict[str, float] = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+        args.baseline.write_text(json.dumps(baseline | results, indent=2, sort_keys=True) + "\n")
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    if not args.baseline.exists():
+        print(f"No baseline at {args.baseline}, run with --update-baseline to record one", file=sys.stderr)
+        return 0
+
+    failures: list[str] = regressions(
+        results,
+        json.loads(args.baseline.read_text()),
+        args.tolerance,
+        throughput=args.throughput,
+    )
+    if failures:
+        print(f"\n{len(failures)} benchmark regressions beyond {args.tolerance:.0%}:", file=sys.stderr)
+        for failure in failures:
+            print(f"  {failure}", file=sys.stderr)
+        return 1
+
+    print(f"\nNo regressions beyond {args.tolerance:.0%} of {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
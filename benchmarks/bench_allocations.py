@@ -0,0 +1,68 @@
+"""Measure the tokenizer's allocation peak per KB of input.
+
+Tokens are handed to a tree constructor that counts them and builds nothing, so nothing the tokenizer
+allocates outlives the token it belongs to. The tracemalloc peak then measures the memory the tokenizer
+works in: the tokens, names, attribute values and text runs it builds, including copies made while
+growing them, which a measure of the memory still held after tokenizing would miss.
+
+Run with ``python -m benchmarks.bench_allocations``.
+"""
+
+import tracemalloc
+
+from htmlparser_types import ParserState, Token
+from tokenizer import Tokenizer
+from treeconstructor import TreeConstructor
+
+from benchmarks.corpus import attribute_heavy_page, text_heavy_page
+
+SIZE: int = 100 * 1024
+
+
+class CountingTreeConstructor(TreeConstructor):
+    """Count the tokens received, without keeping them or building anything from them."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.tokens: int = 0
+
+    def process(self, token: Token) -> None:  # noqa: ARG002
+        """Count the token."""
+        self.tokens += 1
+
+
+def traced_tokenize(html: str) -> tuple[int, int]:
+    """Tokenize a page under tracemalloc, returning the peak bytes allocated above the start and the token count.
+
+    The page is tokenized once untraced first, so the names it interns are already in the interpreter's
+    table and a resize of that table is not counted against the tokenizer.
+    """
+    warm_up = Tokenizer(ParserState(), TreeConstructor())
+    warm_up.tokenize(html)
+    warm_up.end()
+    sink = CountingTreeConstructor()
+    tokenizer = Tokenizer(ParserState(), sink)
+    tracemalloc.start()
+    start, _ = tracemalloc.get_traced_memory()
+    tokenizer.tokenize(html)
+    tokenizer.end()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak - start, sink.tokens
+
+
+def run(size: int = SIZE) -> dict[str, float]:
+    """Return the peak bytes allocated and the tokens emitted per KB of input for each page kind."""
+    results: dict[str, float] = {}
+    for name, page in (("text_heavy", text_heavy_page), ("attribute_heavy", attribute_heavy_page)):
+        html = page(size)
+        kb = len(html) / 1024
+        peak, tokens = traced_tokenize(html)
+        results[f"alloc_{name}_peak_bytes_per_kb"] = peak / kb
+        results[f"alloc_{name}_tokens_per_kb"] = tokens / kb
+    return results
+
+
+if __name__ == "__main__":
+    for name, value in run().items():
+        print(f"{name}: {value:.1f}")
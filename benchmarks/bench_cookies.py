@@ -0,0 +1,122 @@
+"""Time CookieStorage with 10k cookies spread over 500 domains.
+
+Building request headers is compared with a scan of every cookie in a flat list, the way the jar worked
+before it was indexed by domain and path. The cookies are also saved to SQLite, and the first request after
+a restart, which reads only its own domain back in, is compared with reading every domain in.
+
+Run with ``python -m benchmarks.bench_cookies``.
+"""
+
+import tempfile
+import time
+from pathlib import Path
+
+from cookie_store import PersistentCookieStore, SQLiteBackend
+from cookies import Cookie, CookieStorage, domain_matches, registrable_domain, split_request_url
+
+COOKIES: int = 10_000
+SITES: int = 500
+LOOKUPS: int = 500
+
+
+def set_cookie_headers(count: int = COOKIES, sites: int = SITES) -> dict[str, list[tuple[str, str]]]:
+    """Return the Set-Cookie response headers of `count` cookies spread evenly over `sites` sites, by URL."""
+    headers: dict[str, list[tuple[str, str]]] = {}
+    for n in range(count):
+        site: int = n % sites
+        value: str = (
+            f"c{n}=value-{n:08x}; Path=/section{n % 7}; Domain=site{site}.example; "
+            "Expires=Sun, 09 Aug 2037 18:56:14 GMT; Secure; SameSite=Lax"
+        )
+        if n % 5 == 0:
+            value += "; HttpOnly"
+        headers.setdefault(f"https://www.site{site}.example/section{n % 7}/page", []).append(("Set-Cookie", value))
+    return headers
+
+
+def flat_cookie_string(cookies: list[Cookie], request_url: str) -> str:
+    """Build the Cookie header of a request by testing every cookie, as a flat list of cookies has to."""
+    host, request_path, secure = split_request_url(request_url)
+    return "; ".join(
+        f"{cookie.name}={cookie.value}"
+        for cookie in sorted(cookies, key=lambda cookie: (-len(cookie.path), cookie.creation_time))
+        if domain_matches(host, cookie.domain)
+        and (request_path == cookie.path or request_path.startswith(cookie.path.rstrip("/") + "/"))
+        and (secure or not cookie.secure)
+    )
+
+
+def time_persistence(headers: dict[str, list[tuple[str, str]]], count: int) -> dict[str, float]:
+    """Save every cookie to SQLite, then time the first request of a restarted jar and reading in every domain."""
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / "cookies.sqlite"
+        backend = SQLiteBackend(path)
+        storage = CookieStorage(max_cookies=count, persistent_store=PersistentCookieStore(backend))
+        start = time.perf_counter()
+        for url, response_headers in headers.items():
+            storage.handle_headers(headers=response_headers, request_host=url)
+        storage.flush()
+        saved = time.perf_counter() - start
+        backend.close()
+
+        url: str = next(iter(headers))
+        backend = SQLiteBackend(path)
+        start = time.perf_counter()
+        CookieStorage(max_cookies=count, persistent_store=PersistentCookieStore(backend)).to_headers(url)
+        first_request = time.perf_counter() - start
+        backend.close()
+
+        backend = SQLiteBackend(path)
+        restarted = CookieStorage(max_cookies=count, persistent_store=PersistentCookieStore(backend))
+        start = time.perf_counter()
+        for domain in {registrable_domain(split_request_url(url)[0]) for url in headers}:
+            restarted.load(domain)
+        loaded_all = time.perf_counter() - start
+        backend.close()
+
+    return {
+        "cookies_saved_per_s": count / saved,
+        "cookies_restart_first_request_per_s": 1 / first_request,
+        "cookies_lazy_load_speedup": loaded_all / first_request,
+    }
+
+
+def run(count: int = COOKIES) -> dict[str, float]:
+    """Return Set-Cookie headers handled, request headers built and cookies looked up per second."""
+    headers = set_cookie_headers(count)
+    urls: list[str] = list(headers)
+    storage = CookieStorage(max_cookies=count)
+    start = time.perf_counter()
+    for url, response_headers in headers.items():
+        storage.handle_headers(headers=response_headers, request_host=url)
+    handled = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for n in range(LOOKUPS):
+        storage.to_headers(urls[n * len(urls) // LOOKUPS])
+    built = time.perf_counter() - start
+
+    cookies: list[Cookie] = storage.cookies
+    flat_lookups: int = LOOKUPS // 10
+    start = time.perf_counter()
+    for n in range(flat_lookups):
+        flat_cookie_string(cookies, urls[n * len(urls) // flat_lookups])
+    flat_built = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for n in range(LOOKUPS):
+        storage[f"c{n * count // LOOKUPS}"]
+    looked_up = time.perf_counter() - start
+
+    return {
+        "cookies_set_cookie_per_s": count / handled,
+        "cookies_request_headers_per_s": LOOKUPS / built,
+        "cookies_flat_request_headers_per_s": flat_lookups / flat_built,
+        "cookies_request_headers_speedup": (LOOKUPS / built) / (flat_lookups / flat_built),
+        "cookies_lookups_per_s": LOOKUPS / looked_up,
+    } | time_persistence(headers, count)
+
+
+if __name__ == "__main__":
+    for name, value in run().items():
+        print(f"{name}: {value:.1f}")
@@ -0,0 +1,45 @@
+"""Compare the memory held per node by Document and CompactDocument on a large page.
+
+Run with ``python -m benchmarks.bench_dom_memory``.
+"""
+
+import gc
+import tracemalloc
+
+from _htmlparser import parse_html
+
+from benchmarks.corpus import attribute_heavy_page
+
+SIZE: int = 1024 * 1024
+
+
+def retained_bytes(html: str, *, compact: bool) -> tuple[int, int]:
+    """Parse a page and return the traced bytes its document keeps alive, with its node count."""
+    gc.collect()
+    tracemalloc.start()
+    start, _ = tracemalloc.get_traced_memory()
+    document = parse_html(html, compact=compact)
+    gc.collect()
+    end, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    nodes = sum(1 for node in document.traverse() if node.is_element)
+    return end - start, nodes
+
+
+def run(size: int = SIZE) -> dict[str, float]:
+    """Return the bytes per node of both document representations and how many times smaller the compact one is."""
+    html = attribute_heavy_page(size)
+    tree_bytes, nodes = retained_bytes(html, compact=False)
+    compact_bytes, _ = retained_bytes(html, compact=True)
+
+    return {
+        "dom_tree_bytes_per_node": tree_bytes / nodes,
+        "dom_compact_bytes_per_node": compact_bytes / nodes,
+        "dom_compact_memory_ratio": tree_bytes / compact_bytes,
+    }
+
+
+if __name__ == "__main__":
+    for name, value in run().items():
+        print(f"{name}: {value:.1f}")
@@ -0,0 +1,41 @@
+"""Check that memory stays flat across many sequential parses.
+
+Run with ``python -m benchmarks.bench_parser_memory``.
+"""
+
+import gc
+import tracemalloc
+
+from _htmlparser import parse_html
+
+from benchmarks.corpus import text_heavy_page
+
+PARSES: int = 1000
+SIZE: int = 10 * 1024
+WARMUP: int = 10
+
+
+def run(parses: int = PARSES) -> dict[str, float]:
+    """Parse the same page `parses` times, returning the traced memory left behind per parse in bytes."""
+    html = text_heavy_page(SIZE)
+    for _ in range(WARMUP):
+        parse_html(html)
+
+    gc.collect()
+    tracemalloc.start()
+    start, _ = tracemalloc.get_traced_memory()
+    for _ in range(parses):
+        parse_html(html)
+    gc.collect()
+    end, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "parse_memory_growth_bytes_per_parse": (end - start) / parses,
+        "parse_memory_peak_kb": (peak - start) / 1024,
+    }
+
+
+if __name__ == "__main__":
+    for name, value in run().items():
+        print(f"{name}: {value:.1f}")
@@ -0,0 +1,127 @@
+"""Time the /webpage/ endpoint against a local aiohttp stand-in for the upstream site.
+
+Besides the throughputs, which depend on the machine, two ratios are measured in the same run: requests
+through the proxy against the same requests sent straight upstream with aiohttp, and cached requests
+against uncached ones.
+
+Run with ``python -m benchmarks.bench_proxy`` from the repository root.
+"""
+
+import asyncio
+import time
+from collections.abc import Awaitable, Callable
+
+import aiohttp
+import httpx
+from aiohttp import web
+
+import main
+from benchmarks.corpus import text_heavy_page
+
+REQUESTS: int = 200
+# Each rate is the best of this many rounds, taken in turns so a slow moment does not skew one ratio
+ROUNDS: int = 3
+CONCURRENCY: int = 20
+PAGE_SIZE: int = 100 * 1024
+
+
+async def start_upstream() -> tuple[web.AppRunner, str]:
+    """Start the stand-in server, returning its runner and origin."""
+    page: str = text_heavy_page(PAGE_SIZE)
+
+    async def uncached(_: web.Request) -> web.Response:
+        # Served under any path, so concurrent requests can each ask for a page of their own
+        return web.Response(text=page, content_type="text/html", headers={"Cache-Control": "no-store"})
+
+    async def cached(_: web.Request) -> web.Response:
+        return web.Response(text=page, content_type="text/html", headers={"Cache-Control": "max-age=3600"})
+
+    upstream = web.Application()
+    upstream.router.add_get("/uncached/{page}", uncached)
+    upstream.router.add_get("/cached", cached)
+    runner = web.AppRunner(upstream, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port: int = site._server.sockets[0].getsockname()[1]  # noqa: SLF001
+    return runner, f"http://127.0.0.1:{port}"
+
+
+async def requests_per_second(fetch: Callable[[int], Awaitable[None]], concurrency: int) -> float:
+    """Make `REQUESTS` requests, numbered from 0, with `fetch`, `concurrency` at a time."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def limited(number: int) -> None:
+        async with semaphore:
+            await fetch(number)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(limited(number) for number in range(REQUESTS)))
+    return REQUESTS / (time.perf_counter() - start)
+
+
+def through_proxy(client: httpx.AsyncClient, target: Callable[[int], str]) -> Callable[[int], Awaitable[None]]:
+    """Return a fetch that asks the proxy for the page `target` names for each request number."""
+
+    async def fetch(number: int) -> None:
+        resp = await client.post("/webpage/", json={"target": target(number), "headers": {}})
+        resp.raise_for_status()
+
+    return fetch
+
+
+def direct(session: aiohttp.ClientSession, target: Callable[[int], str]) -> Callable[[int], Awaitable[None]]:
+    """Return a fetch that reads the page `target` names for each request number straight from upstream."""
+
+    async def fetch(number: int) -> None:
+        async with session.get(target(number)) as resp:
+            resp.raise_for_status()
+            await resp.read()
+
+    return fetch
+
+
+async def measure() -> dict[str, float]:
+    """Run the proxy app in process and measure it against the stand-in server."""
+    runner, origin = await start_upstream()
+
+    def page(number: int) -> str:
+        return f"{origin}/uncached/{number}"
+
+    def same_page(_: int) -> str:
+        return f"{origin}/cached"
+
+    rates: dict[str, list[float]] = {"direct": [], "uncached": [], "concurrent": [], "cached": []}
+    try:
+        async with main.lifespan(main.app), aiohttp.ClientSession() as session:
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+                for _ in range(ROUNDS):
+                    rates["direct"].append(await requests_per_second(direct(session, page), 1))
+                    rates["uncached"].append(await requests_per_second(through_proxy(client, page), 1))
+                    rates["concurrent"].append(await requests_per_second(through_proxy(client, page), CONCURRENCY))
+                    rates["cached"].append(await requests_per_second(through_proxy(client, same_page), 1))
+    finally:
+        await runner.cleanup()
+
+    direct_rate, uncached, concurrent, cached = (max(rates[name]) for name in rates)
+    return {
+        "proxy_uncached_requests_per_s": uncached,
+        "proxy_uncached_concurrent_requests_per_s": concurrent,
+        "proxy_cached_requests_per_s": cached,
+        "proxy_uncached_direct_ratio": uncached / direct_rate,
+        "proxy_cached_speedup": cached / uncached,
+    }
+
+
+def run() -> dict[str, float]:
+    """Return requests per second through /webpage/ for uncached, concurrent uncached and cached pages, and ratios.
+
+    Uncached requests each ask for a different page, so concurrent ones are not coalesced into one fetch.
+    """
+    return asyncio.run(measure())
+
+
+if __name__ == "__main__":
+    for name, value in run().items():
+        print(f"{name}: {value:.1f}")
@@ -0,0 +1,59 @@
+"""Compare query_selector_all with testing a freshly compiled selector against every element.
+
+Run with ``python -m benchmarks.bench_selectors``.
+"""
+
+import time
+
+from _htmlparser import parse_html
+from css_selectors import compile_selector, iter_elements
+
+from benchmarks.corpus import attribute_heavy_page, text_heavy_page
+
+SIZE: int = 256 * 1024
+REPEAT: int = 5
+SELECTORS: dict[str, str] = {
+    "class": "a.internal",
+    "descendant_attr": "body a[href^='/wiki']",
+    "child": "body > p",
+    "id": "#missing",
+}
+
+
+def naive_select(document: object, selector: str) -> list:
+    """Walk every element and test it with a selector compiled for this query alone."""
+    compiled = compile_selector.__wrapped__(selector)
+    return [el for el in iter_elements(document) if compiled.matches(el)]
+
+
+def best_time(query: object) -> float:
+    """Return the fastest of `REPEAT` runs of a query, in seconds."""
+    times: list[float] = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        query()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def run(size: int = SIZE) -> dict[str, float]:
+    """Return queries per second for each selector both ways, and the speedup of query_selector_all."""
+    document = parse_html(attribute_heavy_page(size // 2) + text_heavy_page(size // 2))
+    results: dict[str, float] = {}
+    for name, selector in SELECTORS.items():
+        expected = naive_select(document, selector)
+        if document.query_selector_all(selector) != expected:
+            msg = f"query_selector_all disagrees with naive traversal on {selector!r}"
+            raise AssertionError(msg)
+
+        indexed = best_time(lambda selector=selector: document.query_selector_all(selector))
+        naive = best_time(lambda selector=selector: naive_select(document, selector))
+        results[f"selector_{name}_queries_per_s"] = 1 / indexed
+        results[f"selector_{name}_naive_queries_per_s"] = 1 / naive
+        results[f"selector_{name}_speedup"] = naive / indexed
+    return results
+
+
+if __name__ == "__main__":
+    for name, value in run().items():
+        print(f"{name}: {value:.1f}")
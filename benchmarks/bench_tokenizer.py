@@ -0,0 +1,94 @@
+"""Time parse_html on small, 100 KB and 5 MB synthetic pages and on recorded pages.
+
+The synthetic pages are text heavy, attribute heavy, or shaped like a real article, see `benchmarks.corpus`.
+Throughputs depend on the machine, so each 100 KB synthetic page is also timed with the standard library's
+``html.parser`` in the same run, and parse_html's speed is given as a ratio to it.
+
+Run with ``python -m benchmarks.bench_tokenizer``.
+"""
+
+import gc
+import os
+import sys
+import time
+from collections.abc import Callable
+from html.parser import HTMLParser
+
+from _htmlparser import parse_html
+
+from benchmarks.corpus import PAGES_VARIABLE, article_page, attribute_heavy_page, recorded_pages, text_heavy_page
+
+SIZES: dict[str, int] = {"small": 2 * 1024, "100kb": 100 * 1024, "5mb": 5 * 1024 * 1024}
+REPEAT: int = 5
+# Pages at least this large are parsed once, as one parse already takes seconds
+REPEAT_ONCE_SIZE: int = 1024 * 1024
+
+
+# Pages timed against the reference parser as well, and how many times each
+REFERENCE_SIZE: str = "100kb"
+REFERENCE_REPEAT: int = 15
+
+
+def best_parse_time(html: str, repeat: int = REPEAT) -> float:
+    """Return the fastest of `repeat` parses of `html`, in seconds."""
+    timings: list[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parse_html(html)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def best_parse_times(html: str, parsers: tuple[Callable[[str], object], ...], repeat: int) -> list[float]:
+    """Return the fastest of `repeat` parses of `html` with each parser, in seconds.
+
+    The parsers take turns, so a slow moment of the machine weighs on all of them alike, and the garbage
+    collector is paused while they run, as `timeit` does, since its pauses land on whichever parse is running.
+    """
+    timings: list[list[float]] = [[] for _ in parsers]
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            for parse, parser_timings in zip(parsers, timings, strict=True):
+                start = time.perf_counter()
+                parse(html)
+                parser_timings.append(time.perf_counter() - start)
+    finally:
+        gc.enable()
+    return [min(parser_timings) for parser_timings in timings]
+
+
+def reference_parse(html: str) -> None:
+    """Tokenize `html` with the standard library's parser, which builds no tree."""
+    parser = HTMLParser()
+    parser.feed(html)
+    parser.close()
+
+
+def run() -> dict[str, float]:
+    """Return parse throughput in KB per second for each synthetic and recorded page, and the reference ratios."""
+    pages: dict[str, str] = {}
+    for size_name, size in SIZES.items():
+        pages[f"text_heavy_{size_name}"] = text_heavy_page(size)
+        pages[f"attribute_heavy_{size_name}"] = attribute_heavy_page(size)
+        pages[f"article_{size_name}"] = article_page(size)
+    pages.update((f"recorded_{name}", html) for name, html in recorded_pages().items())
+    if not os.environ.get(PAGES_VARIABLE):
+        print(f"Set {PAGES_VARIABLE} to a directory of saved pages to benchmark real sites", file=sys.stderr)
+
+    results: dict[str, float] = {
+        f"parse_{name}_kb_per_s": len(html)
+        / 1024
+        / best_parse_time(html, 1 if len(html) >= REPEAT_ONCE_SIZE else REPEAT)
+        for name, html in pages.items()
+    }
+    for name, html in pages.items():
+        if name.endswith(REFERENCE_SIZE) and not name.startswith("recorded_"):
+            own_time, reference_time = best_parse_times(html, (parse_html, reference_parse), REFERENCE_REPEAT)
+            results[f"parse_{name}_stdlib_ratio"] = reference_time / own_time
+    return results
+
+
+if __name__ == "__main__":
+    for name, value in run().items():
+        print(f"{name}: {value:.1f}")
@@ -0,0 +1,67 @@
+"""HTML pages used by the benchmarks: synthetic ones of any size and recorded ones read from disk.
+
+No real sites are checked in. Recorded pages are the app shell, index.html, plus every ``.html`` file in
+the directory named by the ``PYBROWSER_BENCH_PAGES`` environment variable, so saved copies of real sites
+can be benchmarked without checking them in. Without that variable only the app shell is recorded, and
+the synthetic article pages stand in for real sites: they mix the markup real pages are made of.
+"""
+
+import os
+from pathlib import Path
+
+ROOT: Path = Path(__file__).resolve().parent.parent
+PAGES_VARIABLE: str = "PYBROWSER_BENCH_PAGES"
+
+PARAGRAPH = (
+    "<p>Pack my box with five dozen liquor jugs. The quick brown fox jumps over the lazy dog, "
+    "while sphinx of black quartz judges my vow.</p>\n"
+)
+LINK = '<a href="/wiki/page" class="link internal" title="A page" data-id="42">page</a>\n'
+ARTICLE_HEAD = (
+    '<!DOCTYPE html>\n<html lang="en"><head><meta charset="utf-8"><title>Article &amp; notes</title>\n'
+    '<link rel="stylesheet" href="/static/site.css">\n'
+    "<style>.nav li { display: inline; } p > a { color: red; }</style>\n"
+    '<script>window.dataLayer = window.dataLayer || []; if (window.ga) { track("view"); }</script>\n'
+    '</head><body class="article">\n<nav id="top"><ul class="nav"><li><a href="/">Home</a></li>'
+    '<li><a href="/news">News</a></li><li><a href="/about">About</a></li></ul></nav>\n<main>\n'
+)
+ARTICLE_SECTION = (
+    '<section class="content"><h2 id="part">Part</h2>\n'
+    '<p>Pack my box with <b>five dozen</b> liquor jugs &mdash; the <a href="/wiki/fox" title="Fox">quick '
+    "brown fox</a> jumps over the <i>lazy</i> dog.<br>\nSphinx of black quartz, judge my vow.</p>\n"
+    '<table class="data"><tr><th>Name</th><th>Value</th></tr><tr><td>alpha</td><td>1</td></tr>'
+    '<tr><td>beta</td><td>2</td></tr></table>\n<img src="/img/figure.png" alt="A figure" width="320" height="200">\n'
+    "<ul><li>One<li>Two<li>Three</ul>\n</section>\n"
+)
+ARTICLE_FOOT = (
+    '</main>\n<footer><p>&copy; Example</p></footer>\n<script src="/static/app.js" defer></script>\n</body></html>'
+)
+
+
+def text_heavy_page(size: int) -> str:
+    """Return a page of roughly `size` characters, mostly paragraph text."""
+    head = "<html><head><title>Text</title></head><body>\n"
+    return head + PARAGRAPH * max(1, (size - len(head)) // len(PARAGRAPH)) + "</body></html>"
+
+
+def attribute_heavy_page(size: int) -> str:
+    """Return a page of roughly `size` characters, mostly links carrying several attributes."""
+    head = "<html><head><title>Links</title></head><body>\n"
+    return head + LINK * max(1, (size - len(head)) // len(LINK)) + "</body></html>"
+
+
+def article_page(size: int) -> str:
+    """Return a page of roughly `size` characters shaped like a real article.
+
+    It mixes head scripts and styles, navigation, entities, tables, images and implied end tags.
+    """
+    body_size: int = size - len(ARTICLE_HEAD) - len(ARTICLE_FOOT)
+    return ARTICLE_HEAD + ARTICLE_SECTION * max(1, body_size // len(ARTICLE_SECTION)) + ARTICLE_FOOT
+
+
+def recorded_pages() -> dict[str, str]:
+    """Return recorded pages by file stem."""
+    paths: list[Path] = [ROOT / "index.html"]
+    if directory := os.environ.get(PAGES_VARIABLE):
+        paths.extend(sorted(Path(directory).glob("*.html")))
+    return {path.stem: path.read_text(encoding="utf-8", errors="replace") for path in paths}
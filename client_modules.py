@@ -0,0 +1,32 @@
+# Runs the browser's Python modules from static/python on the server, the way PyScript runs them in the browser.
+import importlib
+import sys
+from pathlib import Path
+from types import ModuleType
+from typing import Any
+
+CLIENT_PATH: Path = Path(__file__).parent / "static" / "python"
+
+# The worker module loaded in the current child process
+worker_module: ModuleType | None = None
+
+
+def add_client_path() -> None:
+    """Make the client modules importable by bare name, the way PyScript loads them, after the server's own."""
+    if str(CLIENT_PATH) not in sys.path:
+        sys.path.append(str(CLIENT_PATH))
+
+
+def load_worker(module: str, path: str) -> None:
+    """Import a worker module in a child process, with the client modules importable by bare name."""
+    global worker_module  # noqa: PLW0603
+    if path not in sys.path:
+        sys.path.insert(0, path)
+    worker_module = importlib.import_module(module)
+
+
+def call_export(name: str, *args: Any) -> Any:  # noqa: ANN401
+    """Call a function the worker module exports."""
+    if worker_module is None or name not in worker_module.__export__:
+        raise AttributeError(name)
+    return getattr(worker_module, name)(*args)
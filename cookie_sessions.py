@@ -0,0 +1,166 @@
+# Keeps the cookies of browser sessions in the proxy, using the client's own cookie jar.
+import secrets
+from collections import OrderedDict
+from collections.abc import Callable, Iterator, Mapping
+from contextlib import contextmanager
+from contextvars import ContextVar
+from http.cookies import BaseCookie, CookieError, Morsel, SimpleCookie
+from types import MappingProxyType
+
+from aiohttp.abc import AbstractCookieJar, ClearCookiePredicate
+from aiohttp.typedefs import LooseCookies
+from yarl import URL
+
+from client_modules import add_client_path
+
+add_client_path()
+
+from cookies import Cookie, CookieStorage, domain_matches  # noqa: E402
+
+MAX_SESSIONS: int = 256
+
+# The session whose cookies upstream requests made in the current task send and store
+current_session: ContextVar[str | None] = ContextVar("current_session", default=None)
+
+
+class UnknownSessionError(KeyError):
+    """A session id that `SessionCookieJar.start_session` did not issue, or whose jar has been dropped."""
+
+
+def to_morsel(cookie: Cookie) -> "Morsel[str]":
+    """Convert a cookie to the Morsel aiohttp's cookie jar API deals in."""
+    morsel: Morsel[str] = Morsel()
+    morsel.set(cookie.name, cookie.value, cookie.value)
+    morsel["domain"] = cookie.domain
+    morsel["path"] = cookie.path
+    morsel["secure"] = cookie.secure
+    morsel["httponly"] = cookie.http_only
+    return morsel
+
+
+class SessionCookieJar(AbstractCookieJar):
+    """The cookie jar of the shared upstream session, keeping a separate `CookieStorage` per browser session.
+
+    Requests made inside `session` send and store the cookies of that session's jar, including the Set-Cookie
+    headers of redirects along the way. Requests made outside any session send no cookies and store none, so
+    one browser never sees another's cookies. Only sessions issued by `start_session` have a jar, so ids
+    made up by a client are refused, and the least recently used jar is dropped, with its id, once there are
+    more than `max_sessions`.
+    """
+
+    def __init__(self, max_sessions: int = MAX_SESSIONS) -> None:
+        super().__init__()
+        self.max_sessions: int = max_sessions
+        self.jars: OrderedDict[str, CookieStorage] = OrderedDict()
+
+    def start_session(self) -> str:
+        """Issue the id of a new session with an empty jar."""
+        session_id: str = secrets.token_urlsafe(16)
+        self.jars[session_id] = CookieStorage()
+        if len(self.jars) > self.max_sessions:
+            self.jars.popitem(last=False)
+        return session_id
+
+    def jar(self, session_id: str) -> CookieStorage:
+        """Return the jar of an issued session, raising UnknownSessionError for any other id."""
+        if (jar := self.jars.get(session_id)) is None:
+            raise UnknownSessionError(session_id)
+        self.jars.move_to_end(session_id)
+        return jar
+
+    @contextmanager
+    def session(self, session_id: str | None) -> Iterator[None]:
+        """Use the jar of `session_id` for the upstream requests made inside the block, or none without an id."""
+        token = current_session.set(session_id)
+        try:
+            yield
+        finally:
+            current_session.reset(token)
+
+    @property
+    def current(self) -> CookieStorage | None:
+        """The jar of the session upstream requests are being made for, if any.
+
+        A session dropped while its requests were in flight has none, so they send and store no cookies.
+        """
+        session_id: str | None = current_session.get()
+        return None if session_id is None else self.jars.get(session_id)
+
+    @property
+    def unsafe(self) -> bool:
+        """Cookies are kept for IP addresses too, host-only as `CookieStorage` requires."""
+        return True
+
+    @property
+    def quote_cookie(self) -> bool:
+        """Cookie values are sent exactly as they were set."""
+        return False
+
+    @property
+    def cookies(self) -> MappingProxyType[tuple[str, str], SimpleCookie]:
+        """The cookies of the current session, by domain and path."""
+        cookies: dict[tuple[str, str], SimpleCookie] = {}
+        for morsel in self:
+            cookies.setdefault((morsel["domain"], morsel["path"]), SimpleCookie())[morsel.key] = morsel
+        return MappingProxyType(cookies)
+
+    @property
+    def host_only_cookies(self) -> frozenset[tuple[str, str, str]]:
+        """The (domain, path, name) keys of the current session's host-only cookies."""
+        jar: CookieStorage | None = self.current
+        return frozenset(cookie.key for cookie in jar.cookies if cookie.host_only) if jar is not None else frozenset()
+
+    def remove_where(self, test: Callable[[Cookie], bool]) -> None:
+        """Remove the cookies of the current session that pass `test`."""
+        if (jar := self.current) is not None:
+            for cookie in [cookie for cookie in jar.cookies if test(cookie)]:
+                jar.remove(cookie)
+
+    def clear(self, predicate: ClearCookiePredicate | None = None) -> None:
+        """Remove the current session's cookies, or only those whose Morsel `predicate` accepts."""
+        self.remove_where(lambda cookie: predicate is None or predicate(to_morsel(cookie)))
+
+    def clear_domain(self, domain: str) -> None:
+        """Remove the current session's cookies for `domain` and its subdomains."""
+        self.remove_where(lambda cookie: domain_matches(cookie.domain, domain))
+
+    def update_cookies(self, cookies: LooseCookies, response_url: URL = URL()) -> None:  # noqa: B008
+        """Store cookies set for `response_url` in the current session's jar."""
+        items = cookies.items() if isinstance(cookies, Mapping) else cookies
+        self.update_cookies_from_headers(
+            [value.OutputString() if isinstance(value, Morsel) else f"{name}={value}" for name, value in items],
+            response_url,
+        )
+
+    def update_cookies_from_headers(self, headers: list[str], response_url: URL) -> None:
+        """Store the cookies of a response's raw Set-Cookie headers in the current session's jar."""
+        if (jar := self.current) is not None and response_url.host:
+            jar.handle_headers([("Set-Cookie", header) for header in headers], str(response_url))
+
+    def filter_cookies(self, request_url: URL) -> "BaseCookie[str]":
+        """Return the current session's cookies to send with a request, most specific path first."""
+        filtered: SimpleCookie = SimpleCookie()
+        if (jar := self.current) is None:
+            return filtered
+
+        for cookie in jar.cookies_for(str(request_url)):
+            if cookie.name in filtered:
+                continue
+            morsel: Morsel[str] = Morsel()
+            try:
+                morsel.set(cookie.name, cookie.value, cookie.value)
+            except CookieError:
+                # A name SimpleCookie cannot hold, which aiohttp could not send either
+                continue
+            filtered[cookie.name] = morsel
+        return filtered
+
+    def __iter__(self) -> Iterator["Morsel[str]"]:
+        """Iterate over the current session's cookies."""
+        jar: CookieStorage | None = self.current
+        return iter([to_morsel(cookie) for cookie in jar.cookies] if jar is not None else [])
+
+    def __len__(self) -> int:
+        """Count the current session's cookies."""
+        jar: CookieStorage | None = self.current
+        return len(jar) if jar is not None else 0
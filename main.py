@@ -1,15 +1,185 @@
 import asyncio
-from typing import Annotated
+import hashlib
+import itertools
+import json
+import os
+import time
+from collections.abc import AsyncGenerator, AsyncIterator, Iterator
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, replace
+from datetime import UTC, datetime
+from email.utils import formatdate, parsedate_to_datetime
+from http import HTTPStatus
+from pathlib import Path
+from typing import Annotated, Self
 
 import aiohttp
 import uvicorn
-from fastapi import Body, FastAPI
+from fastapi import Body, FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
+from starlette.datastructures import State
+from starlette.types import ASGIApp
 
-app = FastAPI()
+from client_modules import CLIENT_PATH, call_export, load_worker
+from cookie_sessions import CookieStorage, SessionCookieJar, UnknownSessionError
+from proxy_cache import CachedPage, CacheKey, PrefetchStore, ResponseCache
+
+
+@dataclass(frozen=True)
+class ProxySettings:
+    """Server settings: the upstream pool, cookie sessions, page caches, compression, parsing and the app shell.
+
+    Every field can be overridden with a ``PYBROWSER_<FIELD>`` environment variable.
+    """
+
+    pool_limit: int = 100
+    pool_limit_per_host: int = 10
+    keepalive_timeout: float = 30.0
+    dns_cache_ttl: int = 300
+    stream_chunk_size: int = 64 * 1024
+    cache_max_entries: int = 256
+    cache_max_bytes: int = 64 * 1024 * 1024
+    cache_max_entry_bytes: int = 8 * 1024 * 1024
+    prefetch_concurrency: int = 4
+    prefetch_max_targets: int = 16
+    prefetch_max_entries: int = 64
+    prefetch_max_bytes: int = 32 * 1024 * 1024
+    prefetch_ttl: float = 300.0
+    cookie_sessions: int = 256
+    gzip_minimum_size: int = 1024
+    gzip_level: int = 6
+    parse_workers: int = 2
+    watch_index: bool = False
+
+    @classmethod
+    def from_env(cls) -> Self:
+        """Build settings from the environment, falling back to the defaults."""
+        return cls(
+            pool_limit=int(os.environ.get("PYBROWSER_POOL_LIMIT", cls.pool_limit)),
+            pool_limit_per_host=int(os.environ.get("PYBROWSER_POOL_LIMIT_PER_HOST", cls.pool_limit_per_host)),
+            keepalive_timeout=float(os.environ.get("PYBROWSER_KEEPALIVE_TIMEOUT", cls.keepalive_timeout)),
+            dns_cache_ttl=int(os.environ.get("PYBROWSER_DNS_CACHE_TTL", cls.dns_cache_ttl)),
+            stream_chunk_size=int(os.environ.get("PYBROWSER_STREAM_CHUNK_SIZE", cls.stream_chunk_size)),
+            cache_max_entries=int(os.environ.get("PYBROWSER_CACHE_MAX_ENTRIES", cls.cache_max_entries)),
+            cache_max_bytes=int(os.environ.get("PYBROWSER_CACHE_MAX_BYTES", cls.cache_max_bytes)),
+            cache_max_entry_bytes=int(os.environ.get("PYBROWSER_CACHE_MAX_ENTRY_BYTES", cls.cache_max_entry_bytes)),
+            prefetch_concurrency=int(os.environ.get("PYBROWSER_PREFETCH_CONCURRENCY", cls.prefetch_concurrency)),
+            prefetch_max_targets=int(os.environ.get("PYBROWSER_PREFETCH_MAX_TARGETS", cls.prefetch_max_targets)),
+            prefetch_max_entries=int(os.environ.get("PYBROWSER_PREFETCH_MAX_ENTRIES", cls.prefetch_max_entries)),
+            prefetch_max_bytes=int(os.environ.get("PYBROWSER_PREFETCH_MAX_BYTES", cls.prefetch_max_bytes)),
+            prefetch_ttl=float(os.environ.get("PYBROWSER_PREFETCH_TTL", cls.prefetch_ttl)),
+            cookie_sessions=int(os.environ.get("PYBROWSER_COOKIE_SESSIONS", cls.cookie_sessions)),
+            gzip_minimum_size=int(os.environ.get("PYBROWSER_GZIP_MINIMUM_SIZE", cls.gzip_minimum_size)),
+            gzip_level=int(os.environ.get("PYBROWSER_GZIP_LEVEL", cls.gzip_level)),
+            parse_workers=int(os.environ.get("PYBROWSER_PARSE_WORKERS", cls.parse_workers)),
+            watch_index=os.environ.get("PYBROWSER_WATCH_INDEX", str(int(cls.watch_index))) == "1",
+        )
+
+
+@dataclass
+class CachedFile:
+    """A file served from memory, with a strong ETag and Last-Modified derived from its contents and mtime."""
+
+    path: Path
+    body: bytes = b""
+    mtime_ns: int = -1
+    etag: str = ""
+    last_modified: str = ""
+
+    def refresh(self) -> Self:
+        """Re-read the file if its mtime changed since it was last loaded."""
+        stat = self.path.stat()
+        if stat.st_mtime_ns != self.mtime_ns:
+            self.body = self.path.read_bytes()
+            self.mtime_ns = stat.st_mtime_ns
+            self.etag = f'"{hashlib.sha256(self.body).hexdigest()[:32]}"'
+            self.last_modified = formatdate(stat.st_mtime, usegmt=True)
+        return self
+
+    def is_not_modified(self, request: Request) -> bool:
+        """Whether the request's validators match, so a 304 can be sent instead of the body (RFC 9110, section 13.1).
+
+        If-None-Match uses the weak comparison, so a ``W/`` tag matches the file's strong one, and takes precedence
+        over If-Modified-Since. An If-Modified-Since that is not a valid date is ignored.
+        """
+        if (if_none_match := request.headers.get("If-None-Match")) is not None:
+            tags: set[str] = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+            return "*" in tags or self.etag in tags
+
+        if (if_modified_since := request.headers.get("If-Modified-Since")) is not None:
+            try:
+                since: datetime = parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError):
+                return False
+            # HTTP dates are always in GMT, whether or not the value says so
+            return since.replace(tzinfo=since.tzinfo or UTC) >= parsedate_to_datetime(self.last_modified)
+
+        return False
+
+
+def create_client_session(settings: ProxySettings) -> aiohttp.ClientSession:
+    """Create the pooled upstream session shared by every proxied request.
+
+    Its cookie jar keeps the cookies of each browser session apart, and sends none for requests made without one.
+    """
+    connector = aiohttp.TCPConnector(
+        limit=settings.pool_limit,
+        limit_per_host=settings.pool_limit_per_host,
+        keepalive_timeout=settings.keepalive_timeout,
+        use_dns_cache=True,
+        ttl_dns_cache=settings.dns_cache_ttl,
+    )
+    return aiohttp.ClientSession(connector=connector, cookie_jar=SessionCookieJar(settings.cookie_sessions))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncGenerator[None]:
+    """Open the shared upstream session, page stores and parse pool on startup, close them on shutdown."""
+    settings = ProxySettings.from_env()
+    app.state.settings = settings
+    app.state.index_page = CachedFile(Path("index.html")).refresh()
+    app.state.http_session = create_client_session(settings)
+    app.state.cookie_jar = app.state.http_session.cookie_jar
+    app.state.response_cache = ResponseCache(
+        max_entries=settings.cache_max_entries,
+        max_bytes=settings.cache_max_bytes,
+        max_entry_bytes=settings.cache_max_entry_bytes,
+    )
+    app.state.prefetch_store = PrefetchStore(
+        max_entries=settings.prefetch_max_entries,
+        max_bytes=settings.prefetch_max_bytes,
+        ttl=settings.prefetch_ttl,
+    )
+    app.state.prefetch_semaphore = asyncio.Semaphore(settings.prefetch_concurrency)
+    app.state.inflight = {}
+    app.state.streams = {}
+    # Worker processes are started on the first parse request, each loading the client's parser once
+    app.state.parse_pool = ProcessPoolExecutor(
+        max_workers=settings.parse_workers,
+        initializer=load_worker,
+        initargs=("parse_worker", str(CLIENT_PATH)),
+    )
+    try:
+        yield
+    finally:
+        await app.state.http_session.close()
+        app.state.parse_pool.shutdown(cancel_futures=True)
+
+
+class ProxyGZipMiddleware(GZipMiddleware):
+    """GZipMiddleware configured from the environment when the app starts, like the rest of the settings."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        settings = ProxySettings.from_env()
+        super().__init__(app, minimum_size=settings.gzip_minimum_size, compresslevel=settings.gzip_level)
+
+
+app = FastAPI(lifespan=lifespan)
 app.mount("/static", StaticFiles(directory="static"))
 
 origins = [
@@ -25,13 +195,24 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Pages are sent to the front end gzipped when it accepts it. The browser inflates them natively
+# before Pyodide ever sees the bytes, and streamed responses are flushed chunk by chunk, which needs
+# Starlette 1.5 or later. Middleware is only built on startup, so the settings are read then.
+app.add_middleware(ProxyGZipMiddleware)
+
 
 @app.get("/", response_class=HTMLResponse)
-def read_root() -> HTMLResponse:  # noqa: D103
-    with open("index.html") as index_html:  # noqa: PTH123
-        data = index_html.read()
+def read_root(request: Request) -> Response:
+    """Serve the app shell from memory, answering matching validators with 304 Not Modified."""
+    index_page: CachedFile = request.app.state.index_page
+    if request.app.state.settings.watch_index:
+        index_page.refresh()
+
+    headers = {"ETag": index_page.etag, "Last-Modified": index_page.last_modified, "Cache-Control": "no-cache"}
+    if index_page.is_not_modified(request):
+        return Response(status_code=HTTPStatus.NOT_MODIFIED, headers=headers)
 
-    return HTMLResponse(data)
+    return HTMLResponse(index_page.body, headers=headers)
 
 
 class WebRequestPayload(BaseModel):
@@ -39,26 +220,468 @@ class WebRequestPayload(BaseModel):
 
     headers: dict[str, str]
     target: str
+    # Also parse the page on the server and return the tree in the compact form of Document.to_compact
+    parse: bool = False
+    # A cookie session from /session: the proxy sends and stores the page's cookies, and strips Set-Cookie
+    session: str | None = None
+
+
+def decode_headers(resp: aiohttp.ClientResponse) -> list[tuple[str, str]]:
+    """Return the raw upstream headers as text, keeping duplicates such as Set-Cookie."""
+    return [(name.decode("latin-1"), value.decode("latin-1")) for name, value in resp.raw_headers]
+
+
+def response_encoding(resp: aiohttp.ClientResponse) -> str:
+    """Return the encoding of an upstream response as `aiohttp.ClientResponse.get_encoding` resolves it.
+
+    Without a declared charset aiohttp guesses from the body, which a streamed response has not read yet,
+    so that falls back to UTF-8 as aiohttp's default resolver does.
+    """
+    try:
+        return resp.get_encoding()
+    except RuntimeError:
+        return "utf-8"
+
+
+def client_headers(headers: list[tuple[str, str]], session: str | None) -> list[tuple[str, str]]:
+    """Return the upstream headers to send to the front end, without Set-Cookie when the proxy keeps its cookies."""
+    if session is None:
+        return headers
+    return [(name, value) for name, value in headers if name.lower() != "set-cookie"]
+
+
+def session_jar(state: State, session: str) -> CookieStorage:
+    """Return the jar of a session started with POST /session, answering 404 for any other id."""
+    try:
+        return state.cookie_jar.jar(session)
+    except UnknownSessionError:
+        raise HTTPException(HTTPStatus.NOT_FOUND, "Unknown cookie session, start one with POST /session") from None
+
+
+def request_key(state: State, target: str, headers: dict[str, str], session: str | None) -> CacheKey:
+    """Build the cache key of a request, including the session and the cookies its jar will send.
+
+    Pages fetched for a session are never shared with another, so each jar sees the Set-Cookie headers of the
+    pages fetched for it. The pseudo-header names cannot clash with real ones.
+    """
+    if session is None:
+        return state.response_cache.key(target, headers)
+
+    cookies: str = session_jar(state, session).to_cookie_string(target, for_javascript=False)
+    return state.response_cache.key(target, headers | {":session": session, ":cookie": cookies})
+
+
+async def fetch_page(
+    state: State,
+    target: str,
+    headers: dict[str, str],
+    session: str | None = None,
+    *,
+    use_prefetched: bool = True,
+) -> CachedPage:
+    """Fetch a page through the response cache, coalescing concurrent requests for the same cache key.
+
+    The first request for a key starts the upstream fetch. Identical requests arriving while it is running
+    wait on the same task instead of starting their own. A prefetched copy answers the request only when
+    `use_prefetched` is set, since taking it uses it up.
+    """
+    cache: ResponseCache = state.response_cache
+    inflight: dict[CacheKey, asyncio.Task[CachedPage]] = state.inflight
+    key: CacheKey = request_key(state, target, headers, session)
+
+    if (stream := state.streams.get(key)) is not None:
+        # A streamed page may not keep its body, so it is read from the stream rather than the task's result
+        cache.stats.coalesced += 1
+        return await stream.read()
+    if (task := inflight.get(key)) is not None:
+        cache.stats.coalesced += 1
+    elif use_prefetched and (prefetched := state.prefetch_store.take(key)) is not None:
+        return prefetched
+    else:
+        fresh, stale = cache.lookup(key)
+        if fresh is not None:
+            return fresh
+
+        # The task runs in a copy of the current context, so its requests use the session's jar
+        with state.cookie_jar.session(session):
+            task = asyncio.create_task(fetch_upstream(state, key, target, headers, stale))
+        inflight[key] = task
+        task.add_done_callback(lambda _: inflight.pop(key, None))
+
+    # Shielded so a disconnecting client does not cancel the fetch for everyone else waiting on it
+    return await asyncio.shield(task)
+
+
+async def fetch_upstream(
+    state: State,
+    key: CacheKey,
+    target: str,
+    headers: dict[str, str],
+    stale: CachedPage | None,
+) -> CachedPage:
+    """Download a page and store it in the cache, revalidating a stale entry with a conditional request."""
+    cache: ResponseCache = state.response_cache
+    conditional: dict[str, str] = stale.conditional_headers() if stale is not None else {}
+    session: aiohttp.ClientSession = state.http_session
+    async with session.get(target, headers=headers | conditional) as resp:
+        if resp.status == HTTPStatus.NOT_MODIFIED and stale is not None:
+            return cache.revalidated(key, stale, resp.headers)
+
+        body: bytes = await resp.read()
+        page = CachedPage(
+            status=resp.status,
+            headers=decode_headers(resp),
+            final_url=str(resp.url),
+            encoding=response_encoding(resp),
+            body=body,
+        )
+        if page.update_policy(resp.headers, time.time()):
+            cache.store(key, page)
+
+    return page
+
+
+async def parse_page(pool: ProcessPoolExecutor, content: str) -> str:
+    """Parse a page with the client's own parser in a worker process, keeping the event loop free.
+
+    Returns the compact JSON of `Document.to_compact` exactly as the worker wrote it.
+    """
+    return await asyncio.get_running_loop().run_in_executor(pool, call_export, "parse", content)
 
 
 @app.post("/webpage/")
-async def get_website_html(payload: Annotated[WebRequestPayload, Body()]) -> dict:  # noqa: D103
-    headers: dict[str, str] = payload.headers
-    target: str = payload.target
-
-    async with aiohttp.ClientSession(headers=headers) as session, session.get(target) as resp:
-        html: str = await resp.text()
-        resp_headers = resp.raw_headers
-        final_url: str = str(resp.url)
-
-    return {
-        "content": html,
-        "headers": resp_headers,
+async def get_website_html(payload: Annotated[WebRequestPayload, Body()], request: Request) -> Response:
+    """Proxy a website, returning its content, or only its parsed tree in parse mode."""
+    page: CachedPage = await fetch_page(request.app.state, payload.target, payload.headers, payload.session)
+    content: str = page.body.decode(page.encoding or "utf-8", errors="replace")
+
+    data: dict = {
+        "headers": client_headers(page.headers, payload.session),
+        "final_url": page.final_url,
+    }
+    if not payload.parse:
+        # Returned directly to skip FastAPI's per-item response encoding
+        return JSONResponse(data | {"content": content})
+
+    # The tree replaces the content, and the worker's JSON is spliced in without being decoded and encoded again
+    document: str = await parse_page(request.app.state.parse_pool, content)
+    return Response(f'{json.dumps(data)[:-1]}, "document": {document}}}', media_type="application/json")
+
+
+class BatchRequestPayload(BaseModel):
+    """A request for several websites to be prefetched with the same headers."""
+
+    headers: dict[str, str]
+    targets: list[str]
+    session: str | None = None
+
+
+async def prefetch_page(state: State, target: str, headers: dict[str, str], session: str | None) -> str | int:
+    """Fetch one page into the prefetch store, returning its status or the error that stopped it."""
+    async with state.prefetch_semaphore:
+        try:
+            page: CachedPage = await fetch_page(state, target, headers, session, use_prefetched=False)
+        except (aiohttp.ClientError, TimeoutError, ValueError) as error:
+            return type(error).__name__
+
+    state.prefetch_store.put(request_key(state, target, headers, session), page)
+    return page.status
+
+
+@app.post("/webpage/batch")
+async def prefetch_websites(payload: Annotated[BatchRequestPayload, Body()], request: Request) -> dict:
+    """Fetch several websites concurrently so a later /webpage/ request for them is answered from memory."""
+    state: State = request.app.state
+    if payload.session is not None:
+        session_jar(state, payload.session)
+    targets: list[str] = list(dict.fromkeys(payload.targets))[: state.settings.prefetch_max_targets]
+    results = await asyncio.gather(
+        *(prefetch_page(state, target, payload.headers, payload.session) for target in targets),
+    )
+
+    return {"results": dict(zip(targets, results, strict=True))}
+
+
+@app.get("/webpage/cache/stats")
+async def get_cache_stats(request: Request) -> dict[str, int]:
+    """Report response cache hit, miss and revalidation counts."""
+    prefetch_store: PrefetchStore = request.app.state.prefetch_store
+    return request.app.state.response_cache.to_dict() | {
+        "prefetched": prefetch_store.stored,
+        "prefetch_hits": prefetch_store.hits,
+    }
+
+
+def page_meta(status: int, headers: list[tuple[str, str]], final_url: str, encoding: str | None) -> bytes:
+    """Encode the metadata line sent ahead of a streamed body.
+
+    The line holds ``status``, ``headers``, ``final_url`` and ``encoding``. JSON never contains a bare
+    newline, so everything after the first one is body.
+    """
+    meta = {
+        "status": status,
+        "headers": headers,
         "final_url": final_url,
+        "encoding": encoding,
     }
+    return json.dumps(meta).encode() + b"\n"
+
+
+async def stream_cached(page: CachedPage, chunk_size: int, session: str | None = None) -> AsyncIterator[bytes]:
+    """Yield the metadata line for a cached page, then its body in chunks."""
+    yield page_meta(page.status, client_headers(page.headers, session), page.final_url, page.encoding)
+
+    body = memoryview(page.body)
+    for start in range(0, len(body), chunk_size):
+        yield bytes(body[start : start + chunk_size])
+
+
+class PageStream:
+    """An upstream response read once and fanned out to every stream request for it that arrives meanwhile.
+
+    While the page may still be cached, every chunk is kept, so requests that join late replay it from the start
+    and the cache gets the whole body. Once it may not, the stream stops taking new followers and drops each chunk
+    as soon as every follower has sent it.
+    """
+
+    def __init__(self) -> None:
+        # The page without its body, once upstream has sent the headers
+        self.page: asyncio.Future[CachedPage] = asyncio.get_running_loop().create_future()
+        self.chunks: list[bytes] = []
+        # Index in the body of the first chunk still held
+        self.first: int = 0
+        self.keep: bool = True
+        # Index of the next chunk each follower sends, by follower id
+        self.followers: dict[int, int] = {}
+        self.follower_ids: Iterator[int] = itertools.count()
+        self.done: bool = False
+        self.error: BaseException | None = None
+        self.updated: asyncio.Event = asyncio.Event()
+
+    def join(self) -> int:
+        """Register a follower that sends the body from its start and return its id."""
+        follower: int = next(self.follower_ids)
+        self.followers[follower] = 0
+        return follower
+
+    def leave(self, follower: int) -> None:
+        """Unregister a follower, releasing the chunks only it still had to send."""
+        del self.followers[follower]
+        self.release()
+
+    def add(self, chunk: bytes) -> None:
+        """Pass a chunk of the body on to every follower."""
+        self.chunks.append(chunk)
+        self.notify()
+
+    def stop_keeping(self) -> None:
+        """Hold chunks only until every current follower has sent them, once the page is not going to be cached."""
+        self.keep = False
+        self.release()
+
+    def release(self) -> None:
+        """Drop the chunks every follower has sent, unless the whole body is being kept."""
+        if self.keep:
+            return
+        sent: int = min(self.followers.values(), default=self.first + len(self.chunks))
+        del self.chunks[: sent - self.first]
+        self.first = sent
+
+    def close(self, error: BaseException | None = None) -> None:
+        """Mark the body as complete, or cut short by `error`."""
+        self.done = True
+        self.error = error
+        if not self.page.done():
+            self.page.set_exception(error or ConnectionError("upstream closed before sending headers"))
+        self.notify()
+
+    def notify(self) -> None:
+        """Wake every follower waiting for more of the body."""
+        self.updated.set()
+        self.updated = asyncio.Event()
+
+    async def body(self, follower: int) -> AsyncIterator[bytes]:
+        """Yield the body for a follower as it arrives, unregistering the follower when done."""
+        try:
+            while True:
+                while (sent := self.followers[follower]) < self.first + len(self.chunks):
+                    yield self.chunks[sent - self.first]
+                    self.followers[follower] = sent + 1
+                    self.release()
+                if self.done:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                await self.updated.wait()
+        finally:
+            self.leave(follower)
+
+    async def follow(self, page: CachedPage, session: str | None, follower: int) -> AsyncIterator[bytes]:
+        """Yield the metadata line for the page, then its body as it arrives."""
+        yield page_meta(page.status, client_headers(page.headers, session), page.final_url, page.encoding)
+        async for chunk in self.body(follower):
+            yield chunk
+
+    async def headers(self, follower: int) -> CachedPage:
+        """Wait for the page headers on behalf of a follower, unregistering it if they never come."""
+        try:
+            # Shielded so a disconnecting client does not cancel the page for everyone else following it
+            return await asyncio.shield(self.page)
+        except BaseException:
+            self.leave(follower)
+            raise
+
+    async def read(self) -> CachedPage:
+        """Follow the stream to its end and return the whole page."""
+        follower: int = self.join()
+        page: CachedPage = await self.headers(follower)
+        return replace(page, body=b"".join([chunk async for chunk in self.body(follower)]))
+
+
+def forget_stream(state: State, key: CacheKey, stream: PageStream) -> None:
+    """Stop later requests for a page from joining its stream, if it is still the one registered."""
+    if state.streams.get(key) is stream:
+        del state.streams[key]
+        del state.inflight[key]
+
+
+async def stream_upstream(
+    state: State,
+    key: CacheKey,
+    payload: WebRequestPayload,
+    stale: CachedPage | None,
+    stream: PageStream,
+) -> CachedPage:
+    """Download the page of a request into `stream` as it arrives, then store it in the cache if it may be stored.
+
+    A stale entry is revalidated with a conditional request and sent whole when upstream answers 304. A page
+    that may not be stored, or outgrows the cache's entry limit, is passed on without being kept, and its
+    returned page has no body.
+    """
+    cache: ResponseCache = state.response_cache
+    chunk_size: int = state.settings.stream_chunk_size
+    conditional: dict[str, str] = stale.conditional_headers() if stale is not None else {}
+    session: aiohttp.ClientSession = state.http_session
+    try:
+        async with session.get(payload.target, headers=payload.headers | conditional) as resp:
+            if resp.status == HTTPStatus.NOT_MODIFIED and stale is not None:
+                page: CachedPage = cache.revalidated(key, stale, resp.headers)
+                stream.page.set_result(page)
+                body = memoryview(page.body)
+                for start in range(0, len(body), chunk_size):
+                    stream.add(bytes(body[start : start + chunk_size]))
+            else:
+                page = CachedPage(
+                    status=resp.status,
+                    headers=decode_headers(resp),
+                    final_url=str(resp.url),
+                    encoding=response_encoding(resp),
+                    body=b"",
+                )
+                stream.page.set_result(page)
+                if not page.update_policy(resp.headers, time.time()):
+                    forget_stream(state, key, stream)
+                    stream.stop_keeping()
+                size: int = 0
+                async for chunk in resp.content.iter_chunked(chunk_size):
+                    size += len(chunk)
+                    if stream.keep and size > cache.max_entry_bytes:
+                        forget_stream(state, key, stream)
+                        stream.stop_keeping()
+                    stream.add(chunk)
+                if stream.keep:
+                    page.body = b"".join(stream.chunks)
+                    cache.store(key, page)
+    except BaseException as error:
+        stream.close(error)
+        raise
+
+    stream.close()
+    return page
+
+
+def start_stream(state: State, key: CacheKey, payload: WebRequestPayload, stale: CachedPage | None) -> PageStream:
+    """Start streaming a page from upstream in a task of its own, which later requests for it can join.
+
+    The task is registered as in flight too, so buffered requests for the page wait for it instead of
+    fetching it again, and it carries on for them if the client that started it goes away.
+    """
+    stream = PageStream()
+    # The task runs in a copy of the current context, so its requests use the session's jar
+    with state.cookie_jar.session(payload.session):
+        task = asyncio.create_task(stream_upstream(state, key, payload, stale, stream))
+    state.inflight[key] = task
+    state.streams[key] = stream
+
+    def forget(task: asyncio.Task[CachedPage]) -> None:
+        forget_stream(state, key, stream)
+        # Errors reach the requests following the stream through it
+        if not task.cancelled():
+            task.exception()
+
+    task.add_done_callback(forget)
+    return stream
+
+
+@app.post("/webpage/stream")
+async def stream_website_html(payload: Annotated[WebRequestPayload, Body()], request: Request) -> StreamingResponse:
+    """Proxy a website, sending its metadata first and then forwarding the body in chunks.
+
+    Requests for a page that is already being streamed or fetched join that download instead of starting
+    their own.
+    """
+    state: State = request.app.state
+    chunk_size: int = state.settings.stream_chunk_size
+    cache: ResponseCache = state.response_cache
+    key: CacheKey = request_key(state, payload.target, payload.headers, payload.session)
+
+    if (stream := state.streams.get(key)) is not None:
+        cache.stats.coalesced += 1
+    elif (task := state.inflight.get(key)) is not None:
+        cache.stats.coalesced += 1
+        page: CachedPage = await asyncio.shield(task)
+        return StreamingResponse(
+            stream_cached(page, chunk_size, payload.session),
+            media_type="application/octet-stream",
+        )
+    elif (prefetched := state.prefetch_store.take(key)) is not None:
+        return StreamingResponse(
+            stream_cached(prefetched, chunk_size, payload.session),
+            media_type="application/octet-stream",
+        )
+    else:
+        fresh, stale = cache.lookup(key)
+        if fresh is not None:
+            return StreamingResponse(
+                stream_cached(fresh, chunk_size, payload.session),
+                media_type="application/octet-stream",
+            )
+        stream = start_stream(state, key, payload, stale)
+
+    follower: int = stream.join()
+    page = await stream.headers(follower)
+    return StreamingResponse(stream.follow(page, payload.session, follower), media_type="application/octet-stream")
+
+
+@app.post("/session")
+async def create_cookie_session(request: Request) -> dict[str, str]:
+    """Start a cookie session: requests sending its id have their cookies kept by the proxy instead of the client.
+
+    Requests naming a session the proxy did not start, or has since dropped, are answered with 404.
+    """
+    cookie_jar: SessionCookieJar = request.app.state.cookie_jar
+    return {"session": cookie_jar.start_session()}
+
+
+@app.get("/session/{session}/cookies")
+async def get_session_cookies(session: str, url: str, request: Request) -> dict[str, str]:
+    """Return the cookies of a session that a page at `url` can read from ``document.cookie``."""
+    return {"cookies": session_jar(request.app.state, session).to_cookie_string(url, for_javascript=True)}
 
 
 async def main() -> None:  # noqa: D103
+    # Development server: pick up edits to index.html without a restart
+    os.environ.setdefault("PYBROWSER_WATCH_INDEX", "1")
     uvicorn.run("main:app", host="127.0.0.1", port=8000, reload=True)
 
 
@@ -0,0 +1,285 @@
+# Reference: https://httpwg.org/specs/rfc9111.html
+import time
+from collections import OrderedDict
+from collections.abc import Mapping
+from dataclasses import dataclass, field, replace
+from email.utils import parsedate_to_datetime
+
+from multidict import CIMultiDict
+
+# Statuses a cache may store without explicit freshness information (RFC 9110, section 15.1).
+CACHEABLE_STATUSES: frozenset[int] = frozenset({200, 203, 204, 300, 301, 308, 404, 405, 410, 414, 501})
+
+# Share of the time since Last-Modified used as a heuristic lifetime, capped at a day.
+HEURISTIC_FRACTION: float = 0.1
+HEURISTIC_MAX_LIFETIME: float = 24 * 60 * 60
+
+# Fields of a 304 Not Modified response that describe the 304 itself and do not update the stored response
+# (RFC 9111, section 3.2). Set-Cookie is never stored, so one client's cookies are not replayed to later hits.
+NOT_UPDATED_HEADERS: frozenset[str] = frozenset(
+    {"set-cookie", "content-length", "connection", "keep-alive", "transfer-encoding", "te", "trailer", "upgrade"},
+)
+
+CacheKey = tuple[str, tuple[tuple[str, str], ...]]
+
+
+def parse_http_date(value: str | None) -> float | None:
+    """Parse an HTTP date into a unix timestamp, or None if it is missing or invalid."""
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_cache_control(value: str | None) -> dict[str, str | None]:
+    """Split a Cache-Control header into lowercased directives and their optional arguments."""
+    directives: dict[str, str | None] = {}
+    for directive in (value or "").split(","):
+        name, _, argument = directive.partition("=")
+        name = name.strip().lower()
+        if name:
+            directives[name] = argument.strip().strip('"') or None
+    return directives
+
+
+def freshness_lifetime(headers: Mapping[str, str], directives: dict[str, str | None], now: float) -> float:
+    """Return how many seconds a response stays fresh after it was received."""
+    if (max_age := directives.get("max-age")) is not None:
+        return float(max_age) if max_age.isdigit() else 0.0
+
+    date = parse_http_date(headers.get("Date")) or now
+    if "Expires" in headers:
+        expires = parse_http_date(headers["Expires"])
+        return expires - date if expires is not None else 0.0
+
+    if (last_modified := parse_http_date(headers.get("Last-Modified"))) is not None:
+        return min((date - last_modified) * HEURISTIC_FRACTION, HEURISTIC_MAX_LIFETIME)
+
+    return 0.0
+
+
+@dataclass
+class CachedPage:
+    """An upstream response, as stored in the cache and served by the proxy."""
+
+    status: int
+    headers: list[tuple[str, str]]
+    final_url: str
+    encoding: str | None
+    body: bytes
+    fresh_until: float = 0.0
+    etag: str | None = None
+    last_modified: str | None = None
+    no_cache: bool = False
+
+    @property
+    def size(self) -> int:
+        """Approximate memory held by the entry, dominated by the body."""
+        return len(self.body) + sum(len(name) + len(value) for name, value in self.headers)
+
+    @property
+    def has_validators(self) -> bool:
+        """Whether the entry can be revalidated with a conditional request."""
+        return self.etag is not None or self.last_modified is not None
+
+    def is_fresh(self, now: float) -> bool:
+        """Whether the entry can be served without contacting upstream."""
+        return not self.no_cache and now < self.fresh_until
+
+    def conditional_headers(self) -> dict[str, str]:
+        """Request headers that ask upstream to confirm this entry is still valid."""
+        headers: dict[str, str] = {}
+        if self.etag is not None:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified is not None:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+    def without_set_cookie(self) -> "CachedPage":
+        """Return the page as it is stored, without the Set-Cookie headers meant for the client that fetched it."""
+        if not any(name.lower() == "set-cookie" for name, _ in self.headers):
+            return self
+        return replace(self, headers=[(name, value) for name, value in self.headers if name.lower() != "set-cookie"])
+
+    def merge_headers(self, headers: Mapping[str, str]) -> None:
+        """Update the stored header fields with those of a 304 response (RFC 9111, section 4.3.4).
+
+        Each field the 304 carries replaces the stored fields of the same name. The stored Age is dropped
+        either way, since it gave the age of the old response.
+        """
+        updated: set[str] = {name.lower() for name in headers} - NOT_UPDATED_HEADERS
+        kept = [(name, value) for name, value in self.headers if name.lower() not in updated and name.lower() != "age"]
+        self.headers = kept + [(name, value) for name, value in headers.items() if name.lower() in updated]
+
+    def update_policy(self, headers: Mapping[str, str], now: float) -> bool:
+        """Recompute freshness and validators from response headers.
+
+        Returns whether the response may be stored at all.
+        """
+        directives = parse_cache_control(headers.get("Cache-Control"))
+        age: str = headers.get("Age", "").strip()
+        self.fresh_until = now + freshness_lifetime(headers, directives, now) - (int(age) if age.isdigit() else 0)
+        self.etag = headers.get("ETag", self.etag)
+        self.last_modified = headers.get("Last-Modified", self.last_modified)
+        self.no_cache = "no-cache" in directives
+
+        return (
+            "no-store" not in directives
+            and headers.get("Vary", "").strip() != "*"
+            and self.status in CACHEABLE_STATUSES
+            and (self.fresh_until > now or self.has_validators)
+        )
+
+
+@dataclass
+class CacheStats:
+    """Counters exposed on the cache stats endpoint."""
+
+    hits: int = 0
+    misses: int = 0
+    revalidations: int = 0
+    not_modified: int = 0
+    evictions: int = 0
+    coalesced: int = 0
+
+
+@dataclass
+class ResponseCache:
+    """An LRU cache of upstream responses, bounded by entry count and total body bytes.
+
+    Entries are keyed on the target URL and every request header the client sent, so responses that vary on
+    cookies or language never leak between requests. The proxy acts as the browser's own cache, so responses
+    marked ``private`` are stored too.
+    """
+
+    max_entries: int
+    max_bytes: int
+    max_entry_bytes: int
+    stats: CacheStats = field(default_factory=CacheStats)
+    entries: OrderedDict[CacheKey, CachedPage] = field(default_factory=OrderedDict)
+    total_bytes: int = 0
+
+    @staticmethod
+    def key(target: str, headers: Mapping[str, str]) -> CacheKey:
+        """Build the cache key for a target and the request headers that affect its response."""
+        return target, tuple(sorted((name.lower(), value) for name, value in headers.items()))
+
+    def lookup(self, key: CacheKey, now: float | None = None) -> tuple[CachedPage | None, CachedPage | None]:
+        """Look up an entry, recording the outcome in the stats.
+
+        Returns ``(fresh, stale)``: a fresh entry to serve directly, or a stale entry whose validators should
+        be sent upstream. At most one of the two is set.
+        """
+        now = time.time() if now is None else now
+        entry = self.entries.get(key)
+        if entry is None:
+            self.stats.misses += 1
+            return None, None
+
+        self.entries.move_to_end(key)
+        if entry.is_fresh(now):
+            self.stats.hits += 1
+            return entry, None
+
+        if entry.has_validators:
+            self.stats.revalidations += 1
+            return None, entry
+
+        self.stats.misses += 1
+        self.discard(key)
+        return None, None
+
+    def revalidated(self, key: CacheKey, entry: CachedPage, headers: Mapping[str, str]) -> CachedPage:
+        """Refresh a stale entry after upstream answered 304 Not Modified, merging in the 304's headers."""
+        self.stats.not_modified += 1
+        # Discarded before its headers, and so its size, change
+        self.discard(key)
+        entry.merge_headers(headers)
+        if entry.update_policy(CIMultiDict(entry.headers), time.time()):
+            self.store(key, entry)
+        return entry
+
+    def store(self, key: CacheKey, entry: CachedPage) -> None:
+        """Insert or replace an entry and evict least recently used ones until the limits hold."""
+        entry = entry.without_set_cookie()
+        if entry.size > self.max_entry_bytes:
+            self.discard(key)
+            return
+
+        self.discard(key)
+        self.entries[key] = entry
+        self.total_bytes += entry.size
+
+        while len(self.entries) > self.max_entries or self.total_bytes > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.total_bytes -= evicted.size
+            self.stats.evictions += 1
+
+    def discard(self, key: CacheKey) -> None:
+        """Remove an entry if it is present."""
+        if (entry := self.entries.pop(key, None)) is not None:
+            self.total_bytes -= entry.size
+
+    def to_dict(self) -> dict[str, int]:
+        """Summarise the cache for the stats endpoint."""
+        return {
+            "hits": self.stats.hits,
+            "misses": self.stats.misses,
+            "revalidations": self.stats.revalidations,
+            "not_modified": self.stats.not_modified,
+            "evictions": self.stats.evictions,
+            "coalesced": self.stats.coalesced,
+            "entries": len(self.entries),
+            "bytes": self.total_bytes,
+        }
+
+
+@dataclass
+class PrefetchStore:
+    """Pages fetched ahead of navigation, held briefly so following a link is answered from memory.
+
+    Prefetched pages are kept for ``ttl`` seconds whatever their caching headers say and are handed out at
+    most once, the same way browsers treat ``<link rel=prefetch>`` responses.
+    """
+
+    max_entries: int
+    max_bytes: int
+    ttl: float
+    entries: OrderedDict[CacheKey, tuple[float, CachedPage]] = field(default_factory=OrderedDict)
+    total_bytes: int = 0
+    stored: int = 0
+    hits: int = 0
+
+    def put(self, key: CacheKey, page: CachedPage) -> None:
+        """Hold a prefetched page in place of any for its key, evicting the oldest ones until the limits hold."""
+        self.discard(key)
+        if page.size > self.max_bytes:
+            return
+
+        self.entries[key] = (time.monotonic() + self.ttl, page)
+        self.total_bytes += page.size
+        self.stored += 1
+
+        while len(self.entries) > self.max_entries or self.total_bytes > self.max_bytes:
+            _, (_, evicted) = self.entries.popitem(last=False)
+            self.total_bytes -= evicted.size
+
+    def discard(self, key: CacheKey) -> None:
+        """Remove a prefetched page if it is present, without counting it as used."""
+        if (item := self.entries.pop(key, None)) is not None:
+            self.total_bytes -= item[1].size
+
+    def take(self, key: CacheKey) -> CachedPage | None:
+        """Remove and return a prefetched page if it has not expired yet."""
+        if (item := self.entries.pop(key, None)) is None:
+            return None
+
+        expires, page = item
+        self.total_bytes -= page.size
+        if time.monotonic() >= expires:
+            return None
+
+        self.hits += 1
+        return page
@@ -1,33 +1,77 @@
 # Reference: https://html.spec.whatwg.org/
-from htmlparser_types import Document, ParserState
+from htmlparser_types import CompactDocument, Document, ParserState, Token
+from parser_profile import InstrumentedTokenizer, ParseReport, TimedTreeConstructor
 from tokenizer import Tokenizer
-from treeconstructor import html_doc
+from treeconstructor import CompactTreeConstructor, TreeConstructor
 
 
-def parse_html(html: str) -> Document:
+class Parser:
+    """Incremental HTML parser.
+
+    Chunks passed to `feed` are tokenized as they arrive, and the tree built so far can be read from
+    `document` at any time, so rendering can start before the whole page has been downloaded. Every parser
+    builds its own document, so parsers can be used side by side. With `compact` set, the document is a
+    `CompactDocument`, which holds large pages in a fraction of the memory. With `instrument` set, the
+    parse is recorded in the `ParseReport` at `report`.
+    """
+
+    def __init__(self, *, compact: bool = False, instrument: bool = False) -> None:
+        self.tree_constructor: TreeConstructor | TimedTreeConstructor = (
+            CompactTreeConstructor() if compact else TreeConstructor()
+        )
+        self.report: ParseReport | None = None
+        if instrument:
+            self.report = ParseReport()
+            self.tree_constructor = TimedTreeConstructor(self.tree_constructor, self.report)
+            self.tokenizer: Tokenizer = InstrumentedTokenizer(ParserState(), self.tree_constructor)
+        else:
+            self.tokenizer = Tokenizer(ParserState(), self.tree_constructor)
+        self.closed: bool = False
+
+    def feed(self, chunk: str) -> None:
+        """Parse the next chunk of the document."""
+        if self.closed:
+            raise ValueError("Cannot feed a closed parser")
+        self.tokenizer.tokenize(chunk)
+
+    def close(self) -> Document | CompactDocument:
+        """Finish parsing at the end of the input and return the complete document."""
+        if not self.closed:
+            self.closed = True
+            self.tokenizer.end()
+            self.tree_constructor.process(Token(kind="EOF"))
+        return self.tree_constructor.document
+
+    @property
+    def document(self) -> Document | CompactDocument:
+        """The document as parsed so far."""
+        self.tree_constructor.flush_text()
+        return self.tree_constructor.document
+
+
+def parse_html(html: str, *, compact: bool = False) -> Document | CompactDocument:
     """Parse HTML string.
 
     Args:
         html (str): The full html string
+        compact (bool): Build a CompactDocument instead of a tree of Element objects
 
     Returns:
         Document: Python representation of html
 
     """
-    parser_state: ParserState = ParserState()
-    pos: int = 0
-    row: int = 0
-    col: int = 0
-    while pos < len(html):
-        parser_state.need_to_reconsume = False
-        char = html[pos]
-        Tokenizer(char, (row, col), parser_state).next_state()
-        if parser_state.need_to_reconsume:
-            continue
-        pos += 1
-        if char == "\n":
-            row += 1
-            col = 0
-        else:
-            col += 1
-    return html_doc
+    parser: Parser = Parser(compact=compact)
+    parser.feed(html)
+    return parser.close()
+
+
+def profile_html(html: str, *, compact: bool = False) -> tuple[Document | CompactDocument, ParseReport]:
+    """Parse HTML string like `parse_html`, recording where the parse spent its time.
+
+    Returns:
+        tuple: The document and the `ParseReport` of its parse
+
+    """
+    parser: Parser = Parser(compact=compact, instrument=True)
+    parser.feed(html)
+    return parser.close(), parser.report
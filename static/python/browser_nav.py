@@ -1,16 +1,21 @@
 # ruff: noqa
 # noqa: PGH004
 import asyncio
+import codecs
+import inspect
+import itertools
 import json
 import urllib.parse
+from collections.abc import Awaitable, Callable
 
-from _htmlparser import parse_html
+from _htmlparser import Parser
+from cookie_store import LocalStorageBackend, PersistentCookieStore
 from cookies import CookieStorage
-from htmlparser_types import Document
-from js import KeyboardEvent, MouseEvent, console
+from htmlparser_types import CompactDocument, Document
+from js import KeyboardEvent, MouseEvent, console, localStorage
 from pyodide.ffi.wrappers import add_event_listener
-from pyodide.http import FetchResponse, pyfetch
-from pyscript import display, document
+from pyodide.http import pyfetch
+from pyscript import create_named_worker, display, document
 from render import Renderer
 
 
@@ -63,35 +68,280 @@ class BrowserHistory:
 
 
 browser_history_obj: BrowserHistory = BrowserHistory()
-cookie_storage: CookieStorage = CookieStorage()
+# Persistent cookies are kept in localStorage, and a site's are read back in the first time it is visited
+cookie_storage: CookieStorage = CookieStorage(
+    persistent_store=PersistentCookieStore(LocalStorageBackend(localStorage))
+)
 user_history: list = []
 
+# Opt-in: fetch same-origin links of every loaded page in the background so following them is instant
+PREFETCH_LINKS: bool = False
+PREFETCH_LIMIT: int = 8
+background_tasks: set[asyncio.Task] = set()
 
-async def load_page(url: str) -> dict:
-    """Load a page, handling cookies and api interfacing."""
-    resp = await pyfetch(
-        "http://127.0.0.1:8000/webpage/",
-        method="POST",
-        body=json.dumps(
-            {
-                "target": url,
-                "headers": cookie_storage.to_headers(),
-            },
-        ),
-        headers={"Content-Type": "application/json"},
+# Opt-in: have the proxy parse pages with CPython and rebuild the tree from its compact arrays
+PARSE_ON_SERVER: bool = False
+
+# Opt-in: have the proxy keep this tab's cookies in a session of its own, so only the session id is sent
+SERVER_COOKIES: bool = False
+cookie_session: str | None = None
+
+# Opt-in: parse pages in a worker of their own instead of on the UI thread. The worker runs a second Pyodide,
+# so it is only started the first time a page is parsed in it
+PARSE_IN_WORKER: bool = False
+parser_worker: asyncio.Task | None = None
+page_ids = itertools.count()
+
+
+async def start_parser_worker():  # noqa: ANN201
+    """Start the worker running parse_worker.py and wait until its exports can be called."""
+    return await create_named_worker(
+        src="static/python/parse_worker.py",
+        name="parser",
+        config="static/python/pyscript.toml",
+        type="py",
     )
 
-    data = await resp.json()
 
-    console.log(data)
+class WorkerParser:
+    """Feeds a page to the parser worker as it downloads and rebuilds the finished document on this side."""
+
+    def __init__(self) -> None:
+        self.page_id: int = next(page_ids)
+        self.worker = None
+
+    async def start(self) -> None:
+        global parser_worker
+        if parser_worker is None:
+            parser_worker = asyncio.create_task(start_parser_worker())
+        self.worker = await parser_worker
+        await self.worker.begin(self.page_id)
+
+    async def feed(self, chunk: str) -> None:
+        await self.worker.feed(self.page_id, chunk)
+
+    async def close(self) -> CompactDocument:
+        return CompactDocument.from_compact(json.loads(await self.worker.close(self.page_id)))
+
+    async def discard(self) -> None:
+        await self.worker.discard(self.page_id)
+
+
+def chunk_decoder(encoding: str | None) -> codecs.IncrementalDecoder:
+    """Return an incremental decoder for a streamed body, falling back to UTF-8."""
+    try:
+        return codecs.getincrementaldecoder(encoding or "utf-8")(errors="replace")
+    except LookupError:
+        return codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+
+async def cookie_fields(url: str) -> dict:
+    """Return the payload fields that carry the cookies of a request for `url` to the proxy.
+
+    With SERVER_COOKIES the proxy sends and stores them itself, and strips Set-Cookie from what it returns.
+    """
+    global cookie_session
+    if not SERVER_COOKIES:
+        return {"headers": cookie_storage.to_headers(url)}
+
+    if cookie_session is None:
+        resp = await pyfetch("http://127.0.0.1:8000/session", method="POST")
+        cookie_session = (await resp.json())["session"]
+    return {"headers": {}, "session": cookie_session}
+
+
+async def post_to_proxy(endpoint: str, url: str, payload: dict):  # noqa: ANN201
+    """POST `payload` to a proxy endpoint along with the cookie fields of a request for `url`.
+
+    The proxy answers 404 for a cookie session it does not know, as after it restarts or once it has dropped the
+    session for newer ones. The tab then starts a new session and sends the request once more.
+    """
+    global cookie_session
+
+    async def send():  # noqa: ANN202
+        return await pyfetch(
+            f"http://127.0.0.1:8000/{endpoint}",
+            method="POST",
+            body=json.dumps(payload | await cookie_fields(url)),
+            headers={"Content-Type": "application/json"},
+        )
+
+    resp = await send()
+    if resp.status == 404 and cookie_session is not None:
+        cookie_session = None
+        resp = await send()
+    return resp
+
+
+async def load_page(url: str, on_chunk: Callable[[str], None | Awaitable[None]] | None = None) -> dict | None:
+    """Load a page, handling cookies and api interfacing.
+
+    The body is streamed from the proxy and `on_chunk` is called with each decoded piece as it arrives, and
+    awaited if it is a coroutine function. Returns None if the proxy could not load the page.
+    """
+    resp = await post_to_proxy("webpage/stream", url, {"target": url})
+    if not resp.ok:
+        console.error(f"Loading {url} failed with status {resp.status}")
+        return None
+
+    reader = resp.js_response.body.getReader()
+    data = None
+    pending = b""
+    content: list[str] = []
+
+    while True:
+        result = await reader.read()
+        if result.done:
+            break
+        chunk: bytes = result.value.to_bytes()
+
+        # The first line is the JSON metadata, everything after it is body
+        if data is None:
+            pending += chunk
+            if b"\n" not in pending:
+                continue
+            meta, chunk = pending.split(b"\n", 1)
+            data = json.loads(meta)
+            decoder = chunk_decoder(data["encoding"])
+            console.log(meta.decode())
+
+            # Parse out cookie headers
+            cookie_storage.handle_headers(
+                headers=data["headers"],
+                request_host=data["final_url"],
+            )
+            cookie_storage.flush()
+
+        text = decoder.decode(chunk)
+        if text:
+            content.append(text)
+            if on_chunk is not None and inspect.isawaitable(handled := on_chunk(text)):
+                await handled
+
+    if data is None:
+        return None
+
+    text = decoder.decode(b"", final=True)
+    if text:
+        content.append(text)
+        if on_chunk is not None and inspect.isawaitable(handled := on_chunk(text)):
+            await handled
+
+    data["content"] = "".join(content)
+    return data
+
+
+def document_text(parsed_html: CompactDocument) -> str:
+    """Join the text of the displayed elements of a document, in document order."""
+    texts: list[str] = []
+    stack = list(reversed(parsed_html.children))
+    while stack:
+        element = stack.pop()
+        if element.dont_display:
+            continue
+        if element.text:
+            texts.append(element.text)
+        stack.extend(reversed(element.children))
+    return "\n".join(texts)
+
+
+async def load_parsed_page(url: str) -> tuple[dict, CompactDocument] | None:
+    """Load a page the proxy has already parsed, skipping tokenization in Pyodide.
+
+    The proxy sends the tree instead of the page's source, so the text shown for the page comes from the tree.
+    Returns None if the proxy could not load the page.
+    """
+    resp = await post_to_proxy("webpage/", url, {"target": url, "parse": True})
+    if not resp.ok:
+        console.error(f"Loading {url} failed with status {resp.status}")
+        return None
+    data = await resp.json()
 
-    # Parse out cookie headers
     cookie_storage.handle_headers(
         headers=data["headers"],
-        request_host=url,
+        request_host=data["final_url"],
     )
+    cookie_storage.flush()
+
+    parsed_html = CompactDocument.from_compact(data.pop("document"))
+    data["content"] = document_text(parsed_html)
+    return data, parsed_html
+
+
+def collect_prefetch_links(parsed_html: Document, base_url: str, limit: int) -> list[str]:
+    """Collect up to `limit` distinct same-origin link targets from a parsed page."""
+    origin = urllib.parse.urlsplit(base_url)
+    current_url, _ = urllib.parse.urldefrag(base_url)
+    links: list[str] = []
+
+    for element in parsed_html.query_selector_all("a[href]"):
+        if not element.attrs["href"]:
+            continue
+
+        url, _ = urllib.parse.urldefrag(urllib.parse.urljoin(base_url, element.attrs["href"]))
+        target = urllib.parse.urlsplit(url)
+        if (target.scheme, target.netloc) != (origin.scheme, origin.netloc) or url in (current_url, *links):
+            continue
+
+        links.append(url)
+        if len(links) >= limit:
+            break
+
+    return links
+
+
+async def prefetch_links(urls: list[str]) -> None:
+    """Ask the proxy to fetch pages ahead of navigation.
+
+    Each page is fetched with the cookies a visit to it would send, so the proxy can serve the visit from its
+    prefetch store. Targets sending the same cookies share one batch request.
+    """
+    batches: dict[str, list[str]] = {}
+    for url in urls:
+        fields = await cookie_fields(url)
+        batches.setdefault(json.dumps(fields, sort_keys=True), []).append(url)
+
+    for targets in batches.values():
+        # Every target of a batch sends the same cookies, so the first one stands for them all
+        await post_to_proxy("webpage/batch", targets[0], {"targets": targets})
+
+
+def schedule_prefetch(parsed_html: Document, base_url: str) -> None:
+    """Prefetch the links of the current page in the background, if enabled."""
+    if not PREFETCH_LINKS:
+        return
+
+    links = collect_prefetch_links(parsed_html, base_url, PREFETCH_LIMIT)
+    if links:
+        task = asyncio.create_task(prefetch_links(links))
+        background_tasks.add(task)
+        task.add_done_callback(background_tasks.discard)
+
+
+async def fetch_and_parse(url: str) -> tuple[dict, Document | CompactDocument] | None:
+    """Load a page, parsing it chunk by chunk while it downloads. Returns None if the page could not be loaded."""
+    if PARSE_ON_SERVER:
+        return await load_parsed_page(url)
+
+    if PARSE_IN_WORKER:
+        parser = WorkerParser()
+        await parser.start()
+        try:
+            resp = await load_page(url, on_chunk=parser.feed)
+        except Exception:
+            await parser.discard()
+            raise
+        if resp is None:
+            # Nothing was loaded, so there is no page for the worker to finish
+            await parser.discard()
+            return None
+        return resp, await parser.close()
 
-    return data
+    parser = Parser()
+    resp = await load_page(url, on_chunk=parser.feed)
+    if resp is None:
+        return None
+    return resp, parser.close()
 
 
 async def reload_handler(event: MouseEvent) -> None:  # noqa: ARG001
@@ -99,26 +349,24 @@ async def reload_handler(event: MouseEvent) -> None:  # noqa: ARG001
     textarea_element = document.getElementsByTagName("textarea")[0]
     current_website_url: str = browser_history_obj.get_current_page()
 
-    if current_website_url:
-        resp = await load_page(current_website_url)
+    # The response body is handed to the parser as it arrives.
+    if current_website_url and (loaded := await fetch_and_parse(current_website_url)) is not None:
+        resp, parsed_html = loaded
         textarea_element.value = resp["final_url"]
-        # Access the response data and pass to the parser to display it correctly.
-        parsed_html: Document = parse_html(resp["content"])
+        schedule_prefetch(parsed_html, resp["final_url"])
         await change_tab_title(parsed_html)
 
         display(resp["content"], target="browser-body-display")
         console.log(parsed_html)
 
 
-async def web_search(query: str) -> FetchResponse:
+async def web_search(query: str) -> tuple[dict, Document | CompactDocument] | None:
     """Modify a URL query for searches."""
     encoded_query: str = urllib.parse.quote_plus(
         string=query,
     )
 
-    resp = await load_page(f"https://www.mojeek.com/search?q={encoded_query}")
-
-    return resp["content"], resp["final_url"]
+    return await fetch_and_parse(f"https://www.mojeek.com/search?q={encoded_query}")
 
 
 async def keypress(event: KeyboardEvent) -> None:
@@ -140,20 +388,21 @@ async def keypress(event: KeyboardEvent) -> None:
 
             if input_url.startswith(("https://", "ftp://")):
                 browser_history_obj.load_page(url=input_url)
-                resp = await load_page(input_url)
 
-                if resp is not None:
+                if (loaded := await fetch_and_parse(input_url)) is not None:
+                    resp, parsed_html = loaded
                     textarea_element.value = resp["final_url"]
                     user_history.append(resp["final_url"])
-                    parsed_html: Document = parse_html(resp["content"])
+                    schedule_prefetch(parsed_html, resp["final_url"])
                     await change_tab_title(parsed_html=parsed_html)
                     display(resp["content"], target="browser-body-display")
-            else:
-                resp, final_url = await web_search(query=event.target.value)
+            elif (loaded := await web_search(query=event.target.value)) is not None:
+                resp, parsed_html = loaded
+                final_url = resp["final_url"]
                 browser_history_obj.load_page(url=final_url)
                 textarea_element.value = final_url
                 user_history.append(final_url)
-                parsed_html: Document = parse_html(resp["content"])
+                schedule_prefetch(parsed_html, final_url)
                 await change_tab_title(parsed_html=parsed_html)
                 display(resp["content"], target="browser-body-display")
 
@@ -165,11 +414,11 @@ async def backward_handler(event: MouseEvent) -> None:  # noqa: ARG001
 
     console.log(backward_url)
 
-    if backward_url is not None:
-        resp = await load_page(backward_url)
+    if backward_url is not None and (loaded := await fetch_and_parse(backward_url)) is not None:
+        resp, parsed_html = loaded
         textarea_element.value = resp["final_url"]
         console.log(resp["content"])
-        parsed_html: Document = parse_html(resp["content"])
+        schedule_prefetch(parsed_html, resp["final_url"])
         await change_tab_title(parsed_html=parsed_html)
         display(resp["content"], target="browser-body-display")
 
@@ -179,12 +428,12 @@ async def forward_handler(event: MouseEvent) -> None:  # noqa: ARG001
     textarea_element = await direct_address_bar()
     forward_url: str = browser_history_obj.forward()
 
-    if forward_url is not None:
-        resp = await load_page(forward_url)
+    if forward_url is not None and (loaded := await fetch_and_parse(forward_url)) is not None:
+        resp, parsed_html = loaded
         textarea_element.value = resp["final_url"]
         console.log(resp["content"])
 
-        parsed_html: Document = parse_html(resp["content"])
+        schedule_prefetch(parsed_html, resp["final_url"])
         await change_tab_title(parsed_html=parsed_html)
         display(resp["content"], target="browser-body-display")
 
@@ -194,15 +443,10 @@ async def direct_address_bar():
     return document.getElementById("direct-url-bar")
 
 
-async def change_tab_title(parsed_html: str) -> None:
-    """Return the direct element for the tab's title."""
-    for element in parsed_html.traverse():
-        for child_element in element.children:
-            if child_element.name == "title":
-                website_title = child_element.text
-
+async def change_tab_title(parsed_html: Document | CompactDocument) -> None:
+    """Show the page's title on its tab."""
     tab_title_element = document.querySelector(".tab-title span")
-    tab_title_element.innerText = website_title
+    tab_title_element.innerText = parsed_html.title
 
 
 async def render_to_canvas(parsed_html: Document) -> None:
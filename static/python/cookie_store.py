@@ -0,0 +1,252 @@
+import json
+from pathlib import Path
+from typing import Protocol
+
+from cookies import Cookie, registrable_domain
+
+BATCH_SIZE: int = 64
+# A domain's log is compacted once it holds this many records more than twice its live cookies
+COMPACTION_SLACK: int = 32
+
+HTTP_ONLY: int = 1
+SECURE: int = 2
+HOST_ONLY: int = 4
+# Position of the expiry time in a cookie record
+EXPIRY_FIELD: int = 4
+
+
+def cookie_record(cookie: Cookie) -> str:
+    """Serialise a cookie as one log record: a JSON array with its flags packed into one number."""
+    flags: int = (
+        (HTTP_ONLY if cookie.http_only else 0)
+        | (SECURE if cookie.secure else 0)
+        | (HOST_ONLY if cookie.host_only else 0)
+    )
+    return json.dumps(
+        [
+            cookie.domain,
+            cookie.path,
+            cookie.name,
+            cookie.value,
+            cookie.expiry_time,
+            flags,
+            cookie.samesite,
+            cookie.creation_time,
+            cookie.last_access_time,
+        ],
+        separators=(",", ":"),
+    )
+
+
+def delete_record(cookie: Cookie) -> str:
+    """Serialise the removal of a cookie as one log record: the JSON array of its key alone."""
+    return json.dumps(list(cookie.key), separators=(",", ":"))
+
+
+def cookie_from_record(fields: list) -> Cookie:
+    """Rebuild a cookie from the fields of a log record written by `cookie_record`."""
+    domain, path, name, value, expiry_time, flags, samesite, creation_time, last_access_time = fields
+    return Cookie(
+        name=name,
+        value=value,
+        http_only=bool(flags & HTTP_ONLY),
+        secure=bool(flags & SECURE),
+        domain=domain,
+        path=path,
+        persistent=True,
+        expiry_time=expiry_time,
+        samesite=samesite,
+        host_only=bool(flags & HOST_ONLY),
+        creation_time=creation_time,
+        last_access_time=last_access_time,
+    )
+
+
+def is_live(fields: list, now: float | None) -> bool:
+    """Whether the cookie of a record has not expired by `now`; every cookie is live without a time."""
+    return now is None or fields[EXPIRY_FIELD] is None or fields[EXPIRY_FIELD] > now
+
+
+def replay(records: list[str]) -> dict[tuple[str, str, str], list]:
+    """Play a domain's log back, returning the fields of each cookie still set at its end, by key."""
+    live: dict[tuple[str, str, str], list] = {}
+    for record in records:
+        fields: list = json.loads(record)
+        key: tuple[str, str, str] = (fields[0], fields[1], fields[2])
+        if len(fields) == len(key):
+            live.pop(key, None)
+        else:
+            live[key] = fields
+    return live
+
+
+class CookieBackend(Protocol):
+    """Where a `PersistentCookieStore` keeps its logs: one ordered list of records per registrable domain."""
+
+    def read(self, domain: str) -> list[str]:
+        """Return the records of a domain, oldest first."""
+
+    def append(self, records: list[tuple[str, str]]) -> None:
+        """Add (domain, record) pairs to the end of their domains' logs."""
+
+    def replace(self, domain: str, records: list[str]) -> None:
+        """Swap a domain's whole log for `records`."""
+
+    def clear(self) -> None:
+        """Remove the logs of every domain."""
+
+
+class SQLiteBackend:
+    """Keep cookie logs in an SQLite table, for the server."""
+
+    def __init__(self, path: str | Path) -> None:
+        # Pyodide only loads sqlite3 on request, and the browser uses LocalStorageBackend instead
+        import sqlite3  # noqa: PLC0415
+
+        self.connection: sqlite3.Connection = sqlite3.connect(path)
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS cookie_log "
+                "(id INTEGER PRIMARY KEY, domain TEXT NOT NULL, record TEXT NOT NULL)",
+            )
+            self.connection.execute("CREATE INDEX IF NOT EXISTS cookie_log_domain ON cookie_log (domain, id)")
+
+    def read(self, domain: str) -> list[str]:
+        """Return the records of a domain, oldest first."""
+        rows = self.connection.execute("SELECT record FROM cookie_log WHERE domain = ? ORDER BY id", (domain,))
+        return [record for (record,) in rows]
+
+    def append(self, records: list[tuple[str, str]]) -> None:
+        """Insert (domain, record) pairs in one transaction."""
+        with self.connection:
+            self.connection.executemany("INSERT INTO cookie_log (domain, record) VALUES (?, ?)", records)
+
+    def replace(self, domain: str, records: list[str]) -> None:
+        """Swap a domain's whole log for `records` in one transaction."""
+        with self.connection:
+            self.connection.execute("DELETE FROM cookie_log WHERE domain = ?", (domain,))
+            self.connection.executemany(
+                "INSERT INTO cookie_log (domain, record) VALUES (?, ?)",
+                [(domain, record) for record in records],
+            )
+
+    def clear(self) -> None:
+        """Remove the logs of every domain."""
+        with self.connection:
+            self.connection.execute("DELETE FROM cookie_log")
+
+    def close(self) -> None:
+        """Close the database."""
+        self.connection.close()
+
+
+class LocalStorageBackend:
+    """Keep cookie logs in the browser's localStorage, one newline-separated entry per domain.
+
+    `storage` is `js.localStorage` in Pyodide, or anything else with its getItem, setItem and removeItem.
+    """
+
+    def __init__(self, storage: object, prefix: str = "cookies:") -> None:
+        self.storage = storage
+        self.prefix: str = prefix
+
+    def read(self, domain: str) -> list[str]:
+        """Return the records of a domain, oldest first."""
+        log: str | None = self.storage.getItem(self.prefix + domain)
+        return log.split("\n") if log else []
+
+    def append(self, records: list[tuple[str, str]]) -> None:
+        """Add the records of each domain to the end of its entry, writing every entry once."""
+        by_domain: dict[str, list[str]] = {}
+        for domain, record in records:
+            by_domain.setdefault(domain, []).append(record)
+        for domain, domain_records in by_domain.items():
+            log: str | None = self.storage.getItem(self.prefix + domain)
+            self.storage.setItem(self.prefix + domain, "\n".join([log, *domain_records] if log else domain_records))
+
+    def replace(self, domain: str, records: list[str]) -> None:
+        """Swap a domain's entry for `records`, removing it when there are none."""
+        if records:
+            self.storage.setItem(self.prefix + domain, "\n".join(records))
+        else:
+            self.storage.removeItem(self.prefix + domain)
+
+    def clear(self) -> None:
+        """Remove the entry of every domain, leaving other keys alone."""
+        keys: list[str] = [self.storage.key(index) for index in range(self.storage.length)]
+        for key in keys:
+            if key.startswith(self.prefix):
+                self.storage.removeItem(key)
+
+
+class PersistentCookieStore:
+    """Save persistent cookies to a backend as an append-only log per registrable domain.
+
+    Saves and deletes are queued and appended in batches of `batch_size`, or when `flush` is called. A
+    domain's log is only read the first time one of its cookies is needed, and it is compacted down to its
+    live cookies once it holds more than twice as many records as it has cookies.
+    """
+
+    def __init__(self, backend: CookieBackend, *, batch_size: int = BATCH_SIZE) -> None:
+        self.backend: CookieBackend = backend
+        self.batch_size: int = batch_size
+        self.pending: list[tuple[str, str]] = []
+        # Records in the log and keys of cookies still set, for each domain read so far
+        self.record_counts: dict[str, int] = {}
+        self.keys: dict[str, set[tuple[str, str, str]]] = {}
+
+    def load(self, domain: str, now: float) -> list[Cookie]:
+        """Read the cookies of a registrable domain that have not expired by `now`."""
+        records: list[str] = self.backend.read(domain)
+        live: dict[tuple[str, str, str], list] = replay(records)
+        self.record_counts[domain] = len(records)
+        self.keys[domain] = set(live)
+        return [cookie_from_record(fields) for fields in live.values() if is_live(fields, now)]
+
+    def save(self, cookie: Cookie) -> None:
+        """Queue a cookie to be written, replacing any saved cookie with the same key."""
+        domain: str = registrable_domain(cookie.domain)
+        self.keys.setdefault(domain, set()).add(cookie.key)
+        self.queue(domain, cookie_record(cookie))
+
+    def delete(self, cookie: Cookie) -> None:
+        """Queue the removal of a saved cookie."""
+        domain: str = registrable_domain(cookie.domain)
+        self.keys.setdefault(domain, set()).discard(cookie.key)
+        self.queue(domain, delete_record(cookie))
+
+    def queue(self, domain: str, record: str) -> None:
+        """Add a record to the next batch, writing the batch once it is full."""
+        self.pending.append((domain, record))
+        self.record_counts[domain] = self.record_counts.get(domain, 0) + 1
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self, now: float | None = None) -> None:
+        """Write the queued records, then compact the logs they made too long.
+
+        Compaction drops cookies that have expired by `now`, if given.
+        """
+        if not self.pending:
+            return
+        domains: set[str] = {domain for domain, _ in self.pending}
+        self.backend.append(self.pending)
+        self.pending = []
+        for domain in domains:
+            if self.record_counts[domain] > 2 * len(self.keys[domain]) + COMPACTION_SLACK:
+                self.compact(domain, now)
+
+    def compact(self, domain: str, now: float | None = None) -> None:
+        """Rewrite a domain's log as one record per live cookie, dropping those expired by `now`, if given."""
+        live: list[list] = [fields for fields in replay(self.backend.read(domain)).values() if is_live(fields, now)]
+        records: list[str] = [json.dumps(fields, separators=(",", ":")) for fields in live]
+        self.backend.replace(domain, records)
+        self.record_counts[domain] = len(records)
+        self.keys[domain] = {(fields[0], fields[1], fields[2]) for fields in live}
+
+    def clear(self) -> None:
+        """Drop every saved cookie and everything queued."""
+        self.pending.clear()
+        self.record_counts.clear()
+        self.keys.clear()
+        self.backend.clear()
@@ -1,6 +1,18 @@
+# Reference: https://www.rfc-editor.org/rfc/rfc6265
+import calendar
+import heapq
+import itertools
 import re
-from dataclasses import dataclass
-from typing import Self
+import time
+import urllib.parse
+from collections import OrderedDict
+from collections.abc import Callable, Iterator
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import TYPE_CHECKING, Self
+
+if TYPE_CHECKING:
+    from cookie_store import PersistentCookieStore
 
 
 class InvalidCookieHeader(Exception):  # noqa: N818
@@ -11,9 +23,164 @@ class InvalidCookie(Exception):  # noqa: N818
     """Cookie failed to parse: something is wrong with the data."""
 
 
+# Limits of the jar; past them the least recently used cookies are evicted
+MAX_COOKIES_PER_DOMAIN: int = 180
+MAX_COOKIES: int = 3000
+
+# Cookie dates are read token by token (RFC 6265 section 5.1.1); these delimit the tokens
+DATE_DELIMITERS: re.Pattern = re.compile(r"[\x09\x20-\x2f\x3b-\x40\x5b-\x60\x7b-\x7e]+")
+DATE_TIME: re.Pattern = re.compile(r"(\d{1,2}):(\d{1,2}):(\d{1,2})(?!\d)")
+DATE_DAY: re.Pattern = re.compile(r"\d{1,2}(?!\d)")
+DATE_YEAR: re.Pattern = re.compile(r"\d{2,4}(?!\d)")
+MONTH_NAMES: tuple[str, ...] = ("jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec")
+MONTHS: dict[str, int] = {name: number for number, name in enumerate(MONTH_NAMES, 1)}
+MAX_AGE: re.Pattern = re.compile(r"-?\d+")
+DATE_CACHE_SIZE: int = 256
+
+# A raw "Name: value" header line
+HEADER: re.Pattern = re.compile(r"(?P<name>[^:]+):(?P<value>.*)")
+# Spellings of the Set-Cookie header name sent in practice, checked before lowercasing anything
+SET_COOKIE_SPELLINGS: frozenset[str] = frozenset({"Set-Cookie", "set-cookie", "SET-COOKIE", "Set-cookie"})
+# Public suffixes of more than one label, a short stand-in for the public suffix list, which is too large to
+# ship to the browser. Every top-level domain is a public suffix too.
+PUBLIC_SUFFIXES: frozenset[str] = frozenset(
+    f"{label}.{parent}"
+    for parent, labels in {
+        "uk": ("ac", "co", "gov", "ltd", "me", "net", "org", "plc"),
+        "au": ("com", "edu", "gov", "net", "org"),
+        "jp": ("ac", "co", "ne", "or"),
+        "nz": ("co", "org"),
+        "kr": ("co", "or"),
+        "in": ("co", "net", "org"),
+        "br": ("com", "net"),
+        "cn": ("com", "net", "org"),
+        "il": ("co",),
+        "za": ("co",),
+        "ar": ("com",),
+        "hk": ("com",),
+        "mx": ("com",),
+        "sg": ("com",),
+        "tr": ("com",),
+        "tw": ("com",),
+        # Hosting services that give each customer a subdomain
+        "com": ("blogspot", "herokuapp"),
+        "io": ("github",),
+        "app": ("netlify", "vercel"),
+        "dev": ("pages",),
+    }.items()
+    for label in labels
+)
+
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def parse_cookie_date(value: str) -> float | None:
+    """Parse the date of an Expires attribute into a timestamp, or None if it is not a date.
+
+    Sites send the same dates over and over, so recent dates are cached.
+    """
+    clock: tuple[int, int, int] | None = None
+    day: int | None = None
+    month: int | None = None
+    year: int | None = None
+    for token in DATE_DELIMITERS.split(value):
+        if clock is None and (match := DATE_TIME.match(token)):
+            clock = (int(match[1]), int(match[2]), int(match[3]))
+        elif day is None and (match := DATE_DAY.match(token)):
+            day = int(match[0])
+        elif month is None and token[:3].lower() in MONTHS:
+            month = MONTHS[token[:3].lower()]
+        elif year is None and (match := DATE_YEAR.match(token)):
+            year = int(match[0])
+
+    if clock is None or day is None or month is None or year is None:
+        return None
+    if year < 70:  # noqa: PLR2004
+        year += 2000
+    elif year < 100:  # noqa: PLR2004
+        year += 1900
+    hours, minutes, seconds = clock
+    if not 1 <= day <= 31 or year < 1601 or hours > 23 or minutes > 59 or seconds > 59:  # noqa: PLR2004
+        return None
+    return float(calendar.timegm((year, month, day, hours, minutes, seconds)))
+
+
+def split_request_url(request_url: str) -> tuple[str, str, bool]:
+    """Split a request URL into its lowercased host, its path and whether it is a secure request.
+
+    A bare host name, without a scheme, is taken as an insecure request for "/".
+    """
+    if "://" not in request_url:
+        return request_url.strip(".").lower(), "/", False
+    url = urllib.parse.urlsplit(request_url)
+    return (url.hostname or "").lower(), url.path or "/", url.scheme in {"https", "wss"}
+
+
+def is_set_cookie(name: str) -> bool:
+    """Whether a header name is Set-Cookie, in any case and with any surrounding whitespace.
+
+    Common spellings are matched as they are, and other names are only lowercased when their length fits.
+    """
+    name = name.strip()
+    return name in SET_COOKIE_SPELLINGS or (len(name) == len("set-cookie") and name.lower() == "set-cookie")
+
+
+def is_ip_address(host: str) -> bool:
+    """Whether a host is an IPv4 or IPv6 address rather than a domain name."""
+    return ":" in host or host.replace(".", "").isdigit()
+
+
+def is_public_suffix(domain: str) -> bool:
+    """Whether a domain is a top-level domain or one of `PUBLIC_SUFFIXES`, which cookies cannot be set for."""
+    return ("." not in domain or domain in PUBLIC_SUFFIXES) and not is_ip_address(domain)
+
+
+def registrable_domain(host: str) -> str:
+    """Return the domain a host's cookies are grouped under: its public suffix and one more label.
+
+    Every domain a cookie can be set for shares the registrable domain of the host that set it.
+    """
+    if is_ip_address(host):
+        return host
+    domain: str = ".".join(host.rsplit(".", 2)[-2:])
+    if domain in PUBLIC_SUFFIXES and domain != host:
+        return ".".join(host.rsplit(".", 3)[-3:])
+    return domain
+
+
+def domain_matches(host: str, domain: str) -> bool:
+    """Whether `host` domain-matches `domain` (RFC 6265 section 5.1.3)."""
+    return host == domain or (host.endswith(f".{domain}") and not is_ip_address(host))
+
+
+def default_path(request_path: str) -> str:
+    """Return the path of a cookie set without a Path attribute (RFC 6265 section 5.1.4)."""
+    if not request_path.startswith("/") or request_path.count("/") == 1:
+        return "/"
+    return request_path[: request_path.rindex("/")]
+
+
+def matching_paths(request_path: str) -> Iterator[str]:
+    """Yield every cookie path that path-matches `request_path` (RFC 6265 section 5.1.4), longest first.
+
+    These are the request path itself and each prefix of it that ends just before or just after a "/".
+    """
+    yield request_path
+    end: int = request_path.rfind("/")
+    while end >= 0:
+        if end + 1 < len(request_path):
+            yield request_path[: end + 1]
+        if end:
+            yield request_path[:end]
+        end = request_path.rfind("/", 0, end)
+
+
 @dataclass
 class Cookie:
-    """Represents a single cookie."""
+    """Represents a single cookie.
+
+    A host-only cookie is only sent to `domain` itself, others to its subdomains too. `creation_time` orders
+    cookies with paths of the same length.
+    """
 
     name: str
     value: str
@@ -22,149 +189,426 @@ class Cookie:
     domain: str
     path: str
     persistent: bool
-    expiry_time: str
+    expiry_time: float | None
     samesite: str
+    host_only: bool = False
+    creation_time: float = field(default_factory=time.time)
+    last_access_time: float = field(default_factory=time.time)
+
+    @property
+    def key(self) -> tuple[str, str, str]:
+        """The domain, path and name that identify a cookie in a jar."""
+        return (self.domain, self.path, self.name)
+
+    def is_expired(self, now: float) -> bool:
+        """Whether the cookie has expired at `now`."""
+        return self.expiry_time is not None and self.expiry_time <= now
 
     @classmethod
-    def from_str(cls, cookie: str, request_host: str) -> Self:  # noqa: PLR0912 C901
-        """Parse a cookie from a string."""
-        cookie, *attributes = cookie.split(";")
-        if "=" not in cookie:
-            raise InvalidCookie("Cookie missing name: %s", cookie)
-        cookie_name, cookie_value = cookie.split("=", 1)
+    def from_str(cls, cookie: str, request_host: str, now: float | None = None) -> Self:
+        """Parse a cookie from a string, set by the response to `request_host`, a URL or a bare host name.
+
+        Max-Age and Expires are turned into an absolute expiry time, counting Max-Age from `now`, which
+        defaults to the current time.
+        """
+        host, request_path, _ = split_request_url(request_host)
+        return cls.parse(cookie, host, request_path, time.time() if now is None else now)
 
+    @classmethod
+    def parse(cls, set_cookie: str, host: str, request_path: str, now: float) -> Self:  # noqa: PLR0912 C901
+        """Parse a Set-Cookie value from a response to `host` and `request_path`, received at `now`.
+
+        The value is split once and each part partitioned at its first "=", which in CPython beats a regular
+        expression scanning the value. Attribute names are lowercased, and matched without casefolding.
+        """
+        cookie, *attributes = set_cookie.split(";")
+        cookie_name, equals, cookie_value = cookie.partition("=")
+        if not equals:
+            raise InvalidCookie("Cookie missing name: %s", cookie)
         cookie_name = cookie_name.strip()
         cookie_value = cookie_value.strip()
 
         http_only = False
         domain = None
         path = None
-        persistent = False
-        expiry_time = None
+        max_age = None
+        expires = None
         secure = False
         samesite = None
 
         for attribute in attributes:
-            attribute = attribute.strip()  # noqa: PLW2901
-
-            if "=" not in attribute:
-                match attribute.casefold():
+            name, equals, value = attribute.partition("=")
+            if not equals:
+                match name.strip().lower():
                     case "httponly":
                         http_only = True
                     case "secure":
                         secure = True
+                    case "":
+                        pass
                     case skipped:
                         print("skipping attribute: ", skipped)
                 continue
 
-            attribute, value = attribute.split("=", 1)  # noqa: PLW2901
-
-            attribute = attribute.strip()  # noqa: PLW2901
             value = value.strip()
-
-            match attribute.casefold():
+            match name.strip().lower():
                 case "path":
                     path = value
                 case "domain":
-                    if domain == request_host:
-                        domain = value
+                    domain = value.removeprefix(".").lower() or None
                 case "max-age":
-                    if value.isdigit():
-                        expiry_time = value
-                        persistent = True
+                    if MAX_AGE.fullmatch(value):
+                        max_age = int(value)
                     else:
                         print("Not a valid age value:", value)
                 case "expires":
-                    expiry_time = value
-                    persistent = True
+                    expires = parse_cookie_date(value)
                 case "samesite":
                     samesite = value
 
+        # Max-Age wins over Expires, and an age of zero or less expires the cookie at once
+        expiry_time: float | None = expires if max_age is None else now + max(max_age, 0)
+        if domain is not None and not domain_matches(host, domain):
+            raise InvalidCookie("Cookie domain does not match the request host: %s", domain)
+        # A public suffix is only allowed as the request host itself, for a host-only cookie (section 5.3 step 5)
+        if domain is not None and is_public_suffix(domain):
+            if domain != host:
+                raise InvalidCookie("Cookie domain is a public suffix: %s", domain)
+            domain = None
+
         return cls(
             name=cookie_name,
             value=cookie_value,
             http_only=http_only,
-            domain=domain,
-            path=path,
+            domain=domain or host,
+            path=path if path and path.startswith("/") else default_path(request_path),
             expiry_time=expiry_time,
-            persistent=persistent,
+            persistent=expiry_time is not None,
             secure=secure,
             samesite=samesite,
+            host_only=domain is None,
+            creation_time=now,
+            last_access_time=now,
         )
 
 
 class CookieStorage:
-    """A storage class for manipulating and reading internet cookies."""
-
-    def __init__(self, cookies: list[Cookie] | None = None) -> None:
-        if not cookies:
-            cookies = []
-        self.cookies = cookies
-        # TODO: cookies get sorted, getitem behavior
+    """A storage class for manipulating and reading internet cookies.
+
+    Cookies are indexed by the registrable domain of their domain, then by path, then by name and domain,
+    so the cookies of a request are found by looking up the paths that match it in a single domain's table.
+    A cookie with the same name, domain and path as a stored one replaces it.
+
+    Expiry times wait in a min-heap, which is popped up to the current time before cookies are read, so
+    expired cookies are removed lazily. Heap entries of cookies that were replaced or removed in the meantime
+    are skipped. Past `max_per_domain` cookies in one registrable domain or `max_cookies` in all, the least
+    recently used cookies are evicted.
+
+    With a `persistent_store`, persistent cookies are saved as they change, and the saved cookies of a
+    registrable domain are read in the first time a cookie of that domain is set or requested. Until then,
+    they are not counted or found by name.
+    """
+
+    def __init__(
+        self,
+        cookies: list[Cookie] | None = None,
+        *,
+        clock: Callable[[], float] = time.time,
+        max_per_domain: int = MAX_COOKIES_PER_DOMAIN,
+        max_cookies: int = MAX_COOKIES,
+        persistent_store: "PersistentCookieStore | None" = None,
+    ) -> None:
+        self.persistent_store: PersistentCookieStore | None = persistent_store
+        self.loaded_domains: set[str] = set()
+        self.clock: Callable[[], float] = clock
+        self.max_per_domain: int = max_per_domain
+        self.max_cookies: int = max_cookies
+        self.domains: dict[str, dict[str, dict[tuple[str, str], Cookie]]] = {}
+        # Cookies by casefolded name, for lookups by name alone
+        self.names: dict[str, dict[tuple[str, str, str], Cookie]] = {}
+        # Every cookie and the cookies of each registrable domain, least recently used first
+        self.recent: OrderedDict[tuple[str, str, str], Cookie] = OrderedDict()
+        self.domain_recent: dict[str, OrderedDict[tuple[str, str, str], Cookie]] = {}
+        self.expirations: list[tuple[float, int, Cookie]] = []
+        self.sequence: Iterator[int] = itertools.count()
+        now: float = self.clock()
+        for cookie in cookies or []:
+            self.store_at(cookie, now)
+
+    @property
+    def cookies(self) -> list[Cookie]:
+        """Every stored cookie, least recently used first."""
+        self.expire()
+        return list(self.recent.values())
+
+    def __len__(self) -> int:
+        """Count the stored cookies."""
+        self.expire()
+        return len(self.recent)
+
+    def load(self, domain: str) -> None:
+        """Read the saved cookies of a registrable domain in, the first time the domain is used."""
+        if self.persistent_store is None or domain in self.loaded_domains:
+            return
+        self.loaded_domains.add(domain)
+        now: float = self.clock()
+        saved: list[Cookie] = self.persistent_store.load(domain, now)
+        for cookie in sorted(saved, key=lambda cookie: cookie.last_access_time):
+            self.store_at(cookie, now, save=False)
+
+    def store(self, cookie: Cookie, *, save: bool = True) -> None:
+        """Store a cookie, replacing the one with the same name, domain and path but keeping its creation time.
+
+        A cookie that has already expired only removes the one it replaces. Unless `save` is False, the
+        change is passed on to the persistent store.
+        """
+        now: float = self.clock()
+        self.expire(now)
+        self.store_at(cookie, now, save=save)
+
+    def store_at(self, cookie: Cookie, now: float, *, save: bool = True) -> None:
+        """Store a cookie like `store`, at a time read by the caller.
+
+        Expired cookies are not removed first, so a caller storing a batch reads the clock and expires
+        cookies once for the whole batch.
+        """
+        key: tuple[str, str, str] = cookie.key
+        domain: str = registrable_domain(cookie.domain)
+        self.load(domain)
+        if (old := self.recent.get(key)) is not None:
+            cookie.creation_time = old.creation_time
+            self.remove(old, save=False)
+        expired: bool = cookie.is_expired(now)
+        if save and self.persistent_store is not None:
+            if cookie.persistent and not expired:
+                self.persistent_store.save(cookie)
+            elif old is not None and old.persistent:
+                self.persistent_store.delete(old)
+        if expired:
+            return
+
+        self.domains.setdefault(domain, {}).setdefault(cookie.path, {})[(cookie.name, cookie.domain)] = cookie
+        self.names.setdefault(cookie.name.casefold(), {})[key] = cookie
+        self.recent[key] = cookie
+        if (domain_recent := self.domain_recent.get(domain)) is None:
+            domain_recent = self.domain_recent[domain] = OrderedDict()
+        domain_recent[key] = cookie
+        if cookie.expiry_time is not None:
+            heapq.heappush(self.expirations, (cookie.expiry_time, next(self.sequence), cookie))
+            # Replaced cookies leave their entries behind, so rebuild the heap once most entries are stale
+            if len(self.expirations) > 2 * len(self.recent):
+                self.expirations = [entry for entry in self.expirations if self.recent.get(entry[2].key) is entry[2]]
+                heapq.heapify(self.expirations)
+        if len(domain_recent) > self.max_per_domain or len(self.recent) > self.max_cookies:
+            self.evict(domain)
+
+    def remove(self, cookie: Cookie, *, save: bool = True) -> None:
+        """Remove a stored cookie, dropping tables that become empty.
+
+        Unless `save` is False, a persistent cookie is deleted from the persistent store too.
+        """
+        domain: str = registrable_domain(cookie.domain)
+        paths = self.domains[domain]
+        del paths[cookie.path][(cookie.name, cookie.domain)]
+        if not paths[cookie.path]:
+            del paths[cookie.path]
+            if not paths:
+                del self.domains[domain]
+
+        name: str = cookie.name.casefold()
+        del self.names[name][cookie.key]
+        if not self.names[name]:
+            del self.names[name]
+
+        del self.recent[cookie.key]
+        del self.domain_recent[domain][cookie.key]
+        if not self.domain_recent[domain]:
+            del self.domain_recent[domain]
+
+        if save and self.persistent_store is not None and cookie.persistent:
+            self.persistent_store.delete(cookie)
+
+    def expire(self, now: float | None = None) -> None:
+        """Remove the cookies that have expired by `now`, which defaults to the current time."""
+        if now is None:
+            now = self.clock()
+        expirations: list[tuple[float, int, Cookie]] = self.expirations
+        while expirations and expirations[0][0] <= now:
+            _, _, cookie = heapq.heappop(expirations)
+            # Saved records of expired cookies are skipped when read in, so they need no deleting
+            if self.recent.get(cookie.key) is cookie:
+                self.remove(cookie, save=False)
+
+    def evict(self, domain: str) -> None:
+        """Remove least recently used cookies until the registrable `domain` and the jar are within limits."""
+        domain_recent = self.domain_recent.get(domain, {})
+        while len(domain_recent) > self.max_per_domain:
+            self.remove(next(iter(domain_recent.values())))
+        while len(self.recent) > self.max_cookies:
+            self.remove(next(iter(self.recent.values())))
 
     def handle_headers(self, headers: list[tuple[str, str]], request_host: str) -> None:
-        """Parse a list of raw headers and update internal storage."""
+        """Parse the raw headers of one response and update internal storage, ignoring invalid cookies.
+
+        The request URL is split, the time read and expired cookies removed once for the whole response.
+        Other headers are skipped by their spelling or length, without lowercasing them.
+        """
+        host, request_path, _ = split_request_url(request_host)
+        now: float = self.clock()
+        self.expire(now)
         for name, value in headers:
-            if name.casefold().strip() != "set-cookie":
+            if not is_set_cookie(name):
                 continue
 
-            self.cookies.append(Cookie.from_str(value, request_host))
+            try:
+                self.store_at(Cookie.parse(value, host, request_path, now), now)
+            except InvalidCookie as e:
+                print("Ignoring cookie:", e)
 
     @classmethod
-    def from_headers(cls, cookie_headers: list[str], request_host: str) -> Self:
+    def from_headers(
+        cls,
+        cookie_headers: list[str],
+        request_host: str,
+        *,
+        clock: Callable[[], float] = time.time,
+    ) -> Self:
         """Create a new cookiestorage from the relevant set-cookie headers."""
+        host, request_path, _ = split_request_url(request_host)
+        now: float = clock()
         cookies = []
         for header in cookie_headers:
-            match = re.match("(?P<name>[^:]+):(?P<value>.*)", header)
+            match = HEADER.match(header)
             if not match:
                 raise InvalidCookieHeader("Not a header: %s", header)
 
             name = match["name"]
             value = match["value"]
 
-            if name.casefold().strip() != "set-cookie":
+            if not is_set_cookie(name):
                 raise InvalidCookieHeader("Non-cookie header passed to cookie parser: %s", name)
 
-            cookies.append(Cookie.from_str(value, request_host))
-
-        return cls(cookies)
+            cookies.append(Cookie.parse(value, host, request_path, now))
+
+        return cls(cookies, clock=clock)
+
+    def cookies_for(self, request_url: str, *, for_javascript: bool = False) -> list[Cookie]:
+        """Select the cookies to send with a request, in the order of RFC 6265 section 5.4.
+
+        Only the tables of the paths matching the request are read. Secure cookies go to secure requests
+        only, and http only cookies are left out for javascript. The selected cookies count as used.
+        """
+        now: float = self.clock()
+        self.expire(now)
+        host, request_path, secure = split_request_url(request_url)
+        domain: str = registrable_domain(host)
+        if self.persistent_store is not None:
+            self.load(domain)
+        paths = self.domains.get(domain)
+        if not paths:
+            return []
+
+        # domain_matches, with the test of the request host read once for every cookie
+        subdomains: bool = not is_ip_address(host)
+        cookies: list[Cookie] = []
+        for path in matching_paths(request_path):
+            path_cookies = paths.get(path)
+            if path_cookies is None:
+                continue
+            # Paths come longest first, so only cookies with the same path need sorting by creation time
+            start: int = len(cookies)
+            cookies.extend(
+                cookie
+                for cookie in path_cookies.values()
+                if (
+                    host == cookie.domain
+                    or (not cookie.host_only and subdomains and host.endswith(f".{cookie.domain}"))
+                )
+                and (secure or not cookie.secure)
+                and not (for_javascript and cookie.http_only)
+            )
+            cookies[start:] = sorted(cookies[start:], key=lambda cookie: cookie.creation_time)
+
+        recent = self.recent
+        domain_recent = self.domain_recent[domain]
+        for cookie in cookies:
+            cookie.last_access_time = now
+            key: tuple[str, str, str] = cookie.key
+            recent.move_to_end(key)
+            domain_recent.move_to_end(key)
+        return cookies
 
-    def to_headers(self) -> str:
-        """Return the relevant cookies to construct a Cookie: request header."""
-        return {"Cookie:": self.to_cookie_string(for_javascript=False)}
+    def to_headers(self, request_url: str | None = None) -> dict[str, str]:
+        """Return the Cookie request header for a request, or for every cookie without a URL."""
+        cookie_string: str = self.to_cookie_string(request_url, for_javascript=False)
+        return {"Cookie": cookie_string} if cookie_string else {}
 
     def __getitem__(self, key: str) -> list[Cookie]:
         """Select all matching cookies by name."""
-        cookies = []
-        for cookie in self.cookies:
-            if cookie.name.casefold() == key.casefold():
-                cookies.append(cookie)
-        return cookies
+        self.expire()
+        return list(self.names.get(key.casefold(), {}).values())
 
     def set_cookie(self, cookie_data: str, request_host: str) -> None:
         """Set a single cookie from cookie data, usually from javascript."""
-        self.cookies.append(Cookie.from_str(cookie_data, request_host))
+        now: float = self.clock()
+        self.expire(now)
+        self.store_at(Cookie.from_str(cookie_data, request_host, now), now)
 
     def __add__(self, other: Self) -> Self:
-        """CookieStorages can be combined with +."""
+        """CookieStorages can be combined with +.
+
+        The combined jar saves to the persistent store of the left one, which already holds its cookies, so
+        only the cookies of the right one are saved.
+        """
         if isinstance(other, CookieStorage):
-            return self.__class__(self.cookies + other.cookies)
+            combined: Self = self.__class__(
+                clock=self.clock,
+                max_per_domain=self.max_per_domain,
+                max_cookies=self.max_cookies,
+                persistent_store=self.persistent_store,
+            )
+            # Saved cookies of the domains read in so far are among this jar's cookies already
+            combined.loaded_domains |= self.loaded_domains
+            now: float = self.clock()
+            for cookie in self.cookies:
+                combined.store_at(cookie, now, save=False)
+            for cookie in other.cookies:
+                combined.store_at(cookie, now)
+            return combined
 
         return NotImplemented
 
-    def to_cookie_string(self, *, for_javascript: bool = True) -> str:
-        """Read the cookiestore into a string suitable to return from window.cookie or in a cookie header."""
-        return "; ".join(
-            f"{cookie.name}={cookie.value}"
-            for cookie in sorted(self.cookies, key=lambda cookie: (len(cookie.path) if cookie.path else 0))
-            if cookie.http_only is not True
-            or for_javascript is False  # http only cookies are not readable from javascript
-        )
+    def to_cookie_string(self, request_url: str | None = None, *, for_javascript: bool = True) -> str:
+        """Read the cookiestore into a string suitable to return from window.cookie or in a cookie header.
+
+        Without a URL every cookie is included, longest path first.
+        """
+        if request_url is not None:
+            cookies: list[Cookie] = self.cookies_for(request_url, for_javascript=for_javascript)
+        else:
+            cookies = sorted(
+                (cookie for cookie in self.cookies if not (for_javascript and cookie.http_only)),
+                key=lambda cookie: (-len(cookie.path), cookie.creation_time),
+            )
+        return "; ".join(f"{cookie.name}={cookie.value}" for cookie in cookies)
+
+    def flush(self) -> None:
+        """Write the changes queued for the persistent store, if there is one."""
+        if self.persistent_store is not None:
+            self.persistent_store.flush(self.clock())
 
     def clear(self) -> None:
-        """Clear all cookies."""
-        self.cookies.clear()
+        """Clear all cookies, saved ones included."""
+        if self.persistent_store is not None:
+            self.persistent_store.clear()
+        self.domains.clear()
+        self.names.clear()
+        self.recent.clear()
+        self.domain_recent.clear()
+        self.expirations.clear()
 
     def end_session(self) -> None:
         """Clear all non-session cookies."""
-        self.cookies = [cookie for cookie in self.cookies if cookie.persistent]
+        for cookie in self.cookies:
+            if not cookie.persistent:
+                self.remove(cookie)
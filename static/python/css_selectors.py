@@ -0,0 +1,256 @@
+# Reference: https://www.w3.org/TR/selectors-4/
+import re
+from collections.abc import Callable, Generator
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from htmlparser_types import CompactDocument, Document, Element, ElementView
+
+    Node = Element | ElementView
+
+# One piece of a selector: a combinator with the whitespace around it, whitespace alone (the descendant
+# combinator), or one simple selector
+SELECTOR_TOKEN: re.Pattern = re.compile(
+    r"""
+    \s*(?P<combinator>[>,+~])\s*
+    | (?P<descendant>\s+)
+    | (?P<universal>\*)
+    | (?P<tag>[-\w]+)
+    | \#(?P<id>[-\w]+)
+    | \.(?P<class>[-\w]+)
+    | \[\s*(?P<attr>[-\w:]+)\s*
+        (?:(?P<op>[~|^$*]?=)\s*(?:"(?P<dq>[^"]*)"|'(?P<sq>[^']*)'|(?P<uq>[-\w]+))\s*)?
+      \]
+    """,
+    re.VERBOSE,
+)
+
+# Attribute selector operators, as tests of an attribute's value against the selector's value
+ATTR_TESTS: dict[str | None, Callable[[str, str], bool]] = {
+    None: lambda _value, _expected: True,
+    "=": lambda value, expected: value == expected,
+    "~=": lambda value, expected: expected in value.split(),
+    "|=": lambda value, expected: value == expected or value.startswith(expected + "-"),
+    "^=": lambda value, expected: bool(expected) and value.startswith(expected),
+    "$=": lambda value, expected: bool(expected) and value.endswith(expected),
+    "*=": lambda value, expected: bool(expected) and expected in value,
+}
+
+SELECTOR_CACHE_SIZE: int = 256
+
+
+@dataclass
+class Compound:
+    """A compound selector: a tag name with any number of id, class and attribute conditions."""
+
+    tag: str | None = None
+    universal: bool = False
+    element_id: str | None = None
+    classes: list[str] = field(default_factory=list)
+    attrs: list[tuple[str, str | None, str]] = field(default_factory=list)
+
+    def is_empty(self) -> bool:
+        """Whether no simple selector was given."""
+        return (
+            self.tag is None and not self.universal and self.element_id is None and not self.classes and not self.attrs
+        )
+
+    def add(self, match: re.Match, selector: str) -> None:
+        """Add the simple selector matched by `SELECTOR_TOKEN`."""
+        if match["universal"] is not None or match["tag"] is not None:
+            if not self.is_empty():
+                msg = f"Type selector not at the start of a compound in selector: {selector!r}"
+                raise ValueError(msg)
+            self.universal = match["universal"] is not None
+            self.tag = match["tag"].lower() if match["tag"] is not None else None
+        elif match["id"] is not None:
+            self.element_id = match["id"]
+        elif match["class"] is not None:
+            self.classes.append(match["class"])
+        else:
+            expected: str = next((match[group] for group in ("dq", "sq", "uq") if match[group] is not None), "")
+            self.attrs.append((match["attr"].lower(), match["op"], expected))
+
+
+@dataclass(frozen=True)
+class CompiledSelector:
+    """A selector list compiled into one matcher function per complex selector.
+
+    `subjects` holds the rightmost compound of each complex selector, which picks the candidates to match.
+    """
+
+    matchers: tuple[Callable[["Node"], bool], ...]
+    subjects: tuple[Compound, ...]
+
+    def matches(self, el: "Node") -> bool:
+        """Whether an element matches any selector in the list."""
+        return any(matcher(el) for matcher in self.matchers)
+
+
+def parse_selector(selector: str) -> list[list[tuple[str, Compound]]]:
+    """Split a selector list into complex selectors of (combinator, compound) pairs, read left to right.
+
+    The combinator of a pair joins its compound to the one before it, and is empty for the first one.
+    """
+    selectors: list[list[tuple[str, Compound]]] = []
+    complex_selector: list[tuple[str, Compound]] = []
+    combinator: str = ""
+    compound: Compound = Compound()
+
+    def end_compound() -> None:
+        nonlocal compound
+        if compound.is_empty():
+            msg = f"Missing compound selector in selector: {selector!r}"
+            raise ValueError(msg)
+        complex_selector.append((combinator, compound))
+        compound = Compound()
+
+    text: str = selector.strip()
+    pos: int = 0
+    while pos < len(text):
+        match = SELECTOR_TOKEN.match(text, pos)
+        if match is None:
+            msg = f"Unsupported selector: {selector!r}"
+            raise ValueError(msg)
+        pos = match.end()
+
+        if match["combinator"] is None and match["descendant"] is None:
+            compound.add(match, selector)
+            continue
+
+        value: str = match["combinator"] or " "
+        if value in "+~":
+            msg = f"Unsupported combinator {value!r} in selector: {selector!r}"
+            raise ValueError(msg)
+        end_compound()
+        if value == ",":
+            selectors.append(complex_selector)
+            complex_selector = []
+            combinator = ""
+        else:
+            combinator = value
+
+    end_compound()
+    selectors.append(complex_selector)
+    return selectors
+
+
+def compile_compound(compound: Compound) -> Callable[["Node"], bool]:
+    """Compile a compound selector into a function that tests one element, cheapest conditions first."""
+    tag: str | None = compound.tag
+    element_id: str | None = compound.element_id
+    classes: list[str] = compound.classes
+    attr_tests: list[tuple[str, Callable[[str, str], bool], str]] = [
+        (name, ATTR_TESTS[op], expected) for name, op, expected in compound.attrs
+    ]
+
+    def match(el: "Node") -> bool:
+        if tag is not None and el.name != tag:
+            return False
+        if element_id is None and not classes and not attr_tests:
+            return True
+
+        attrs: dict[str, str] = el.attrs
+        if element_id is not None and attrs.get("id") != element_id:
+            return False
+        if classes:
+            el_classes: list[str] = attrs.get("class", "").split()
+            if any(class_name not in el_classes for class_name in classes):
+                return False
+        for name, test, expected in attr_tests:
+            value: str | None = attrs.get(name)
+            if value is None or not test(value, expected):
+                return False
+        return True
+
+    return match
+
+
+def compile_complex(complex_selector: list[tuple[str, Compound]]) -> Callable[["Node"], bool]:
+    """Compile a complex selector into a matcher that checks the element first and then walks up from it.
+
+    Each step tests its own compound before looking at any ancestor, so most elements are rejected by the
+    rightmost compound alone.
+    """
+    _, first = complex_selector[0]
+    matcher: Callable[[Node], bool] = compile_compound(first)
+    for combinator, compound in complex_selector[1:]:
+        matcher = chain_matcher(compile_compound(compound), combinator, matcher)
+    return matcher
+
+
+def chain_matcher(
+    match_self: Callable[["Node"], bool],
+    combinator: str,
+    match_left: Callable[["Node"], bool],
+) -> Callable[["Node"], bool]:
+    """Join an element's own test to the matcher of the selector left of `combinator`."""
+    if combinator == ">":
+
+        def match_child(el: "Node") -> bool:
+            if not match_self(el):
+                return False
+            parent = el.parent
+            return parent.is_element and match_left(parent)
+
+        return match_child
+
+    def match_descendant(el: "Node") -> bool:
+        if not match_self(el):
+            return False
+        ancestor = el.parent
+        while ancestor.is_element:
+            if match_left(ancestor):
+                return True
+            ancestor = ancestor.parent
+        return False
+
+    return match_descendant
+
+
+@lru_cache(maxsize=SELECTOR_CACHE_SIZE)
+def compile_selector(selector: str) -> CompiledSelector:
+    """Compile a selector list, reusing the compiled form of recently used selectors."""
+    complex_selectors: list[list[tuple[str, Compound]]] = parse_selector(selector)
+    return CompiledSelector(
+        matchers=tuple(compile_complex(complex_selector) for complex_selector in complex_selectors),
+        subjects=tuple(complex_selector[-1][1] for complex_selector in complex_selectors),
+    )
+
+
+def iter_elements(document: "Document | CompactDocument") -> Generator["Node", None, None]:
+    """Yield every element of a document in document order."""
+    stack: list[Node] = list(reversed(document.children))
+    while stack:
+        el: Node = stack.pop()
+        yield el
+        stack.extend(reversed(el.children))
+
+
+def candidates(document: "Document | CompactDocument", subject: Compound) -> list["Node"] | None:
+    """Pick the elements that can match a compound from the document's indexes, in document order.
+
+    Returns None when the compound has no indexed condition, so every element has to be tried.
+    """
+    if subject.element_id is not None:
+        return document.elements_with_id(subject.element_id)
+    if subject.classes:
+        return document.get_elements_by_class_name(" ".join(subject.classes))
+    if subject.tag is not None:
+        return document.get_elements_by_tag_name(subject.tag)
+    return None
+
+
+def select(document: "Document | CompactDocument", selector: str) -> Generator["Node", None, None]:
+    """Yield the elements matching a selector list in document order."""
+    compiled: CompiledSelector = compile_selector(selector)
+    if len(compiled.matchers) == 1:
+        indexed: list[Node] | None = candidates(document, compiled.subjects[0])
+        if indexed is not None:
+            match: Callable[[Node], bool] = compiled.matchers[0]
+            yield from (el for el in indexed if match(el))
+            return
+
+    yield from (el for el in iter_elements(document) if compiled.matches(el))
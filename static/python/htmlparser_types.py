@@ -1,10 +1,13 @@
+from array import array
 from collections import deque
-from collections.abc import Generator
+from collections.abc import Collection, Generator
 from dataclasses import dataclass, field
-from typing import Literal, Union
+from typing import Literal, Self, Union
 
+from css_selectors import select
 
-@dataclass
+
+@dataclass(slots=True)
 class Attribute:
     """Represents a tags attribute(s)."""
 
@@ -12,9 +15,13 @@ class Attribute:
     value: str
 
 
-@dataclass
+@dataclass(slots=True)
 class Token:
-    """Represent HTML tokens."""
+    """Represent HTML tokens.
+
+    The tokenizer reuses a few token objects for the whole parse, so a consumer must copy what it needs from
+    a token before returning.
+    """
 
     kind: str | None = None
     char: str | None = None
@@ -24,13 +31,175 @@ class Token:
     self_closing: bool = False
     data: str | None = None
 
+    def reset(self, kind: str) -> Self:
+        """Clear the token so it can be filled in as a new token of `kind`."""
+        self.kind = kind
+        self.char = None
+        self.tag_name = ""
+        self.attrs = None
+        self.curr_attr = None
+        self.self_closing = False
+        self.data = ""
+        return self
+
+
+def split_class_names(class_names: str) -> list[str]:
+    """Split a class attribute or a class name query into its distinct class names."""
+    return list(dict.fromkeys(class_names.split()))
+
+
+@dataclass
+class ElementIndex:
+    """The elements of a document by id, tag name and class name.
+
+    Each table maps a name to the elements carrying it, keyed by ``id()`` so an element is removed in O(1).
+    Elements are listed in the order they were added, which is document order for a parsed document.
+    """
+
+    by_id: dict[str, dict[int, "Element"]] = field(default_factory=dict)
+    by_tag: dict[str, dict[int, "Element"]] = field(default_factory=dict)
+    by_class: dict[str, dict[int, "Element"]] = field(default_factory=dict)
+
+    def entries(self, el: "Element") -> list[tuple[dict[str, dict[int, "Element"]], str]]:
+        """Return the tables an element belongs in, each with the name it is listed under."""
+        entries: list[tuple[dict[str, dict[int, Element]], str]] = [(self.by_tag, el.name)]
+        if el_id := el.attrs.get("id"):
+            entries.append((self.by_id, el_id))
+        entries.extend((self.by_class, class_name) for class_name in split_class_names(el.attrs.get("class", "")))
+        return entries
+
+    def add(self, el: "Element") -> None:
+        """List an element under its tag name, id and classes."""
+        for table, name in self.entries(el):
+            table.setdefault(name, {})[id(el)] = el
+
+    def remove(self, el: "Element") -> None:
+        """Drop an element from every table it is listed in."""
+        for table, name in self.entries(el):
+            if (elements := table.get(name)) is not None:
+                elements.pop(id(el), None)
+                if not elements:
+                    del table[name]
+
+
+def intersect_class_tables(tables: list[Collection]) -> list:
+    """Return the keys, in the order of the smallest table, found in every table of a class name query."""
+    if not tables:
+        return []
+    smallest: Collection = min(tables, key=len)
+    others: list[Collection] = [table for table in tables if table is not smallest]
+    return [key for key in smallest if all(key in other for other in others)]
+
+
+def last_descendant(el: "Element") -> "Element":
+    """Return the element's last descendant in document order, or the element itself when it has none."""
+    while el.children:
+        el = el.children[-1]
+    return el
+
 
 @dataclass
 class Document:
-    """Represent the HTML document."""
+    """Represent the HTML document.
+
+    Elements are indexed by id, tag name and class as they are added, so lookups do not walk the tree. Add
+    and remove elements with `append_child` and `remove_child` to keep the indexes in step with the tree.
+    The indexes list elements in document order: appending below anything but the last element in document
+    order marks them stale, and the next lookup rebuilds them from the tree.
+    """
 
     is_element: bool = False
     children: list["Element"] = field(default_factory=list)
+    index: ElementIndex = field(default_factory=ElementIndex, repr=False, compare=False)
+    # The last element in document order, and whether the index still lists elements in document order
+    last: Union["Element", None] = field(default=None, repr=False, compare=False)
+    in_order: bool = field(default=True, repr=False, compare=False)
+
+    def append_child(self, parent: Union["Element", "Document"], el: "Element") -> None:
+        """Append an element, and everything below it, as the last child of `parent`."""
+        if self.in_order:
+            # The new element comes last in document order only when `parent` is the last element or one of
+            # its ancestors. While parsing, that walk stops after the elements closed since the last append.
+            node: Element | Document | None = self.last if self.last is not None else self
+            while node is not None and node is not parent and node is not self:
+                node = node.parent
+            self.in_order = node is parent
+
+        el.parent = parent
+        parent.children.append(el)
+        stack: list[Element] = [el]
+        while stack:
+            curr: Element = stack.pop()
+            self.index.add(curr)
+            stack.extend(curr.children)
+        if self.in_order:
+            self.last = last_descendant(el)
+
+    def remove_child(self, el: "Element") -> None:
+        """Remove an element, and everything below it, from the document.
+
+        Raises ValueError when the element is not in the document.
+        """
+        siblings: list[Element] = el.parent.children if el.parent is not None else []
+        position: int | None = next((position for position, child in enumerate(siblings) if child is el), None)
+        if position is None:
+            msg = f"<{el.name}> is not in the document"
+            raise ValueError(msg)
+
+        del siblings[position]
+        el.parent = None
+        stack: list[Element] = [el]
+        while stack:
+            curr: Element = stack.pop()
+            self.index.remove(curr)
+            stack.extend(curr.children)
+        self.last = last_descendant(self.children[-1]) if self.children else None
+
+    def ordered_index(self) -> ElementIndex:
+        """Return the index, first rebuilding it in document order if appends left it out of order."""
+        if not self.in_order:
+            self.index = ElementIndex()
+            stack: list[Element] = list(reversed(self.children))
+            while stack:
+                curr: Element = stack.pop()
+                self.index.add(curr)
+                stack.extend(reversed(curr.children))
+            self.last = last_descendant(self.children[-1]) if self.children else None
+            self.in_order = True
+        return self.index
+
+    def get_element_by_id(self, element_id: str) -> Union["Element", None]:
+        """Return the first element with the given id, or None."""
+        return next(iter(self.ordered_index().by_id.get(element_id, {}).values()), None)
+
+    def elements_with_id(self, element_id: str) -> list["Element"]:
+        """Return every element with the given id, for pages that reuse ids."""
+        return list(self.ordered_index().by_id.get(element_id, {}).values())
+
+    def get_elements_by_tag_name(self, tag_name: str) -> list["Element"]:
+        """Return the elements with the given tag name."""
+        return list(self.ordered_index().by_tag.get(tag_name.lower(), {}).values())
+
+    def get_elements_by_class_name(self, class_names: str) -> list["Element"]:
+        """Return the elements that have every one of the space-separated class names."""
+        index: ElementIndex = self.ordered_index()
+        tables: list[dict[int, Element]] = [index.by_class.get(name, {}) for name in split_class_names(class_names)]
+        keys: list[int] = intersect_class_tables(tables)
+        return [tables[0][key] for key in keys]
+
+    @property
+    def title(self) -> str:
+        """The text of the first title element, with whitespace collapsed, or an empty string."""
+        titles: dict[int, Element] = self.ordered_index().by_tag.get("title", {})
+        return " ".join(next(iter(titles.values())).text.split()) if titles else ""
+
+    def query_selector(self, selector: str) -> Union["Element", None]:
+        """Return the first element matching a CSS selector list, or None."""
+        return next(select(self, selector), None)
+
+    def query_selector_all(self, selector: str) -> list["Element"]:
+        """Return the elements matching a CSS selector list, in document order."""
+        return list(select(self, selector))
 
     def traverse(self) -> Generator["Element", None, None]:
         """Traverse HTML Document object."""
@@ -64,6 +233,86 @@ class Document:
                 else:
                     print(f"{name_str}{attrs_str}{node.text.strip()}")
 
+    def to_compact(self) -> dict[str, list | str]:
+        """Flatten the tree into parallel arrays that are cheap to serialise and send between threads.
+
+        Nodes are numbered in document order, so every parent comes before its children:
+            names: tag name table, tags: name id of each node, parents: parent node (-1 for the document),
+            hidden: dont_display flags, text: every node's text in one string, text_ends: end offset of each
+            node's text, attr_nodes/attr_names/attr_values: one entry per attribute.
+        """
+        name_ids: dict[str, int] = {}
+        texts: list[str] = []
+        compact: dict[str, list | str] = {
+            "names": [],
+            "tags": [],
+            "parents": [],
+            "hidden": [],
+            "text": "",
+            "text_ends": [],
+            "attr_nodes": [],
+            "attr_names": [],
+            "attr_values": [],
+        }
+        text_end: int = 0
+        stack: list[tuple[int, Element]] = [(-1, child) for child in reversed(self.children)]
+        while stack:
+            parent, node = stack.pop()
+            index: int = len(compact["tags"])
+            if node.name not in name_ids:
+                name_ids[node.name] = len(compact["names"])
+                compact["names"].append(node.name)
+            compact["tags"].append(name_ids[node.name])
+            compact["parents"].append(parent)
+            compact["hidden"].append(int(node.dont_display))
+            texts.append(node.text)
+            text_end += len(node.text)
+            compact["text_ends"].append(text_end)
+            for name, value in node.attrs.items():
+                compact["attr_nodes"].append(index)
+                compact["attr_names"].append(name)
+                compact["attr_values"].append(value)
+            stack.extend((index, child) for child in reversed(node.children))
+
+        compact["text"] = "".join(texts)
+        return compact
+
+    @classmethod
+    def from_compact(cls, compact: dict[str, list | str]) -> Self:
+        """Rebuild a document from the arrays produced by `to_compact`."""
+        document = cls()
+        nodes: list[Element] = []
+        names: list[str] = compact["names"]
+        text: str = compact["text"]
+        attrs: list[dict[str, str]] = [{} for _ in compact["tags"]]
+        attr_entries = zip(compact["attr_nodes"], compact["attr_names"], compact["attr_values"], strict=True)
+        for node, name, value in attr_entries:
+            attrs[node][name] = value
+
+        text_start: int = 0
+        for tag, parent_index, hidden, text_end, node_attrs in zip(
+            compact["tags"],
+            compact["parents"],
+            compact["hidden"],
+            compact["text_ends"],
+            attrs,
+            strict=True,
+        ):
+            parent: Element | Document = document if parent_index < 0 else nodes[parent_index]
+            el = Element(
+                name=names[tag],
+                attrs=node_attrs,
+                text=text[text_start:text_end],
+                children=[],
+                parent=parent,
+                dont_display=bool(hidden),
+            )
+            document.append_child(parent, el)
+            nodes.append(el)
+            text_start = text_end
+
+        return document
+
 
 @dataclass
 class Element:
@@ -73,12 +322,307 @@ class Element:
     attrs: dict[str, str]
     text: str
     children: list["Element"]
-    parent: Union["Element", Document]
+    parent: Union["Element", Document, None]
     dont_display: bool
     is_element: bool = True
 
 
-@dataclass
+class CompactDocument:
+    """An HTML document stored as parallel arrays instead of one object per node.
+
+    Node ``i`` is described by the ``i``-th item of every array: its interned tag name id, its parent, first
+    child, last child and next sibling (-1 when there is none, or for the document itself as a parent), and
+    its text as a span of one shared buffer. Its attributes are the run of the attribute table starting at
+    ``attr_starts[i]``, with values stored back to back in a second buffer. Nodes are numbered in document
+    order. `ElementView` objects are made on demand, so walking the tree with `traverse` and `children`
+    works as it does on `Document`, and so do the indexed lookups, kept as arrays of node indexes.
+    """
+
+    is_element: bool = False
+
+    def __init__(self) -> None:
+        self.names: list[str] = []
+        self.name_ids: dict[str, int] = {}
+        self.tags: array[int] = array("i")
+        self.parents: array[int] = array("i")
+        self.first_children: array[int] = array("i")
+        self.last_children: array[int] = array("i")
+        self.next_siblings: array[int] = array("i")
+        self.hidden: bytearray = bytearray()
+        self.text_starts: array[int] = array("i")
+        self.text_ends: array[int] = array("i")
+        self.attr_starts: array[int] = array("i")
+        self.attr_names: array[int] = array("i")
+        # Attribute j's value ends at attr_value_ends[j] and starts where attribute j - 1's ends
+        self.attr_value_ends: array[int] = array("i")
+        self.first_child: int = -1
+        self.last_child: int = -1
+        # Node indexes by id, tag name id and class name, in document order
+        self.id_index: dict[str, array[int]] = {}
+        self.tag_index: dict[int, array[int]] = {}
+        self.class_index: dict[str, array[int]] = {}
+        # Pieces appended since the buffers were last joined into a single string each
+        self.text_parts: list[str] = []
+        self.text_length: int = 0
+        self.attr_value_parts: list[str] = []
+        self.attr_value_length: int = 0
+
+    def __len__(self) -> int:
+        return len(self.tags)
+
+    def name_id(self, name: str) -> int:
+        """Return the id of a tag or attribute name, adding it to the name table if it is new."""
+        if (name_id := self.name_ids.get(name)) is None:
+            name_id = self.name_ids[name] = len(self.names)
+            self.names.append(name)
+        return name_id
+
+    def append_element(self, parent: int, name: str, attrs: dict[str, str], *, dont_display: bool = False) -> int:
+        """Add an element as the last child of `parent` (-1 for the document) and return its index."""
+        index: int = len(self.tags)
+        tag: int = self.name_id(name)
+        self.tags.append(tag)
+        self.parents.append(parent)
+        self.first_children.append(-1)
+        self.last_children.append(-1)
+        self.next_siblings.append(-1)
+        self.hidden.append(dont_display)
+        self.text_starts.append(self.text_length)
+        self.text_ends.append(self.text_length)
+        self.attr_starts.append(len(self.attr_names))
+        for attr_name, value in attrs.items():
+            self.attr_names.append(self.name_id(attr_name))
+            self.attr_value_parts.append(value)
+            self.attr_value_length += len(value)
+            self.attr_value_ends.append(self.attr_value_length)
+
+        self.tag_index.setdefault(tag, array("i")).append(index)
+        if el_id := attrs.get("id"):
+            self.id_index.setdefault(el_id, array("i")).append(index)
+        for class_name in split_class_names(attrs.get("class", "")):
+            self.class_index.setdefault(class_name, array("i")).append(index)
+
+        previous: int = self.last_children[parent] if parent >= 0 else self.last_child
+        if previous >= 0:
+            self.next_siblings[previous] = index
+        elif parent >= 0:
+            self.first_children[parent] = index
+        else:
+            self.first_child = index
+        if parent >= 0:
+            self.last_children[parent] = index
+        else:
+            self.last_child = index
+        return index
+
+    def append_text(self, index: int, text: str) -> None:
+        """Append text to a node, moving its span to the end of the buffer if something was added after it."""
+        if self.text_ends[index] != self.text_length:
+            existing: str = self.text(index)
+            self.text_starts[index] = self.text_length
+            self.text_parts.append(existing)
+            self.text_length += len(existing)
+        self.text_parts.append(text)
+        self.text_length += len(text)
+        self.text_ends[index] = self.text_length
+
+    @staticmethod
+    def join(parts: list[str]) -> str:
+        """Join a buffer's pieces in place into one string and return it."""
+        if len(parts) > 1:
+            parts[:] = ["".join(parts)]
+        return parts[0] if parts else ""
+
+    def join_buffers(self) -> None:
+        """Join the text and attribute buffers, releasing the per-piece strings once parsing is done."""
+        self.join(self.text_parts)
+        self.join(self.attr_value_parts)
+
+    def text(self, index: int) -> str:
+        """Return a node's text."""
+        start, end = self.text_starts[index], self.text_ends[index]
+        return self.join(self.text_parts)[start:end] if start != end else ""
+
+    def attr_range(self, index: int) -> range:
+        """Return the positions of a node's attributes in the attribute table."""
+        end: int = self.attr_starts[index + 1] if index + 1 < len(self.attr_starts) else len(self.attr_names)
+        return range(self.attr_starts[index], end)
+
+    def attrs(self, index: int) -> dict[str, str]:
+        """Return a new dict of a node's attributes."""
+        attrs: dict[str, str] = {}
+        values: str = self.join(self.attr_value_parts)
+        for attr in self.attr_range(index):
+            start: int = self.attr_value_ends[attr - 1] if attr > 0 else 0
+            attrs[self.names[self.attr_names[attr]]] = values[start : self.attr_value_ends[attr]]
+        return attrs
+
+    def child_indexes(self, index: int) -> Generator[int, None, None]:
+        """Yield the indexes of a node's children (-1 for the document's)."""
+        child: int = self.first_children[index] if index >= 0 else self.first_child
+        while child >= 0:
+            yield child
+            child = self.next_siblings[child]
+
+    @property
+    def children(self) -> list["ElementView"]:
+        """Views of the top-level elements."""
+        return [ElementView(self, child) for child in self.child_indexes(-1)]
+
+    def get_element_by_id(self, element_id: str) -> Union["ElementView", None]:
+        """Return a view of the first element with the given id, or None."""
+        nodes: array[int] | None = self.id_index.get(element_id)
+        return ElementView(self, nodes[0]) if nodes else None
+
+    def elements_with_id(self, element_id: str) -> list["ElementView"]:
+        """Return views of every element with the given id, for pages that reuse ids."""
+        return [ElementView(self, node) for node in self.id_index.get(element_id, ())]
+
+    def get_elements_by_tag_name(self, tag_name: str) -> list["ElementView"]:
+        """Return views of the elements with the given tag name."""
+        tag: int | None = self.name_ids.get(tag_name.lower())
+        return [ElementView(self, node) for node in self.tag_index.get(tag, ())]
+
+    def get_elements_by_class_name(self, class_names: str) -> list["ElementView"]:
+        """Return views of the elements that have every one of the space-separated class names."""
+        names: list[str] = split_class_names(class_names)
+        if len(names) == 1:
+            nodes: Collection[int] = self.class_index.get(names[0], ())
+        else:
+            nodes = sorted(intersect_class_tables([set(self.class_index.get(name, ())) for name in names]))
+        return [ElementView(self, node) for node in nodes]
+
+    @property
+    def title(self) -> str:
+        """The text of the first title element, with whitespace collapsed, or an empty string."""
+        titles: array[int] = self.tag_index.get(self.name_ids.get("title"), array("i"))
+        return " ".join(self.text(titles[0]).split()) if titles else ""
+
+    def query_selector(self, selector: str) -> Union["ElementView", None]:
+        """Return a view of the first element matching a CSS selector list, or None."""
+        return next(select(self, selector), None)
+
+    def query_selector_all(self, selector: str) -> list["ElementView"]:
+        """Return views of the elements matching a CSS selector list, in document order."""
+        return list(select(self, selector))
+
+    def traverse(self) -> Generator[Union["CompactDocument", "ElementView"], None, None]:
+        """Traverse the document breadth first, like `Document.traverse`."""
+        yield self
+        q: deque[int] = deque(self.child_indexes(-1))
+        while q:
+            curr: int = q.popleft()
+            yield ElementView(self, curr)
+            q.extend(self.child_indexes(curr))
+
+    def to_compact(self) -> dict[str, list | str]:
+        """Export the arrays in the format of `Document.to_compact`."""
+        texts: list[str] = [self.text(index) for index in range(len(self.tags))]
+        text_ends: list[int] = []
+        text_end: int = 0
+        for text in texts:
+            text_end += len(text)
+            text_ends.append(text_end)
+
+        attr_nodes: list[int] = []
+        attr_values: list[str] = []
+        for index in range(len(self.tags)):
+            attrs: dict[str, str] = self.attrs(index)
+            attr_nodes.extend([index] * len(attrs))
+            attr_values.extend(attrs.values())
+
+        return {
+            "names": list(self.names),
+            "tags": self.tags.tolist(),
+            "parents": self.parents.tolist(),
+            "hidden": list(self.hidden),
+            "text": "".join(texts),
+            "text_ends": text_ends,
+            "attr_nodes": attr_nodes,
+            "attr_names": [self.names[name] for name in self.attr_names],
+            "attr_values": attr_values,
+        }
+
+    @classmethod
+    def from_compact(cls, compact: dict[str, list | str]) -> Self:
+        """Build a document from the format of `Document.to_compact` without making an object per node."""
+        document = cls()
+        names: list[str] = compact["names"]
+        attr_nodes: list[int] = compact["attr_nodes"]
+        attrs = zip(attr_nodes, compact["attr_names"], compact["attr_values"], strict=True)
+        attr: tuple[int, str, str] | None = next(attrs, None)
+        for index, (tag, parent, hidden) in enumerate(
+            zip(compact["tags"], compact["parents"], compact["hidden"], strict=True),
+        ):
+            node_attrs: dict[str, str] = {}
+            while attr is not None and attr[0] == index:
+                node_attrs[attr[1]] = attr[2]
+                attr = next(attrs, None)
+            document.append_element(parent, names[tag], node_attrs, dont_display=bool(hidden))
+
+        # The compact text is already in node order, so it becomes the buffer as it is
+        text: str = compact["text"]
+        document.text_parts = [text]
+        document.text_length = len(text)
+        document.text_ends = array("i", compact["text_ends"])
+        document.text_starts = array("i", [0, *compact["text_ends"][:-1]][: len(document.text_ends)])
+        document.join_buffers()
+        return document
+
+
+class ElementView:
+    """A node of a `CompactDocument`, read through the same attributes as `Element`."""
+
+    __slots__ = ("document", "index")
+
+    is_element: bool = True
+
+    def __init__(self, document: CompactDocument, index: int) -> None:
+        self.document: CompactDocument = document
+        self.index: int = index
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, ElementView) and other.document is self.document and other.index == self.index
+
+    def __hash__(self) -> int:
+        return hash((id(self.document), self.index))
+
+    def __repr__(self) -> str:
+        return f"ElementView({self.index}, {self.name!r})"
+
+    @property
+    def name(self) -> str:
+        """The tag name."""
+        return self.document.names[self.document.tags[self.index]]
+
+    @property
+    def attrs(self) -> dict[str, str]:
+        """A new dict of the element's attributes."""
+        return self.document.attrs(self.index)
+
+    @property
+    def text(self) -> str:
+        """The element's text."""
+        return self.document.text(self.index)
+
+    @property
+    def dont_display(self) -> bool:
+        """Whether the element is hidden from rendering."""
+        return bool(self.document.hidden[self.index])
+
+    @property
+    def children(self) -> list["ElementView"]:
+        """Views of the element's children."""
+        return [ElementView(self.document, child) for child in self.document.child_indexes(self.index)]
+
+    @property
+    def parent(self) -> Union["ElementView", CompactDocument]:
+        """A view of the parent element, or the document for a top-level element."""
+        parent: int = self.document.parents[self.index]
+        return ElementView(self.document, parent) if parent >= 0 else self.document
+
+
+@dataclass(slots=True)
 class ParserState:
     """Represent state of the parser."""
 
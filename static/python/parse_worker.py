@@ -0,0 +1,43 @@
+# Runs in a PyScript worker, which browser_nav.py starts when PARSE_IN_WORKER is on. Nothing here touches the
+# DOM, so the same module can be driven from a plain process with client_modules.py, as the proxy and
+# worker_harness.py do.
+import json
+
+from _htmlparser import Parser, parse_html
+from htmlparser_types import Document
+
+# Parsers of pages that are still downloading, by the page id the main thread picked
+parsers: dict[int, Parser] = {}
+
+
+def compact_json(document: Document) -> str:
+    """Serialise a document to the compact form sent back to the main thread."""
+    return json.dumps(document.to_compact(), separators=(",", ":"))
+
+
+def begin(page_id: int) -> None:
+    """Start parsing a new page."""
+    parsers[page_id] = Parser()
+
+
+def feed(page_id: int, chunk: str) -> None:
+    """Parse the next downloaded chunk of a page."""
+    parsers[page_id].feed(chunk)
+
+
+def close(page_id: int) -> str:
+    """Finish a page and return its document as compact JSON."""
+    return compact_json(parsers.pop(page_id).close())
+
+
+def discard(page_id: int) -> None:
+    """Drop the parser of a page whose load failed, if it was started."""
+    parsers.pop(page_id, None)
+
+
+def parse(html: str) -> str:
+    """Parse a whole page in one call and return its document as compact JSON."""
+    return compact_json(parse_html(html))
+
+
+__export__ = ["begin", "feed", "close", "discard", "parse"]
@@ -0,0 +1,133 @@
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from functools import partial
+from typing import TYPE_CHECKING, Any
+
+from tokenizer import Tokenizer
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+    from htmlparser_types import ParserState, Token
+    from treeconstructor import TreeConstructor
+
+
+@dataclass
+class ParseReport:
+    """What one instrumented parse spent its time on.
+
+    Characters are counted against the tokenizer state that consumed them, tokens by the kind the tree
+    constructor received, reconsumes by the state that asked for one and parse errors by message. Tree
+    building time is the time spent inside the tree constructor; tokenizing time is the rest of the time
+    spent in the tokenizer.
+    """
+
+    chars_by_state: Counter[str] = field(default_factory=Counter)
+    tokens_by_kind: Counter[str] = field(default_factory=Counter)
+    reconsumes_by_state: Counter[str] = field(default_factory=Counter)
+    errors_by_type: Counter[str] = field(default_factory=Counter)
+    tokenize_seconds: float = 0.0
+    tree_build_seconds: float = 0.0
+
+    @property
+    def chars(self) -> int:
+        """Characters consumed in all states."""
+        return self.chars_by_state.total()
+
+    @property
+    def tokens(self) -> int:
+        """Tokens of all kinds."""
+        return self.tokens_by_kind.total()
+
+    @property
+    def reconsumes(self) -> int:
+        """Reconsumes in all states."""
+        return self.reconsumes_by_state.total()
+
+    @property
+    def errors(self) -> int:
+        """Parse errors of all types."""
+        return self.errors_by_type.total()
+
+    def format(self) -> str:
+        """Lay the report out as text, busiest entries first."""
+        tokenize_ms: float = self.tokenize_seconds * 1000
+        tree_build_ms: float = self.tree_build_seconds * 1000
+        lines: list[str] = [f"tokenizing: {tokenize_ms:.2f} ms, tree building: {tree_build_ms:.2f} ms"]
+        sections: tuple[tuple[str, int, Counter[str]], ...] = (
+            ("chars by state", self.chars, self.chars_by_state),
+            ("tokens by kind", self.tokens, self.tokens_by_kind),
+            ("reconsumes by state", self.reconsumes, self.reconsumes_by_state),
+            ("errors by type", self.errors, self.errors_by_type),
+        )
+        for title, total, counts in sections:
+            lines.append(f"{title}: {total}")
+            lines.extend(f"  {name}: {count}" for name, count in counts.most_common())
+        return "\n".join(lines)
+
+
+class TimedTreeConstructor:
+    """Wrap a tree constructor, counting and timing every token it processes.
+
+    Everything other than `process` is forwarded to the wrapped tree constructor, so this works for either
+    kind of tree constructor.
+    """
+
+    def __init__(self, tree_constructor: "TreeConstructor", report: ParseReport) -> None:
+        self.tree_constructor: TreeConstructor = tree_constructor
+        self.report: ParseReport = report
+
+    def process(self, token: "Token") -> None:
+        """Pass a token on to the wrapped tree constructor."""
+        self.report.tokens_by_kind[token.kind] += 1
+        start: float = time.perf_counter()
+        self.tree_constructor.process(token)
+        self.report.tree_build_seconds += time.perf_counter() - start
+
+    def __getattr__(self, name: str) -> Any:  # noqa: ANN401
+        """Read anything else, such as `document` or `flush_text`, from the wrapped tree constructor."""
+        return getattr(self.tree_constructor, name)
+
+
+class InstrumentedTokenizer(Tokenizer):
+    """A tokenizer that records what it does in a `ParseReport`.
+
+    Characters and reconsumes are counted through the `count_step` hook of `Tokenizer`, which the plain
+    tokenizer leaves unset. Tokens should go to a `TimedTreeConstructor` sharing the report, which times the
+    tree building.
+    """
+
+    def __init__(self, parser_state: "ParserState", tree_constructor: TimedTreeConstructor) -> None:
+        super().__init__(parser_state, tree_constructor)
+        self.report: ParseReport = tree_constructor.report
+        self.count_step = self.count
+
+    def count(self, state: str, consumed: int) -> None:
+        """Count the characters a state consumed, or a reconsume when it consumed none."""
+        if consumed:
+            self.report.chars_by_state[state] += consumed
+        else:
+            self.report.reconsumes_by_state[state] += 1
+
+    def parse_error(self, message: str) -> None:
+        """Count a parse error by its message, then report it as usual."""
+        self.report.errors_by_type[message] += 1
+        super().parse_error(message)
+
+    def timed(self, run: "Callable[[], None]") -> None:
+        """Run part of the tokenizing, adding its time outside the tree constructor to the report."""
+        report: ParseReport = self.report
+        tree_build_seconds: float = report.tree_build_seconds
+        start: float = time.perf_counter()
+        run()
+        elapsed: float = time.perf_counter() - start
+        report.tokenize_seconds += elapsed - (report.tree_build_seconds - tree_build_seconds)
+
+    def tokenize(self, html: str) -> None:
+        """Tokenize a chunk of HTML like `Tokenizer.tokenize`, timing it."""
+        self.timed(partial(super().tokenize, html))
+
+    def end(self) -> None:
+        """Run the end of the input through the current state like `Tokenizer.end`, timing it."""
+        self.timed(super().end)
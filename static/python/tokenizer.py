@@ -1,5 +1,13 @@
+import re
+import sys
+from typing import TYPE_CHECKING
+
 from htmlparser_types import Attribute, ParserState, Token
-from treeconstructor import tree_constructor
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+    from treeconstructor import TreeConstructor
 
 
 def parser_error(row: int, col: int, message: str) -> None:
@@ -10,6 +18,11 @@ def parser_error(row: int, col: int, message: str) -> None:
 
 last_start_tag_emitted: Token | None
 
+# Characters that end a run of plain text in each text state; everything before them is emitted as one token
+DATA_RUN_END: re.Pattern = re.compile("[&<\0]")
+SCRIPT_DATA_RUN_END: re.Pattern = re.compile("[<\0]")
+PLAINTEXT_RUN_END: re.Pattern = re.compile("\0")
+
 
 def is_appropriate_end_tag_token(
     end_tag_token: Token,
@@ -31,25 +44,101 @@ def is_appropriate_end_tag_token(
 
 
 class Tokenizer:
-    """HTML Tokenizer."""
+    """HTML Tokenizer.
 
-    def __init__(self, char: str, pos: tuple[int, int], parser_state: ParserState) -> None:
-        self.char = char
-        self.row, self.col = pos
-        self.parser_state = parser_state
+    One instance consumes a whole input string with an index cursor, dispatching each character to the
+    handler of the current state through a table of bound methods. Tokens go to the tree constructor of the
+    same parse.
+    """
 
-    def _emit_token(self, token: Token) -> None:
-        """Emit a token to the tree constructor."""
-        tree_constructor(token)
+    def __init__(self, parser_state: ParserState, tree_constructor: "TreeConstructor") -> None:
+        self.html: str = ""
+        self.pos: int = 0
+        self.char: str = ""
+        self.row: int = 0
+        self.col: int = 0
+        self.parser_state = parser_state
+        self.tree_constructor = tree_constructor
+        # Tokens reused for every emit instead of allocating one per token
+        self.char_token: Token = Token(kind="char")
+        self.eof_token: Token = Token(kind="EOF")
+        self.tag_token: Token = Token()
+        # Instrumentation hook, called after each step with the state that ran and the characters it consumed,
+        # 0 when the state asked to reconsume
+        self.count_step: Callable[[str, int], None] | None = None
+        self.states: dict[str, Callable[[], None]] = {
+            "data": self._data_state,
+            "rcdata": self._rcdata_state,
+            "rawtext": self._rawtext_state,
+            "script data": self._script_data_state,
+            "plaintext": self._plaintext_state,
+            "tag open": self._tag_open_state,
+            "end tag open": self._end_tag_open_state,
+            "tag name": self._tag_name_state,
+            "rcdata lt sign": self._rcdata_lt_sign_state,
+            "rcdata end tag name": self._rcdata_end_tag_name_state,
+            "style lt sign": self._style_lt_sign_state,
+            "style end tag name": self._style_end_tag_name_state,
+            "before attr name": self._before_attr_name_state,
+            "attr name": self._attr_name_state,
+            "after attr name": self._after_attr_name_state,
+            "before attr value": self._before_attr_value_state,
+            "attr value (double-quoted)": self._attr_value_double_quoted_state,
+            "attr value (single-quoted)": self._attr_value_single_quoted_state,
+            "attr value (unquoted)": self._attr_value_unquoted_state,
+            "after attr value (quoted)": self._after_attr_value_quoted_state,
+            "self-closing start tag": self._self_closing_start_tag_state,
+            "bogus comment": self._bogus_comment_state,
+            "character reference": self._character_reference_state,
+        }
+
+    def parse_error(self, message: str) -> None:
+        """Report a parse error at the current position."""
+        parser_error(self.row, self.col, message)
+
+    def _emit_chars(self, chars: str) -> None:
+        """Emit text through the reusable character token."""
+        self.char_token.char = chars
+        self.tree_constructor.process(self.char_token)
+
+    def _emit_eof(self) -> None:
+        """Emit the reusable end of file token."""
+        self.tree_constructor.process(self.eof_token)
 
     def _emit_token_from_parser_state(self, token: Token) -> None:
-        """Emit a token from ParserState to the tree constructor."""
-        tree_constructor(token)
+        """Emit a token from ParserState to the tree constructor, interning tag and attribute names."""
+        if token.tag_name:
+            token.tag_name = sys.intern(token.tag_name)
+        if token.attrs is not None:
+            for attr in token.attrs:
+                attr.name = sys.intern(attr.name)
+        self.tree_constructor.process(token)
         self.parser_state.token = None
 
-    def _create_token(self, token: Token) -> None:
-        """Create a token."""
-        self.parser_state.token = token
+    def _emit_char_run(self, run_end: re.Pattern) -> None:
+        """Emit the current character and all plain text after it, up to the next `run_end` match, as one token.
+
+        The cursor is left on the last character of the run so the main loop consumes it as usual.
+        """
+        html: str = self.html
+        start: int = self.pos
+        match = run_end.search(html, start + 1)
+        end: int = match.start() if match is not None else len(html)
+        self._emit_chars(html[start:end])
+
+        last: int = end - 1
+        if last > start:
+            newlines: int = html.count("\n", start, last)
+            if newlines:
+                self.row += newlines
+                self.col = last - html.rfind("\n", start, last) - 1
+            else:
+                self.col += last - start
+            self.pos = last
+
+    def _create_token(self, kind: str) -> None:
+        """Start a new tag or comment token of `kind`, reusing the tokenizer's token object."""
+        self.parser_state.token = self.tag_token.reset(kind)
 
     def _create_attr(self, attr: Attribute) -> None:
         """Create a new attribute for the current token in ParserState."""
@@ -85,10 +174,14 @@ class Tokenizer:
                 self._switch_to_char_ref_state("data")
             case "<":
                 self.parser_state.state = "tag open"
+            case "\0":
+                errormsg: str = "Unexpected null character"
+                self.parse_error(errormsg)
+                self._emit_chars(self.char)
             case "":
-                self._emit_token(Token(kind="EOF"))
+                self._emit_eof()
             case _:
-                self._emit_token(Token(kind="char", char=self.char))
+                self._emit_char_run(DATA_RUN_END)
 
     def _rcdata_state(self) -> None:
         match self.char:
@@ -96,10 +189,14 @@ class Tokenizer:
                 self._switch_to_char_ref_state("rcdata")
             case "<":
                 self.parser_state.state = "rcdata lt sign"
+            case "\0":
+                errormsg: str = "Unexpected null character"
+                self.parse_error(errormsg)
+                self._emit_chars("\ufffd")
             case "":
-                self._emit_token(Token(kind="EOF"))
+                self._emit_eof()
             case _:
-                self._emit_token(Token(kind="char", char=self.char))
+                self._emit_char_run(DATA_RUN_END)
 
     def _style_state(self) -> None:
         match self.char:
@@ -107,10 +204,14 @@ class Tokenizer:
                 self._switch_to_char_ref_state("style")
             case "<":
                 self.parser_state.state = "style lt sign"
+            case "\0":
+                errormsg: str = "Unexpected null character"
+                self.parse_error(errormsg)
+                self._emit_chars("\ufffd")
             case "":
-                self._emit_token(Token(kind="EOF"))
+                self._emit_eof()
             case _:
-                self._emit_token(Token(kind="char", char=self.char))
+                self._emit_char_run(DATA_RUN_END)
 
     def _rawtext_state(self) -> None:
         match self.char:
@@ -118,26 +219,38 @@ class Tokenizer:
                 self._switch_to_char_ref_state("rawtext")
             case "<":
                 self.parser_state.state = "rcdata lt sign"
+            case "\0":
+                errormsg: str = "Unexpected null character"
+                self.parse_error(errormsg)
+                self._emit_chars("\ufffd")
             case "":
-                self._emit_token(Token(kind="EOF"))
+                self._emit_eof()
             case _:
-                self._emit_token(Token(kind="char", char=self.char))
+                self._emit_char_run(DATA_RUN_END)
 
     def _script_data_state(self) -> None:
         match self.char:
             case "<":
                 self.parser_state.state = "script data lt sign"
+            case "\0":
+                errormsg: str = "Unexpected null character"
+                self.parse_error(errormsg)
+                self._emit_chars("\ufffd")
             case "":
-                self._emit_token(Token(kind="EOF"))
+                self._emit_eof()
             case _:
-                self._emit_token(Token(kind="char", char=self.char))
+                self._emit_char_run(SCRIPT_DATA_RUN_END)
 
     def _plaintext_state(self) -> None:
         match self.char:
+            case "\0":
+                errormsg: str = "Unexpected null character"
+                self.parse_error(errormsg)
+                self._emit_chars("\ufffd")
             case "":
-                self._emit_token(Token(kind="EOF"))
+                self._emit_eof()
             case _:
-                self._emit_token(Token(kind="char", char=self.char))
+                self._emit_char_run(PLAINTEXT_RUN_END)
 
     def _tag_open_state(self) -> None:
         match self.char:
@@ -148,20 +261,20 @@ class Tokenizer:
                 self.parser_state.state = "end tag open"
             case "?":
                 errormsg: str = "Unexpected question mark instead of tag-name"
-                parser_error(self.row, self.col, errormsg)
+                self.parse_error(errormsg)
                 # (state not implemented yet)
             case "":
-                self._emit_token(Token(kind="char", char="<"))
-                self._emit_token(Token(kind="EOF"))
+                self._emit_chars("<")
+                self._emit_eof()
             case _:
                 if self.char.isalpha():
-                    self._create_token(Token("start tag", tag_name=""))
+                    self._create_token("start tag")
                     self.parser_state.state = "tag name"
                     self.parser_state.need_to_reconsume = True
                 else:
                     errormsg: str = "Invalid first character of tag-name"
-                    parser_error(self.row, self.col, errormsg)
-                    self._emit_token(Token(kind="char", char="<"))
+                    self.parse_error(errormsg)
+                    self._emit_chars("<")
                     self.parser_state.state = "data"
                     self.parser_state.need_to_reconsume = True
 
@@ -169,24 +282,25 @@ class Tokenizer:
         match self.char:
             case ">":
                 errormsg: str = "Missing end tag name"
-                parser_error(self.row, self.col, errormsg)
+                self.parse_error(errormsg)
                 self.parser_state.state = "data"
             case "":
                 errormsg: str = "EOF before tag name"
-                parser_error(self.row, self.col, errormsg)
-                self._emit_token(Token(kind="char", char="<"))
-                self._emit_token(Token(kind="char", char="/"))
-                self._emit_token(Token(kind="EOF"))
+                self.parse_error(errormsg)
+                self._emit_chars("<")
+                self._emit_chars("/")
+                self._emit_eof()
             case _:
                 if self.char.isalpha():
-                    self._create_token(Token(kind="end tag", tag_name=""))
+                    self._create_token("end tag")
                     self.parser_state.need_to_reconsume = True
                     self.parser_state.state = "tag name"
                 else:
                     errormsg: str = "Invalid first character of tag-name"
-                    self._create_token(Token(kind="", data=""))
+                    self._create_token("comment")
                     self.parser_state.need_to_reconsume = True
-                    parser_error(self.row, self.col, errormsg)
+                    self.parser_state.state = "bogus comment"
+                    self.parse_error(errormsg)
 
     def _tag_name_state(self) -> None:
         match self.char:
@@ -200,8 +314,8 @@ class Tokenizer:
                 self._emit_token_from_parser_state(self.parser_state.token)
             case "":
                 errormsg: str = "EOF in tag"
-                parser_error(self.row, self.col, errormsg)
-                self._emit_token(Token(kind="EOF"))
+                self.parse_error(errormsg)
+                self._emit_eof()
             case _:
                 if self.char.isalpha():
                     self.parser_state.token.tag_name += self.char.lower()
@@ -217,17 +331,17 @@ class Tokenizer:
                 self.parser_state.need_to_reconsume = True
                 self.parser_state.state = "rcdata end tag open"
             case _:
-                self._emit_token(Token(kind="char", char="<"))
-                self._emit_token(Token(kind="char", char="/"))
+                self._emit_chars("<")
+                self._emit_chars("/")
                 self.parser_state.need_to_reconsume = True
                 self.parser_state.state = "rcdata"
 
     def _rcdata_end_tag_name_state(self) -> None:
         def anything_else() -> None:
-            self._emit_token(Token(kind="char", char="<"))
-            self._emit_token(Token(kind="char", char="/"))
+            self._emit_chars("<")
+            self._emit_chars("/")
             for char in self.parser_state.temp_buff[::-1]:
-                self._emit_token(Token("char", char=char))
+                self._emit_chars(char)
 
         match self.char:
             case "\t" | "\n" | "\f" | " ":
@@ -258,17 +372,17 @@ class Tokenizer:
                 self.parser_state.need_to_reconsume = True
                 self.parser_state.state = "style end tag open"
             case _:
-                self._emit_token(Token(kind="char", char="<"))
-                self._emit_token(Token(kind="char", char="/"))
+                self._emit_chars("<")
+                self._emit_chars("/")
                 self.parser_state.need_to_reconsume = True
                 self.parser_state.state = "style"
 
     def _style_end_tag_name_state(self) -> None:
         def anything_else() -> None:
-            self._emit_token(Token(kind="char", char="<"))
-            self._emit_token(Token(kind="char", char="/"))
+            self._emit_chars("<")
+            self._emit_chars("/")
             for char in self.parser_state.temp_buff[::-1]:
-                self._emit_token(Token("char", char=char))
+                self._emit_chars(char)
 
         match self.char:
             case "\t" | "\n" | "\f" | " ":
@@ -299,7 +413,7 @@ class Tokenizer:
                 self.parser_state.need_to_reconsume = True
             case "=":
                 errormsg: str = "Unexpected equals sign before attribute name"
-                parser_error(self.row, self.col, errormsg)
+                self.parse_error(errormsg)
                 self._create_attr(Attribute(name=self.char, value=""))
                 self.parser_state.state = "attr name"
             case _:
@@ -316,7 +430,7 @@ class Tokenizer:
                 self.parser_state.state = "before attr value"
             case '"' | "'" | "<":
                 errormsg: str = "Unexpected character in attribute name"
-                parser_error(self.row, self.col, errormsg)
+                self.parse_error(errormsg)
                 self._append_to_curr_attr_name(self.char)
             case _:
                 if self.char.isalpha():
@@ -337,8 +451,8 @@ class Tokenizer:
                 self._emit_token_from_parser_state(self.parser_state.token)
             case "":
                 errormsg: str = "EOF in tag"
-                parser_error(self.row, self.col, errormsg)
-                self._emit_token(Token(kind="EOF"))
+                self.parse_error(errormsg)
+                self._emit_eof()
             case _:
                 self._create_attr(Attribute(name="", value=""))
                 self.parser_state.state = "attr name"
@@ -353,7 +467,7 @@ class Tokenizer:
                 self.parser_state.state = "attr value (single-quoted)"
             case ">":
                 errormsg: str = "Missing attribute value"
-                parser_error(self.row, self.col, errormsg)
+                self.parse_error(errormsg)
                 self.parser_state.state = "data"
                 self._emit_token_from_parser_state(self.parser_state.token)
             case _:
@@ -368,8 +482,8 @@ class Tokenizer:
                 self._switch_to_char_ref_state(return_to="attr value (double-quoted)")
             case "":
                 errormsg: str = "EOF in tag"
-                parser_error(self.row, self.col, errormsg)
-                self._emit_token(Token(kind="EOF"))
+                self.parse_error(errormsg)
+                self._emit_eof()
             case _:
                 self._append_to_curr_attr_val(self.char)
 
@@ -381,8 +495,8 @@ class Tokenizer:
                 self._switch_to_char_ref_state(return_to="attr value (single-quoted)")
             case "":
                 errormsg: str = "EOF in tag"
-                parser_error(self.row, self.col, errormsg)
-                self._emit_token(Token(kind="EOF"))
+                self.parse_error(errormsg)
+                self._emit_eof()
             case _:
                 self._append_to_curr_attr_val(self.char)
 
@@ -397,12 +511,12 @@ class Tokenizer:
                 self._emit_token_from_parser_state(self.parser_state.token)
             case '"' | '"' | "<" | "=" | "`":
                 errormsg: str = "Unexpected character in unquoted attribute value"
-                parser_error(self.row, self.col, errormsg)
+                self.parse_error(errormsg)
                 self._append_to_curr_attr_val(self.char)
             case "":
                 errormsg: str = "EOF in tag"
-                parser_error(self.row, self.col, errormsg)
-                self._emit_token(Token("EOF"))
+                self.parse_error(errormsg)
+                self._emit_eof()
             case _:
                 self._append_to_curr_attr_val(self.char)
 
@@ -417,11 +531,11 @@ class Tokenizer:
                 self._emit_token_from_parser_state(self.parser_state.token)
             case "":
                 errormsg: str = "EOF in tag"
-                parser_error(self.row, self.col, errormsg)
-                self._emit_token(Token("EOF"))
+                self.parse_error(errormsg)
+                self._emit_eof()
             case _:
                 errormsg: str = "Missing whitespace between attributes"
-                parser_error(self.row, self.col, errormsg)
+                self.parse_error(errormsg)
                 self.parser_state.need_to_reconsume = True
                 self.parser_state.state = "before attr name"
 
@@ -433,67 +547,85 @@ class Tokenizer:
                 self._emit_token_from_parser_state(self.parser_state.token)
             case "":
                 errormsg: str = "EOF in tag"
-                parser_error(self.row, self.col, errormsg)
-                self._emit_token(Token("EOF"))
+                self.parse_error(errormsg)
+                self._emit_eof()
             case _:
                 errormsg: str = "Unexpected solidus in tag"
-                parser_error(self.row, self.col, errormsg)
+                self.parse_error(errormsg)
                 self.parser_state.need_to_reconsume = True
                 self.parser_state.state = "before attr name"
 
+    def _bogus_comment_state(self) -> None:
+        match self.char:
+            case ">":
+                self.parser_state.state = "data"
+                self._emit_token_from_parser_state(self.parser_state.token)
+            case "":
+                self._emit_token_from_parser_state(self.parser_state.token)
+                self._emit_eof()
+            case "\0":
+                errormsg: str = "Unexpected null character"
+                self.parse_error(errormsg)
+                self.parser_state.token.data += "\ufffd"
+            case _:
+                self.parser_state.token.data += self.char
+
     def _character_reference_state(self) -> None:
         self.parser_state.state = "data"
         self.parser_state.need_to_reconsume = True
         self.parser_state.state = self.parser_state.return_state
         self.parser_state.return_state = ""
 
-    def next_state(self) -> None:  # noqa: C901, PLR0912
-        """Determine the next state."""
-        match self.parser_state.state:
-            # this is the initial state
-            case "data":
-                self._data_state()
-            case "rcdata":
-                self._rcdata_state()
-            case "rawtext":
-                self._rawtext_state()
-            case "script data":
-                self._script_data_state()
-            case "plaintext":
-                self._plaintext_state()
-            case "tag open":
-                self._tag_open_state()
-            case "end tag open":
-                self._end_tag_open_state()
-            case "tag name":
-                self._tag_name_state()
-            case "rcdata lt sign":
-                self._rcdata_lt_sign_state()
-            case "rcdata end tag name":
-                self._rcdata_end_tag_name_state()
-            case "style lt sign":
-                self._style_lt_sign_state()
-            case "style end tag name":
-                self._style_end_tag_name_state()
-            case "before attr name":
-                self._before_attr_name_state()
-            case "attr name":
-                self._attr_name_state()
-            case "after attr name":
-                self._after_attr_name_state()
-            case "before attr value":
-                self._before_attr_value_state()
-            case "attr value (double-quoted)":
-                self._attr_value_double_quoted_state()
-            case "attr value (single-quoted)":
-                self._attr_value_single_quoted_state()
-            case "attr value (unquoted)":
-                self._attr_value_unquoted_state()
-            case "after attr value (quoted)":
-                self._after_attr_value_quoted_state()
-            case "self-closing start tag":
-                self._self_closing_start_tag_state()
-            case "character reference":
-                self._character_reference_state()
-            case _:
-                pass
+    def next_state(self) -> None:
+        """Run the handler of the current state on the current character."""
+        handler: Callable[[], None] | None = self.states.get(self.parser_state.state)
+        if handler is not None:
+            handler()
+
+    def tokenize(self, html: str) -> None:
+        """Tokenize a chunk of HTML, moving the cursor forward unless a state asks to reconsume.
+
+        State, the current token and the row/col position carry over between calls, so a document can be
+        fed in chunks that split tags, attributes or text anywhere.
+        """
+        parser_state: ParserState = self.parser_state
+        states: dict[str, Callable[[], None]] = self.states
+        count_step: Callable[[str, int], None] | None = self.count_step
+        self.html = html
+        self.pos = 0
+        length: int = len(html)
+        while self.pos < length:
+            parser_state.need_to_reconsume = False
+            state: str = parser_state.state
+            start: int = self.pos
+            self.char = html[start]
+            handler: Callable[[], None] | None = states.get(state)
+            if handler is not None:
+                handler()
+            if parser_state.need_to_reconsume:
+                if count_step is not None:
+                    count_step(state, 0)
+                continue
+            # text states may have moved the cursor to the end of a run, which counts as consumed too
+            if count_step is not None:
+                count_step(state, self.pos - start + 1)
+            if html[self.pos] == "\n":
+                self.row += 1
+                self.col = 0
+            else:
+                self.col += 1
+            self.pos += 1
+        self.html = ""
+
+    def end(self) -> None:
+        """Run the end of the input through the current state, so unfinished tokens are flushed."""
+        parser_state: ParserState = self.parser_state
+        self.char = ""
+        while True:
+            parser_state.need_to_reconsume = False
+            state: str = parser_state.state
+            self.next_state()
+            if not parser_state.need_to_reconsume:
+                break
+            if self.count_step is not None:
+                self.count_step(state, 0)
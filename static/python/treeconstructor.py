@@ -1,7 +1,160 @@
 # Reference: https://html.spec.whatwg.org/multipage/parsing.html#tree-construction
-from htmlparser_types import Document, Element, Token
+from htmlparser_types import CompactDocument, Document, Element, ElementView, Token
 
-open_element_stack: list = []
+# Tag categories, see https://html.spec.whatwg.org/multipage/parsing.html#parsing-main-inbody
+# Elements that are never rendered, along with everything inside them
+HIDDEN_ELEMENTS: frozenset[str] = frozenset({"head", "template", "script", "style"})
+# Elements that never have children, even when the tokenizer sees no self-closing flag
+VOID_ELEMENTS: frozenset[str] = frozenset(
+    {
+        "area",
+        "base",
+        "br",
+        "col",
+        "embed",
+        "hr",
+        "img",
+        "input",
+        "link",
+        "menuitem",
+        "meta",
+        "param",
+        "source",
+        "template",
+        "track",
+        "wbr",
+    },
+)
+# https://html.spec.whatwg.org/multipage/parsing.html#generate-implied-end-tags
+IMPLIED_END_TAG_ELEMENTS: frozenset[str] = frozenset(
+    {"dd", "dt", "li", "optgroup", "option", "p", "rb", "rp", "rt", "rtc"},
+)
+THOROUGHLY_IMPLIED_END_TAG_ELEMENTS: frozenset[str] = IMPLIED_END_TAG_ELEMENTS | {
+    "caption",
+    "colgroup",
+    "tbody",
+    "td",
+    "tfoot",
+    "th",
+    "thead",
+    "tr",
+}
+# https://html.spec.whatwg.org/multipage/parsing.html#formatting
+FORMATTING_ELEMENTS: frozenset[str] = frozenset(
+    {"a", "b", "big", "code", "em", "font", "i", "nobr", "s", "small", "strike", "strong", "tt", "u"},
+)
+SPECIAL_ELEMENTS: frozenset[str] = frozenset(
+    {
+        "address",
+        "applet",
+        "area",
+        "article",
+        "aside",
+        "base",
+        "basefont",
+        "bgsound",
+        "blockquote",
+        "body",
+        "br",
+        "button",
+        "caption",
+        "center",
+        "col",
+        "colgroup",
+        "dd",
+        "details",
+        "dir",
+        "div",
+        "dl",
+        "dt",
+        "embed",
+        "fieldset",
+        "figcaption",
+        "figure",
+        "footer",
+        "form",
+        "frame",
+        "frameset",
+        "h1",
+        "h2",
+        "h3",
+        "h4",
+        "h5",
+        "h6",
+        "head",
+        "header",
+        "hgroup",
+        "hr",
+        "html",
+        "iframe",
+        "img",
+        "input",
+        "keygen",
+        "li",
+        "link",
+        "listing",
+        "main",
+        "marquee",
+        "menu",
+        "meta",
+        "nav",
+        "noembed",
+        "noframes",
+        "noscript",
+        "object",
+        "ol",
+        "p",
+        "param",
+        "plaintext",
+        "pre",
+        "script",
+        "search",
+        "section",
+        "select",
+        "source",
+        "style",
+        "summary",
+        "table",
+        "tbody",
+        "td",
+        "template",
+        "textarea",
+        "tfoot",
+        "th",
+        "thead",
+        "title",
+        "tr",
+        "track",
+        "ul",
+        "wbr",
+        "xmp",
+    },
+)
+
+# Bit flags for each category, combined per tag name in TAG_CATEGORIES so one dict lookup classifies a tag
+HIDDEN: int = 1
+VOID: int = 2
+IMPLIED_END_TAG: int = 4
+THOROUGHLY_IMPLIED_END_TAG: int = 8
+FORMATTING: int = 16
+SPECIAL: int = 32
+
+TAG_CATEGORIES: dict[str, int] = {}
+for flag, names in (
+    (HIDDEN, HIDDEN_ELEMENTS),
+    (VOID, VOID_ELEMENTS),
+    (IMPLIED_END_TAG, IMPLIED_END_TAG_ELEMENTS),
+    (THOROUGHLY_IMPLIED_END_TAG, THOROUGHLY_IMPLIED_END_TAG_ELEMENTS),
+    (FORMATTING, FORMATTING_ELEMENTS),
+    (SPECIAL, SPECIAL_ELEMENTS),
+):
+    for name in names:
+        TAG_CATEGORIES[name] = TAG_CATEGORIES.get(name, 0) | flag
+
+
+def tag_categories(tag_name: str) -> int:
+    """Return the category flags of a tag name, 0 for tags in no category."""
+    return TAG_CATEGORIES.get(tag_name, 0)
 
 
 def new_element(token: Token, parent: Element | Document, *, dont_display: bool = False) -> Element:
@@ -10,46 +163,106 @@ def new_element(token: Token, parent: Element | Document, *, dont_display: bool
     return Element(name=token.tag_name, attrs=attrs, text="", children=[], parent=parent, dont_display=dont_display)
 
 
-html_doc: Document = Document()
-
-
-def tree_constructor(token: Token) -> None:
-    """Construct HTML document tree."""
-    parent: Element | Document = open_element_stack[-1] if len(open_element_stack) > 0 else html_doc
-    if token.kind == "start tag":
-        match token.tag_name:
-            case "head" | "template" | "script" | "style":
-                el: Element = new_element(token, parent, dont_display=True)
-                parent.children.append(el)
-                open_element_stack.append(el)
-            case (
-                "area"
-                | "base"
-                | "br"
-                | "col"
-                | "embed"
-                | "hr"
-                | "img"
-                | "input"
-                | "link"
-                | "menuitem"
-                | "meta"
-                | "param"
-                | "source"
-                | "template"
-                | "track"
-                | "wbr"
-            ):  # in case tokenizer marks self-closing as start tag
-                el: Element = new_element(token, parent)
-                if el.parent.dont_display:
-                    el.dont_display = True
-                parent.children.append(el)
-            case _:
-                el: Element = new_element(token, parent)
-                parent.children.append(el)
-                open_element_stack.append(el)
-    elif parent.is_element:
-        if token.kind == "char":
-            parent.text += token.char
-    elif token.kind == "end tag":
-        open_element_stack.pop()
+class TreeConstructor:
+    """Build one document from the tokens of one parse.
+
+    All state lives on the instance, so several documents can be built at once and a document is freed as
+    soon as nothing refers to it any more.
+    """
+
+    def __init__(self) -> None:
+        self.document: Document = Document()
+        self.open_element_stack: list[Element] = []
+        # Text received by each open element, joined into Element.text when the element is closed
+        self.open_element_text: list[list[str]] = []
+
+    def insert_element(self, token: Token, parent: Element | Document, *, dont_display: bool = False) -> Element:
+        """Create an element from a start tag token and append it to `parent`."""
+        el: Element = new_element(token, parent, dont_display=dont_display)
+        self.document.append_child(parent, el)
+        return el
+
+    def append_text(self, el: Element, text: str) -> None:
+        """Append text to an element."""
+        el.text += text
+
+    def push_element(self, el: Element) -> None:
+        """Add an element to the stack of open elements."""
+        self.open_element_stack.append(el)
+        self.open_element_text.append([])
+
+    def pop_element(self) -> Element:
+        """Remove the current element from the stack of open elements and join the text it received."""
+        el: Element = self.open_element_stack.pop()
+        text: list[str] = self.open_element_text.pop()
+        if text:
+            self.append_text(el, "".join(text))
+        return el
+
+    def flush_text(self) -> None:
+        """Join the text received so far into every open element, so a partially parsed tree can be read."""
+        for el, text in zip(self.open_element_stack, self.open_element_text, strict=True):
+            if text:
+                self.append_text(el, "".join(text))
+                text.clear()
+
+    def close_element(self, tag_name: str) -> None:
+        """Pop open elements up to and including the closest one named `tag_name`, if there is one."""
+        for index in range(len(self.open_element_stack) - 1, -1, -1):
+            if self.open_element_stack[index].name == tag_name:
+                while len(self.open_element_stack) > index:
+                    self.pop_element()
+                return
+
+    def process(self, token: Token) -> None:
+        """Construct HTML document tree."""
+        parent: Element | Document = self.open_element_stack[-1] if self.open_element_stack else self.document
+        if token.kind == "start tag":
+            categories: int = TAG_CATEGORIES.get(token.tag_name, 0)
+            if categories & HIDDEN:
+                self.push_element(self.insert_element(token, parent, dont_display=True))
+            elif categories & VOID:  # in case tokenizer marks self-closing as start tag
+                self.insert_element(token, parent, dont_display=parent.is_element and parent.dont_display)
+            else:
+                self.push_element(self.insert_element(token, parent))
+        elif token.kind == "char":
+            if parent.is_element:
+                self.open_element_text[-1].append(token.char)
+        elif token.kind == "end tag":
+            self.close_element(token.tag_name)
+        elif token.kind == "EOF":
+            while self.open_element_stack:
+                self.pop_element()
+
+
+class CompactTreeConstructor(TreeConstructor):
+    """Build a `CompactDocument`, keeping views of the open elements on the stack."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.document: CompactDocument = CompactDocument()
+
+    def insert_element(
+        self,
+        token: Token,
+        parent: ElementView | CompactDocument,
+        *,
+        dont_display: bool = False,
+    ) -> ElementView:
+        """Append an element for a start tag token to the document's arrays."""
+        attrs: dict[str, str] = {a.name: a.value for a in token.attrs} if token.attrs is not None else {}
+        parent_index: int = parent.index if parent.is_element else -1
+        return ElementView(
+            self.document,
+            self.document.append_element(parent_index, token.tag_name, attrs, dont_display=dont_display),
+        )
+
+    def append_text(self, el: ElementView, text: str) -> None:
+        """Append text to an element's span of the shared text buffer."""
+        self.document.append_text(el.index, text)
+
+    def process(self, token: Token) -> None:
+        """Construct the document, joining its buffers once the end of the input is reached."""
+        super().process(token)
+        if token.kind == "EOF":
+            self.document.join_buffers()
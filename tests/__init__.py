@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The browser modules import each other by bare name, the way PyScript loads them.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "static" / "python"))
@@ -0,0 +1,133 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from cookie_store import LocalStorageBackend, PersistentCookieStore, SQLiteBackend
+from cookies import CookieStorage
+
+NOW: float = 1754765774.0
+EXPIRES: str = "Expires=Sun, 09 Aug 2037 18:56:14 GMT"
+
+
+class MemoryLocalStorage:
+    """The part of the browser's localStorage API that LocalStorageBackend uses, kept in a dict."""
+
+    def __init__(self) -> None:
+        self.items: dict[str, str] = {}
+
+    def getItem(self, key: str) -> str | None:  # noqa: N802
+        """Return the value of a key, or None."""
+        return self.items.get(key)
+
+    def setItem(self, key: str, value: str) -> None:  # noqa: N802
+        """Set the value of a key."""
+        self.items[key] = value
+
+    def removeItem(self, key: str) -> None:  # noqa: N802
+        """Remove a key."""
+        self.items.pop(key, None)
+
+    def key(self, index: int) -> str:
+        """Return the key at `index`."""
+        return list(self.items)[index]
+
+    @property
+    def length(self) -> int:
+        """Count the keys."""
+        return len(self.items)
+
+
+class PersistentCookieStoreTest(unittest.TestCase):
+    """Tests saving cookies and reading them back in."""
+
+    def setUp(self) -> None:
+        """Start from an empty database."""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = Path(directory.name) / "cookies.sqlite"
+
+    def jar(self, backend: SQLiteBackend | LocalStorageBackend, batch_size: int = 64) -> CookieStorage:
+        """Create a jar saving to `backend`."""
+        return CookieStorage(clock=lambda: NOW, persistent_store=PersistentCookieStore(backend, batch_size=batch_size))
+
+    def test_lazy_load(self) -> None:
+        """Ensure persistent cookies survive a restart, and only the domains requested are read back in."""
+        backend = SQLiteBackend(self.path)
+        self.addCleanup(backend.close)
+        first = self.jar(backend)
+        first.set_cookie(f"a=1; Path=/; {EXPIRES}; Secure; HttpOnly", "https://www.a.example/")
+        first.set_cookie("b=2; Max-Age=3600; Domain=b.example", "https://b.example/")
+        first.set_cookie("session=3", "https://b.example/")
+        first.flush()
+
+        restarted = SQLiteBackend(self.path)
+        self.addCleanup(restarted.close)
+        second = self.jar(restarted)
+        self.assertEqual(len(second), 0)
+        self.assertEqual(second.to_cookie_string("https://shop.b.example/"), "b=2")
+        self.assertEqual(second.loaded_domains, {"b.example"})
+        self.assertEqual(len(second), 1)
+
+        cookie = second.cookies_for("https://www.a.example/")[0]
+        self.assertEqual((cookie.name, cookie.value, cookie.secure, cookie.http_only), ("a", "1", True, True))
+        self.assertTrue(cookie.host_only)
+        self.assertEqual(cookie.expiry_time, 2133456974.0)
+
+    def test_batches(self) -> None:
+        """Ensure changes are only written once a batch fills up, and deletes are saved too."""
+        storage = MemoryLocalStorage()
+        jar = self.jar(LocalStorageBackend(storage), batch_size=2)
+        jar.set_cookie(f"a=1; {EXPIRES}", "https://a.example/")
+        self.assertEqual(storage.items, {})
+
+        jar.set_cookie(f"b=2; {EXPIRES}", "https://a.example/")
+        self.assertEqual(len(storage.items["cookies:a.example"].split("\n")), 2)
+
+        jar.set_cookie("a=; Max-Age=0", "https://a.example/")
+        jar.flush()
+        restarted = self.jar(LocalStorageBackend(storage))
+        self.assertEqual(restarted.to_cookie_string("https://a.example/"), "b=2")
+
+    def test_compaction(self) -> None:
+        """Ensure a log rewritten many times is compacted down to the cookies still set."""
+        backend = SQLiteBackend(self.path)
+        self.addCleanup(backend.close)
+        jar = self.jar(backend, batch_size=10)
+        for n in range(200):
+            jar.set_cookie(f"counter={n}; {EXPIRES}", "https://a.example/")
+        jar.set_cookie(f"other=1; {EXPIRES}", "https://a.example/")
+        jar.flush()
+
+        self.assertLess(len(backend.read("a.example")), 40)
+        restarted = self.jar(backend)
+        self.assertEqual(restarted.to_cookie_string("https://a.example/"), "counter=199; other=1")
+
+    def test_clear(self) -> None:
+        """Ensure clearing the jar drops saved cookies of every domain, but no other keys."""
+        storage = MemoryLocalStorage()
+        storage.setItem("theme", "dark")
+        jar = self.jar(LocalStorageBackend(storage))
+        jar.set_cookie(f"a=1; {EXPIRES}", "https://a.example/")
+        jar.set_cookie(f"b=1; {EXPIRES}", "https://b.example/")
+        jar.flush()
+
+        self.jar(LocalStorageBackend(storage)).clear()
+        self.assertEqual(storage.items, {"theme": "dark"})
+
+    def test_combined_jar(self) -> None:
+        """Ensure a jar combined with + keeps saving to the left jar's store, including the right jar's cookies."""
+        storage = MemoryLocalStorage()
+        jar = self.jar(LocalStorageBackend(storage))
+        jar.set_cookie(f"a=1; {EXPIRES}", "https://a.example/")
+        other = CookieStorage(clock=lambda: NOW)
+        other.set_cookie(f"b=2; {EXPIRES}", "https://b.example/")
+
+        combined = jar + other
+        self.assertIs(combined.persistent_store, jar.persistent_store)
+        combined.set_cookie(f"c=3; {EXPIRES}", "https://a.example/")
+        combined.flush()
+
+        restarted = self.jar(LocalStorageBackend(storage))
+        self.assertEqual(restarted.to_cookie_string("https://a.example/"), "a=1; c=3")
+        self.assertEqual(restarted.to_cookie_string("https://b.example/"), "b=2")
+        self.assertEqual(len(storage.items["cookies:a.example"].split("\n")), 2)
@@ -21,11 +21,19 @@ set-cookie: tk_qs=_en%3Dwpcom_experiment_variation_assigned%26_ut%3Danon%26_ui%3
 set-cookie: wpcom_lohp_hero_bigsky_082025=control; expires=Thu, 28 Aug 2025 00:00:00 GMT; Max-Age=1573345; path=/; domain=.wordpress.com; secure; SameSite=None
     """.strip()  # noqa: E501
 
+    # When the headers above were recorded, so their Expires dates are still in the future
+    recorded_at = 1754765774.0
+
+    def clock(self) -> float:
+        """Stand in for the current time, at the time the headers were recorded."""
+        return self.recorded_at
+
     def test_github(self) -> None:
         """Ensure we can parse github headers with some accuracy."""
         r = CookieStorage.from_headers(
             self.github_headers.strip().split("\n"),
             "github.com",
+            clock=self.clock,
         )
         self.assertEqual(len(r.cookies), 3)
         self.assertEqual(r["_gh_sess"][0].value, "akjshdflashdbkfgjasklgfjadgf")
@@ -39,8 +47,13 @@ set-cookie: wpcom_lohp_hero_bigsky_082025=control; expires=Thu, 28 Aug 2025 00:0
         r = CookieStorage.from_headers(
             self.wordpress_headers.strip().split("\n"),
             ".wordpress.com",
+            clock=self.clock,
         )
-        self.assertEqual(len(r.cookies), 6)
+        # The second tk_qs cookie replaces the first one, with the same name, domain and path
+        self.assertEqual(len(r.cookies), 5)
+        self.assertEqual(len(r["tk_qs"]), 1)
+        self.assertTrue(r["tk_qs"][0].value.endswith("reason%3Dset_by_anon_id"))
+        self.assertIn("%20_en", r["tk_qs"][0].value)
         wpcom_cooke = r["wpcom_lohp_hero_bigsky_082025"][0]
         self.assertEqual(wpcom_cooke.value, "control")
         self.assertEqual(wpcom_cooke.secure, True)
@@ -50,6 +63,7 @@ set-cookie: wpcom_lohp_hero_bigsky_082025=control; expires=Thu, 28 Aug 2025 00:0
         r = CookieStorage.from_headers(
             self.github_headers.strip().split("\n"),
             "github.com",
+            clock=self.clock,
         )
 
         r.end_session()
@@ -66,6 +80,7 @@ set-cookie: wpcom_lohp_hero_bigsky_082025=control; expires=Thu, 28 Aug 2025 00:0
         r = CookieStorage.from_headers(
             self.github_headers.strip().split("\n"),
             "github.com",
+            clock=self.clock,
         )
         r.set_cookie("bob=willis; sam=maxton", "github.com")
 
@@ -77,3 +92,148 @@ set-cookie: wpcom_lohp_hero_bigsky_082025=control; expires=Thu, 28 Aug 2025 00:0
         self.assertEqual(len(r.cookies), 5)
         self.assertEqual(r["sam"][0].value, "maxton")
         self.assertIn("sam=maxton", r.to_cookie_string(for_javascript=False))
+
+    def test_request_matching(self) -> None:
+        """Ensure only cookies whose domain and path match a request are sent, in RFC 6265 order."""
+        r = CookieStorage()
+        r.handle_headers(
+            [
+                ("Set-Cookie", "root=1; Path=/"),
+                ("Set-Cookie", "docs=2; Path=/docs"),
+                ("Set-Cookie", "wide=3; Domain=example.com; Path=/docs/"),
+                ("Set-Cookie", "secret=4; Path=/; Secure"),
+                ("Set-Cookie", "elsewhere=5; Domain=other.com"),
+                ("Content-Type", "text/html"),
+            ],
+            "https://www.example.com/docs/index.html",
+        )
+
+        self.assertEqual(len(r), 4)
+        self.assertEqual(r["root"][0].domain, "www.example.com")
+        self.assertEqual(r.to_cookie_string("https://www.example.com/docs/a"), "wide=3; docs=2; root=1; secret=4")
+        self.assertEqual(r.to_cookie_string("http://www.example.com/docs"), "docs=2; root=1")
+        self.assertEqual(r.to_cookie_string("https://www.example.com/docsearch"), "root=1; secret=4")
+        self.assertEqual(r.to_cookie_string("https://api.example.com/docs/"), "wide=3")
+        self.assertEqual(r.to_headers("https://example.org/"), {})
+        self.assertEqual(r.to_headers("https://example.com/docs/"), {"Cookie": "wide=3"})
+
+    def test_overwrite(self) -> None:
+        """Ensure setting a cookie again replaces it in place, keeping its position in the order."""
+        r = CookieStorage()
+        r.set_cookie("a=1", "https://example.com/")
+        r.set_cookie("b=2", "https://example.com/")
+        r.set_cookie("a=3", "https://example.com/")
+
+        self.assertEqual(len(r), 2)
+        self.assertEqual(r.to_cookie_string("https://example.com/"), "a=3; b=2")
+
+        r.set_cookie("a=4; Domain=example.com", "https://example.com/")
+        self.assertEqual(len(r), 2)
+        self.assertFalse(r["a"][0].host_only)
+        self.assertEqual(r.to_cookie_string("https://www.example.com/"), "a=4")
+
+        r.end_session()
+        self.assertEqual(len(r), 0)
+
+    def test_expiry(self) -> None:
+        """Ensure Expires and Max-Age become expiry times, and cookies leave the jar once they pass."""
+        now = [self.recorded_at]
+        r = CookieStorage(clock=lambda: now[0])
+        r.handle_headers(
+            [
+                ("Set-Cookie", "short=1; Max-Age=60; Expires=Sun, 09 Aug 2037 18:56:14 GMT"),
+                ("Set-Cookie", "long=2; Expires=Sun, 09-Aug-37 18:56:14 GMT"),
+                ("Set-Cookie", "session=3"),
+                ("Set-Cookie", "replaced=4; Max-Age=30"),
+                ("Set-Cookie", "replaced=5; Max-Age=120"),
+            ],
+            "https://example.com/",
+        )
+
+        self.assertEqual(r["short"][0].expiry_time, self.recorded_at + 60)
+        self.assertEqual(r["long"][0].expiry_time, 2133456974.0)
+        self.assertFalse(r["session"][0].persistent)
+        self.assertEqual(len(r.expirations), 4)
+
+        now[0] += 90
+        self.assertEqual(r.to_cookie_string("https://example.com/"), "long=2; session=3; replaced=5")
+        self.assertEqual(len(r.expirations), 2, "the entry of the replaced cookie is skipped when it comes up")
+
+        r.set_cookie("long=; Max-Age=0", "https://example.com/")
+        self.assertEqual(r["long"], [])
+
+    def test_limits(self) -> None:
+        """Ensure the least recently used cookies are evicted past the per-domain and global limits."""
+        r = CookieStorage(clock=self.clock, max_per_domain=3, max_cookies=4)
+        for n in range(3):
+            r.set_cookie(f"a{n}=1", "https://a.example/")
+        r.to_cookie_string("https://a.example/")
+        r.set_cookie("a0=2", "https://a.example/")
+        r.set_cookie("a3=1", "https://a.example/")
+        self.assertEqual([cookie.name for cookie in r.cookies], ["a2", "a0", "a3"])
+
+        r.set_cookie("b0=1", "https://b.example/")
+        r.set_cookie("b1=1", "https://b.example/")
+        self.assertEqual(len(r), 4)
+        self.assertEqual(r.to_cookie_string("https://a.example/"), "a0=2; a3=1")
+
+    def test_header_spellings(self) -> None:
+        """Ensure Set-Cookie headers are found in any case, and look-alike headers are skipped."""
+        r = CookieStorage(clock=self.clock)
+        r.handle_headers(
+            [
+                ("SET-COOKIE", "a=1"),
+                ("sEt-CoOkIe", "b=2;"),
+                ("Set-Cookie2", "c=3"),
+                ("Set-Cookies", "d=4"),
+                ("Content-Type", "text/html"),
+                ("set-cookie", " e = 5 ; PATH = / ; secure"),
+            ],
+            "https://example.com/a/b",
+        )
+
+        self.assertEqual(r.to_cookie_string("https://example.com/"), "e=5")
+        self.assertEqual(r.to_cookie_string("https://example.com/a/"), "a=1; b=2; e=5")
+        self.assertTrue(r["e"][0].secure)
+
+    def test_public_suffixes(self) -> None:
+        """Ensure cookies cannot be set for a public suffix, except host-only by the suffix itself."""
+        r = CookieStorage()
+        r.handle_headers(
+            [
+                ("Set-Cookie", "everyone=1; Domain=co.uk"),
+                ("Set-Cookie", "tld=2; Domain=uk"),
+                ("Set-Cookie", "site=3; Domain=example.co.uk"),
+            ],
+            "https://evil.example.co.uk/",
+        )
+        r.set_cookie("own=4; Domain=github.io", "https://github.io/")
+
+        self.assertEqual(r.to_cookie_string("https://other.co.uk/"), "")
+        self.assertEqual(r.to_cookie_string("https://www.example.co.uk/"), "site=3")
+        self.assertTrue(r["own"][0].host_only)
+        self.assertEqual(r.to_cookie_string("https://user.github.io/"), "")
+        self.assertEqual(r.to_cookie_string("https://github.io/"), "own=4")
+
+    def test_clock_read_once(self) -> None:
+        """Ensure a response's cookies are stored at one reading of the clock."""
+        reads = []
+
+        def clock() -> float:
+            reads.append(self.recorded_at)
+            return self.recorded_at
+
+        r = CookieStorage(clock=clock)
+        reads.clear()
+        r.handle_headers([("Set-Cookie", f"c{n}=1; Max-Age=60") for n in range(5)], "https://example.com/")
+        self.assertEqual(len(reads), 1)
+        self.assertEqual({cookie.expiry_time for cookie in r.cookies}, {self.recorded_at + 60})
+
+    def test_header_whitespace(self) -> None:
+        """Ensure whitespace around a Set-Cookie header name is ignored by both ways of reading headers."""
+        r = CookieStorage(clock=self.clock)
+        r.handle_headers([(" Set-Cookie ", "a=1"), ("set-cookie\t", "b=2")], "https://example.com/")
+        self.assertEqual(r.to_cookie_string("https://example.com/"), "a=1; b=2")
+
+        parsed = CookieStorage.from_headers([" Set-Cookie : a=1", "SET-COOKIE\t: b=2"], "https://example.com/")
+        self.assertEqual(parsed.to_cookie_string("https://example.com/"), "a=1; b=2")
@@ -0,0 +1,69 @@
+import unittest
+
+from _htmlparser import parse_html
+from css_selectors import compile_selector
+
+
+class SelectorTest(unittest.TestCase):
+    """Tests query_selector and query_selector_all on both document representations."""
+
+    page = (
+        "<html><body>"
+        '<div id=nav class="menu top"><ul><li><a href="/home" class=link>Home</a></li>'
+        '<li><a href="https://example.com/about" class="link ext" lang=en-GB>About</a></li></ul></div>'
+        '<div class=content><p class=intro>Hi <a href="/more" data-x="a b">more</a></p><p>Bye</p></div>'
+        "</body></html>"
+    )
+
+    def select(self, selector: str) -> dict[bool, list[str]]:
+        """Return the text of the matches in both representations."""
+        return {
+            compact: [el.text for el in parse_html(self.page, compact=compact).query_selector_all(selector)]
+            for compact in (False, True)
+        }
+
+    def assert_selects(self, selector: str, expected: list[str]) -> None:
+        """Ensure a selector matches the elements with the given texts, in document order, in both documents."""
+        self.assertEqual(self.select(selector), {False: expected, True: expected}, selector)
+
+    def test_compound(self) -> None:
+        """Ensure type, universal, id, class and attribute selectors combine within a compound."""
+        self.assert_selects("a", ["Home", "About", "more"])
+        self.assert_selects("A.link", ["Home", "About"])
+        self.assert_selects(".link.ext", ["About"])
+        self.assert_selects("#nav", [""])
+        self.assert_selects("div#nav.top", [""])
+        self.assert_selects("*[data-x]", ["more"])
+
+    def test_attribute_operators(self) -> None:
+        """Ensure every attribute operator compares values the way CSS does."""
+        self.assert_selects('a[href="/home"]', ["Home"])
+        self.assert_selects("a[href^='https:']", ["About"])
+        self.assert_selects("a[href$=more]", ["more"])
+        self.assert_selects("a[href*=ample]", ["About"])
+        self.assert_selects("a[data-x~=b]", ["more"])
+        self.assert_selects("a[lang|=en]", ["About"])
+        self.assert_selects("a[href^='']", [])
+
+    def test_combinators(self) -> None:
+        """Ensure descendant and child combinators and selector lists are matched right to left."""
+        self.assert_selects("div a", ["Home", "About", "more"])
+        self.assert_selects("div > p > a", ["more"])
+        self.assert_selects("div > a", [])
+        self.assert_selects(".menu li > a.ext", ["About"])
+        self.assert_selects("body > div p", ["Hi ", "Bye"])
+        self.assert_selects("p.intro, #nav a", ["Home", "About", "Hi "])
+
+    def test_query_selector(self) -> None:
+        """Ensure query_selector returns the first match in document order, or None."""
+        doc = parse_html(self.page)
+
+        self.assertEqual(doc.query_selector("div a").text, "Home")
+        self.assertIsNone(doc.query_selector("table"))
+
+    def test_compiled_once(self) -> None:
+        """Ensure compiled selectors are cached and unsupported selectors are rejected."""
+        self.assertIs(compile_selector("div > a.link"), compile_selector("div > a.link"))
+        for selector in ("", "a,", "> a", "a + b", "a:hover", "a.b#"):
+            with self.subTest(selector=selector), self.assertRaises(ValueError):  # noqa: PT027
+                compile_selector(selector)
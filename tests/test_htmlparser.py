@@ -0,0 +1,282 @@
+import sys
+import unittest
+
+from _htmlparser import Parser, parse_html, profile_html
+from htmlparser_types import CompactDocument, Document, Element, ElementView
+from treeconstructor import (
+    FORMATTING,
+    HIDDEN,
+    IMPLIED_END_TAG,
+    SPECIAL,
+    THOROUGHLY_IMPLIED_END_TAG,
+    VOID,
+    tag_categories,
+)
+
+
+def dump(node: Document | Element | CompactDocument | ElementView) -> list:
+    """Reduce a parsed tree to nested lists of name, attrs, text and children."""
+    children = [dump(child) for child in node.children]
+    if node.is_element:
+        return [node.name, node.attrs, node.text, children]
+    return children
+
+
+class HTMLParserTest(unittest.TestCase):
+    """Tests parse_html output."""
+
+    def test_nested_elements(self) -> None:
+        """Ensure tags, attributes and text end up on the right elements."""
+        doc = parse_html('<html><head><title>Hello</title></head><body><p class=intro id="x">Hi</p></body></html>')
+
+        paragraph = ["p", {"class": "intro", "id": "x"}, "Hi", []]
+        self.assertEqual(
+            dump(doc),
+            [["html", {}, "", [["head", {}, "", [["title", {}, "Hello", []]]], ["body", {}, "", [paragraph]]]]],
+        )
+        self.assertTrue(doc.children[0].children[0].dont_display)
+
+    def test_void_and_uppercase(self) -> None:
+        """Ensure void elements take no children and tag and attribute names are lowercased."""
+        doc = parse_html('<DIV CLASS="A"><IMG SRC=x.png ALT="pic"/><br><SPAN>x</SPAN></DIV>')
+
+        image = ["img", {"src": "x.png", "alt": "pic"}, "", []]
+        self.assertEqual(dump(doc), [["div", {"class": "A"}, "", [image, ["br", {}, "", []], ["span", {}, "x", []]]]])
+
+    def test_multiline_text(self) -> None:
+        """Ensure text spanning several lines is kept whole."""
+        doc = parse_html("<pre>one\ntwo\n\tthree</pre>")
+
+        self.assertEqual(dump(doc), [["pre", {}, "one\ntwo\n\tthree", []]])
+
+    def test_bogus_comment(self) -> None:
+        """Ensure an invalid end tag is swallowed as a bogus comment instead of stalling the tokenizer."""
+        doc = parse_html("<p>a</ x>b</p>")
+
+        self.assertEqual(dump(doc), [["p", {}, "ab", []]])
+
+    def test_text_runs(self) -> None:
+        """Ensure text split by child elements is joined per element when it closes."""
+        doc = parse_html("<div>one <b>two</b> three\nfour<br>five</div>")
+
+        self.assertEqual(dump(doc), [["div", {}, "one  three\nfourfive", [["b", {}, "two", []], ["br", {}, "", []]]]])
+
+    def test_reused_tokens(self) -> None:
+        """Ensure elements keep their own names and attributes although the tokenizer reuses token objects."""
+        doc = parse_html('<div data-x="1"><span data-x="2">a</span></div><div>b</div>')
+
+        span = ["span", {"data-x": "2"}, "a", []]
+        self.assertEqual(dump(doc), [["div", {"data-x": "1"}, "", [span]], ["div", {}, "b", []]])
+        self.assertIs(doc.children[1].name, sys.intern("div"))
+        self.assertIs(next(iter(doc.children[0].attrs)), sys.intern("data-x"))
+
+    def test_tag_categories(self) -> None:
+        """Ensure tags are classified into every category they belong to and unknown tags into none."""
+        self.assertEqual(tag_categories("br"), VOID | SPECIAL)
+        self.assertEqual(tag_categories("template"), HIDDEN | VOID | SPECIAL)
+        self.assertEqual(tag_categories("li"), IMPLIED_END_TAG | THOROUGHLY_IMPLIED_END_TAG | SPECIAL)
+        self.assertEqual(tag_categories("td"), THOROUGHLY_IMPLIED_END_TAG | SPECIAL)
+        self.assertEqual(tag_categories("b"), FORMATTING)
+        self.assertEqual(tag_categories("custom-element"), 0)
+
+    def test_stray_end_tags(self) -> None:
+        """Ensure end tags without a matching open element are ignored and unclosed elements keep their text."""
+        doc = parse_html("</p>text<div><span>a</div>b</i>")
+
+        self.assertEqual(dump(doc), [["div", {}, "", [["span", {}, "a", []]]]])
+
+
+class ParserTest(unittest.TestCase):
+    """Tests the incremental Parser."""
+
+    page = '<html><head><title>Hi</title></head>\n<body class="main"><p id=a>one\ntwo</p><br/>three</body></html>'
+
+    def test_chunk_boundaries(self) -> None:
+        """Ensure splitting the input anywhere, even inside tags and attributes, builds the same tree."""
+        expected = dump(parse_html(self.page))
+
+        for split in range(1, len(self.page)):
+            parser = Parser()
+            parser.feed(self.page[:split])
+            parser.feed(self.page[split:])
+            self.assertEqual(dump(parser.close()), expected, f"split at {split}")
+
+    def test_partial_document(self) -> None:
+        """Ensure the tree built so far, including text of still-open elements, is readable mid-parse."""
+        parser = Parser()
+        parser.feed("<html><body><p>Hello, wor")
+        paragraph = parser.document.children[0].children[0].children[0]
+        self.assertEqual(paragraph.text, "Hello, wor")
+
+        parser.feed("ld</p>")
+        self.assertEqual(paragraph.text, "Hello, world")
+
+    def test_unfinished_tag_at_end(self) -> None:
+        """Ensure closing the parser flushes a dangling '<' as text."""
+        parser = Parser()
+        parser.feed("<p>a <")
+        self.assertEqual(dump(parser.close()), [["p", {}, "a <", []]])
+
+    def test_independent_parsers(self) -> None:
+        """Ensure interleaved parsers build separate documents and repeated parses do not accumulate."""
+        first, second = Parser(), Parser()
+        first.feed("<div>one")
+        second.feed("<p>two")
+        first.feed("</div>")
+        second.feed("</p>")
+
+        self.assertEqual(dump(first.close()), [["div", {}, "one", []]])
+        self.assertEqual(dump(second.close()), [["p", {}, "two", []]])
+        self.assertEqual(dump(parse_html("<i>x</i>")), dump(parse_html("<i>x</i>")))
+
+    def test_profile(self) -> None:
+        """Ensure an instrumented parse builds the same tree and accounts for every character and token."""
+        page = self.page + "<p =x>"
+        document, report = profile_html(page)
+
+        self.assertEqual(dump(document), dump(parse_html(page)))
+        self.assertIsNone(Parser().report)
+        self.assertEqual(report.chars, len(page))
+        self.assertEqual(report.tokens_by_kind["start tag"], 7)
+        self.assertEqual(report.tokens_by_kind["end tag"], 5)
+        self.assertEqual(report.reconsumes_by_state["tag open"], 7)
+        self.assertEqual(report.errors_by_type, {"Unexpected equals sign before attribute name": 1})
+        self.assertGreater(report.tokenize_seconds, 0)
+        self.assertGreater(report.tree_build_seconds, 0)
+        self.assertIn("chars by state: ", report.format())
+
+    def test_profile_in_chunks(self) -> None:
+        """Ensure counts carry over between chunks."""
+        parser = Parser(compact=True, instrument=True)
+        for start in range(0, len(self.page), 7):
+            parser.feed(self.page[start : start + 7])
+        self.assertIsInstance(parser.close(), CompactDocument)
+
+        _, report = profile_html(self.page)
+        self.assertEqual(parser.report.chars_by_state, report.chars_by_state)
+        self.assertEqual(parser.report.tokens_by_kind["start tag"], report.tokens_by_kind["start tag"])
+
+
+class CompactDocumentTest(unittest.TestCase):
+    """Tests the compact form documents are sent between threads in."""
+
+    def test_round_trip(self) -> None:
+        """Ensure a document survives flattening and rebuilding, including parents and hidden elements."""
+        doc = parse_html(ParserTest.page)
+        rebuilt = Document.from_compact(doc.to_compact())
+
+        self.assertEqual(dump(rebuilt), dump(doc))
+        html = rebuilt.children[0]
+        self.assertIs(html.parent, rebuilt)
+        self.assertIs(html.children[0].parent, html)
+        self.assertTrue(html.children[0].dont_display)
+
+    def test_compact_parse(self) -> None:
+        """Ensure the array-backed document reads the same as the object tree, in one piece or in chunks."""
+        expected = dump(parse_html(ParserTest.page))
+        self.assertEqual(dump(parse_html(ParserTest.page, compact=True)), expected)
+
+        for split in range(1, len(ParserTest.page), 7):
+            parser = Parser(compact=True)
+            parser.feed(ParserTest.page[:split])
+            self.assertIsInstance(parser.document, CompactDocument)
+            parser.feed(ParserTest.page[split:])
+            self.assertEqual(dump(parser.close()), expected, f"split at {split}")
+
+    def test_compact_views(self) -> None:
+        """Ensure element views resolve parents and compare by node, and text can grow after later nodes."""
+        parser = Parser(compact=True)
+        parser.feed("<div id=a>one<p>two</p>")
+        div = parser.document.children[0]
+        parser.feed("three</div><br>")
+        document = parser.close()
+
+        self.assertEqual(div.text, "onethree")
+        self.assertEqual(div.children[0].parent, div)
+        self.assertIs(div.parent, document)
+        self.assertEqual(document.children[1].name, "br")
+        self.assertEqual(len(document), 3)
+
+    def test_compact_round_trip(self) -> None:
+        """Ensure a CompactDocument can be built from and exported to the wire format."""
+        doc = parse_html('<a href="/x" class=y>link</a><p hidden>text<b>bold</b></p>')
+        document = CompactDocument.from_compact(doc.to_compact())
+
+        self.assertEqual(dump(document), dump(doc))
+        self.assertEqual(dump(Document.from_compact(document.to_compact())), dump(doc))
+
+
+class DocumentIndexTest(unittest.TestCase):
+    """Tests the id, tag and class lookups built while parsing."""
+
+    page = (
+        "<html><head><title>\n  Index   test </title></head><body>"
+        '<div id=main class="box wide"><p class=box>one</p><p class="wide box">two</p></div>'
+        '<p id=main class="wide">three</p></body></html>'
+    )
+
+    def test_lookups(self) -> None:
+        """Ensure both document representations answer lookups in document order."""
+        for compact in (False, True):
+            with self.subTest(compact=compact):
+                doc = parse_html(self.page, compact=compact)
+
+                self.assertEqual(doc.title, "Index test")
+                self.assertEqual(doc.get_element_by_id("main").name, "div")
+                self.assertIsNone(doc.get_element_by_id("missing"))
+                self.assertEqual([p.text for p in doc.get_elements_by_tag_name("P")], ["one", "two", "three"])
+                self.assertEqual([el.text for el in doc.get_elements_by_class_name("wide box")], ["", "two"])
+                self.assertEqual(len(doc.get_elements_by_class_name("box")), 3)
+                self.assertEqual(doc.get_elements_by_class_name("box missing"), [])
+
+    def test_lookups_after_changes(self) -> None:
+        """Ensure the indexes follow elements that are added to or removed from the tree."""
+        doc = parse_html(self.page)
+        main = doc.get_element_by_id("main")
+        body = main.parent
+
+        extra = Element(
+            name="span",
+            attrs={"id": "extra", "class": "box"},
+            text="new",
+            children=[],
+            parent=body,
+            dont_display=False,
+        )
+        doc.append_child(main, extra)
+        self.assertIs(doc.get_element_by_id("extra"), extra)
+        self.assertIn(extra, main.children)
+        self.assertEqual(len(doc.get_elements_by_class_name("box")), 4)
+
+        doc.remove_child(main)
+        self.assertEqual([el.text for el in body.children], ["three"])
+        self.assertEqual(doc.get_element_by_id("main").text, "three")
+        self.assertIsNone(doc.get_element_by_id("extra"))
+        self.assertEqual(doc.get_elements_by_class_name("box"), [])
+        self.assertEqual([p.text for p in doc.get_elements_by_tag_name("p")], ["three"])
+
+    def test_lookups_in_document_order(self) -> None:
+        """Ensure elements appended before later ones are listed in document order, not insertion order."""
+        doc = parse_html(self.page)
+        main = doc.get_element_by_id("main")
+        early = Element(name="p", attrs={"id": "main"}, text="early", children=[], parent=main, dont_display=False)
+        doc.append_child(main, early)
+
+        self.assertEqual(doc.get_element_by_id("main").name, "div")
+        self.assertEqual([el.text for el in doc.elements_with_id("main")], ["", "early", "three"])
+        self.assertEqual([p.text for p in doc.get_elements_by_tag_name("p")], ["one", "two", "early", "three"])
+        self.assertEqual([p.text for p in doc.query_selector_all("body p")], ["one", "two", "early", "three"])
+
+        body = main.parent
+        last = Element(name="p", attrs={}, text="last", children=[], parent=body, dont_display=False)
+        doc.append_child(body, last)
+        self.assertEqual([p.text for p in doc.get_elements_by_tag_name("p")][-2:], ["three", "last"])
+
+    def test_remove_missing_child(self) -> None:
+        """Ensure removing an element twice raises ValueError and the element is detached the first time."""
+        doc = parse_html(self.page)
+        main = doc.get_element_by_id("main")
+        doc.remove_child(main)
+        self.assertIsNone(main.parent)
+        with self.assertRaises(ValueError):  # noqa: PT027
+            doc.remove_child(main)
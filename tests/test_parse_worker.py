@@ -0,0 +1,47 @@
+import asyncio
+import json
+import unittest
+
+from _htmlparser import parse_html
+from htmlparser_types import Document
+
+from tests.test_htmlparser import ParserTest, dump
+from worker_harness import WorkerHarness
+
+
+class ParseWorkerTest(unittest.IsolatedAsyncioTestCase):
+    """Tests the parser worker through the harness that stands in for PyScript."""
+
+    async def asyncSetUp(self) -> None:
+        """Start a worker process."""
+        self.worker = WorkerHarness("parse_worker")
+        self.addCleanup(self.worker.shutdown)
+
+    async def test_feed_and_close(self) -> None:
+        """Ensure pages fed in chunks, even interleaved, come back as the same tree the main thread builds."""
+        page = ParserTest.page
+        await asyncio.gather(self.worker.begin(1), self.worker.begin(2))
+        for start in range(0, len(page), 16):
+            await self.worker.feed(1, page[start : start + 16])
+            await self.worker.feed(2, "<p>two")
+
+        first = Document.from_compact(json.loads(await self.worker.close(1)))
+        second = Document.from_compact(json.loads(await self.worker.close(2)))
+        self.assertEqual(dump(first), dump(parse_html(page)))
+        self.assertEqual(dump(second), dump(parse_html("<p>two" * (len(page) // 16 + 1))))
+
+    async def test_discard(self) -> None:
+        """Ensure the parser of a page whose load failed is dropped, and discarding an unknown page is harmless."""
+        await self.worker.begin(1)
+        await self.worker.feed(1, "<p>cut short")
+        await self.worker.discard(1)
+        await self.worker.discard(2)
+
+        with self.assertRaises(KeyError):  # noqa: PT027
+            await self.worker.close(1)
+
+    async def test_parse(self) -> None:
+        """Ensure whole pages can be parsed in one call."""
+        compact = json.loads(await self.worker.parse("<div id=a>x</div>"))
+
+        self.assertEqual(dump(Document.from_compact(compact)), [["div", {"id": "a"}, "x", []]])
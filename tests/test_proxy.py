@@ -0,0 +1,448 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import httpx
+from _htmlparser import parse_html
+from aiohttp import web
+from htmlparser_types import Document
+
+import main
+from proxy_cache import CachedPage, ResponseCache
+
+
+class ResponseCacheTest(unittest.TestCase):
+    """Tests ResponseCache eviction."""
+
+    @staticmethod
+    def page(body: bytes) -> CachedPage:
+        """Build a fresh cached page with the given body."""
+        return CachedPage(status=200, headers=[], final_url="", encoding=None, body=body, fresh_until=float("inf"))
+
+    def test_evict_by_count(self) -> None:
+        """Ensure the least recently used entry is evicted once the entry limit is hit."""
+        cache = ResponseCache(max_entries=2, max_bytes=1000, max_entry_bytes=1000)
+        cache.store(cache.key("a", {}), self.page(b"a"))
+        cache.store(cache.key("b", {}), self.page(b"b"))
+        cache.lookup(cache.key("a", {}))
+        cache.store(cache.key("c", {}), self.page(b"c"))
+
+        self.assertEqual([key[0] for key in cache.entries], ["a", "c"])
+        self.assertEqual(cache.stats.evictions, 1)
+
+    def test_evict_by_bytes(self) -> None:
+        """Ensure entries are evicted until the byte limit holds and oversized bodies are never stored."""
+        cache = ResponseCache(max_entries=10, max_bytes=10, max_entry_bytes=8)
+        cache.store(cache.key("a", {}), self.page(b"a" * 6))
+        cache.store(cache.key("b", {}), self.page(b"b" * 6))
+        cache.store(cache.key("c", {}), self.page(b"c" * 9))
+
+        self.assertEqual([key[0] for key in cache.entries], ["b"])
+        self.assertEqual(cache.total_bytes, 6)
+
+    def test_set_cookie_not_stored(self) -> None:
+        """Ensure Set-Cookie reaches the client that fetched a page but is not stored for later hits."""
+        cache = ResponseCache(max_entries=10, max_bytes=1000, max_entry_bytes=1000)
+        page = self.page(b"a")
+        page.headers = [("Set-Cookie", "id=1"), ("Content-Type", "text/html")]
+        cache.store(cache.key("a", {}), page)
+        fresh, _ = cache.lookup(cache.key("a", {}))
+
+        self.assertEqual(fresh.headers, [("Content-Type", "text/html")])
+        self.assertEqual(page.headers[0], ("Set-Cookie", "id=1"))
+        self.assertEqual(cache.total_bytes, fresh.size)
+
+    def test_not_modified_merges_headers(self) -> None:
+        """Ensure a 304 updates the stored headers it carries and keeps the stored Cache-Control."""
+        cache = ResponseCache(max_entries=10, max_bytes=1000, max_entry_bytes=1000)
+        page = self.page(b"a")
+        page.headers = [("Cache-Control", "max-age=60"), ("Age", "60"), ("ETag", '"v1"'), ("Date", "old")]
+        page.etag = '"v1"'
+        cache.store(cache.key("a", {}), page)
+        _, stale = cache.lookup(cache.key("a", {}), now=float("inf"))
+        cache.revalidated(cache.key("a", {}), stale, {"ETag": '"v1"', "Date": "new", "Content-Length": "0"})
+        fresh, _ = cache.lookup(cache.key("a", {}))
+
+        self.assertEqual(fresh.headers, [("Cache-Control", "max-age=60"), ("ETag", '"v1"'), ("Date", "new")])
+        self.assertEqual(cache.total_bytes, fresh.size)
+
+
+class CachedFileTest(unittest.TestCase):
+    """Tests the in-memory copy of the app shell."""
+
+    def test_refresh_on_mtime_change(self) -> None:
+        """Ensure the cached copy and its ETag change only when the file's mtime does."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "index.html"
+            path.write_text("<p>one</p>")
+            cached = main.CachedFile(path).refresh()
+            etag = cached.etag
+
+            path.write_text("<p>two</p>")
+            os.utime(path, ns=(cached.mtime_ns, cached.mtime_ns))
+            self.assertEqual(cached.refresh().body, b"<p>one</p>")
+
+            os.utime(path, ns=(cached.mtime_ns + 10**9, cached.mtime_ns + 10**9))
+            self.assertEqual(cached.refresh().body, b"<p>two</p>")
+            self.assertNotEqual(cached.etag, etag)
+
+
+class SettingsTest(unittest.IsolatedAsyncioTestCase):
+    """Tests reading the proxy settings."""
+
+    async def test_read_on_startup(self) -> None:
+        """Ensure environment overrides set after main was imported still apply when the app starts."""
+        with mock.patch.dict(os.environ, {"PYBROWSER_CACHE_MAX_ENTRIES": "3"}):
+            async with main.lifespan(main.app):
+                self.assertEqual(main.app.state.settings.cache_max_entries, 3)
+                self.assertEqual(main.app.state.response_cache.max_entries, 3)
+
+
+class PageStreamTest(unittest.IsolatedAsyncioTestCase):
+    """Tests fanning a streamed page out to its followers."""
+
+    async def test_drop_sent_chunks(self) -> None:
+        """Ensure a page that is not kept only holds the chunks some follower has yet to send."""
+        stream = main.PageStream()
+        first, second = stream.join(), stream.join()
+        stream.page.set_result(ResponseCacheTest.page(b""))
+        stream.stop_keeping()
+        for chunk in (b"a", b"b", b"c"):
+            stream.add(chunk)
+        stream.close()
+
+        ahead = stream.body(first)
+        self.assertEqual([await anext(ahead), await anext(ahead)], [b"a", b"b"])
+        self.assertEqual(stream.chunks, [b"a", b"b", b"c"])
+        self.assertEqual([chunk async for chunk in stream.body(second)], [b"a", b"b", b"c"])
+        # The chunk the first follower is suspended on is still being sent
+        self.assertEqual(stream.chunks, [b"b", b"c"])
+        self.assertEqual([chunk async for chunk in ahead], [b"c"])
+        self.assertEqual(stream.chunks, [])
+
+
+class ProxyTest(unittest.IsolatedAsyncioTestCase):
+    """Tests the /webpage/ proxy against a local stand-in server."""
+
+    async def asyncSetUp(self) -> None:
+        """Start the stand-in upstream server and the proxy app."""
+        self.upstream_hits: list[web.Request] = []
+
+        async def page(request: web.Request) -> web.Response:
+            self.upstream_hits.append(request)
+            return web.Response(text="<html><title>stand-in</title></html>", content_type="text/html")
+
+        async def cached(request: web.Request) -> web.Response:
+            self.upstream_hits.append(request)
+            return web.Response(text="cached", headers={"Cache-Control": "max-age=60"})
+
+        async def etag(request: web.Request) -> web.Response:
+            self.upstream_hits.append(request)
+            if request.headers.get("If-None-Match") == '"v1"':
+                return web.Response(status=304, headers={"ETag": '"v1"', "Cache-Control": "no-cache"})
+            return web.Response(text="validated", headers={"ETag": '"v1"', "Cache-Control": "no-cache"})
+
+        async def slow(request: web.Request) -> web.Response:
+            self.upstream_hits.append(request)
+            await asyncio.sleep(0.1)
+            return web.Response(text="slow")
+
+        async def large(request: web.Request) -> web.Response:
+            self.upstream_hits.append(request)
+            return web.Response(text="<p>large</p>" * 8192, content_type="text/html")
+
+        async def raw(request: web.Request) -> web.Response:
+            self.upstream_hits.append(request)
+            return web.Response(body="<p>caf\u00e9</p>".encode(), content_type="text/html")
+
+        async def login(request: web.Request) -> web.Response:
+            self.upstream_hits.append(request)
+            resp = web.Response(status=302, headers={"Location": "/whoami"})
+            resp.headers.add("Set-Cookie", "token=secret; Path=/; HttpOnly")
+            resp.headers.add("Set-Cookie", "theme=dark; Path=/")
+            return resp
+
+        async def whoami(request: web.Request) -> web.Response:
+            self.upstream_hits.append(request)
+            return web.Response(text=request.headers.get("Cookie", ""), headers={"Set-Cookie": "seen=1"})
+
+        upstream = web.Application()
+        upstream.router.add_get("/login", login)
+        upstream.router.add_get("/whoami", whoami)
+        upstream.router.add_get("/large", large)
+        upstream.router.add_get("/raw", raw)
+        upstream.router.add_get("/slow", slow)
+        upstream.router.add_get("/page", page)
+        upstream.router.add_get("/cached", cached)
+        upstream.router.add_get("/etag", etag)
+        self.runner = web.AppRunner(upstream)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]  # noqa: SLF001
+        self.origin = f"http://127.0.0.1:{port}"
+        self.target = f"{self.origin}/page"
+
+        self.lifespan = main.lifespan(main.app)
+        await self.lifespan.__aenter__()
+        self.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://testserver")
+
+    async def asyncTearDown(self) -> None:
+        """Shut down the proxy app and the stand-in server."""
+        await self.client.aclose()
+        await self.lifespan.__aexit__(None, None, None)
+        await self.runner.cleanup()
+
+    async def fetch(self, headers: dict[str, str] | None = None, path: str = "/page") -> httpx.Response:
+        """Ask the proxy for a stand-in page."""
+        return await self.client.post("/webpage/", json={"target": self.origin + path, "headers": headers or {}})
+
+    async def test_connection_reuse(self) -> None:
+        """Ensure consecutive requests share one pooled upstream connection."""
+        first = await self.fetch()
+        second = await self.fetch()
+
+        self.assertEqual(first.json()["content"], "<html><title>stand-in</title></html>")
+        self.assertEqual(second.json()["final_url"], self.target)
+        peers = {hit.transport.get_extra_info("peername") for hit in self.upstream_hits}
+        self.assertEqual(len(self.upstream_hits), 2)
+        self.assertEqual(len(peers), 1)
+
+    async def test_per_request_headers(self) -> None:
+        """Ensure payload headers are sent on their own request only."""
+        await self.fetch({"X-Test": "one"})
+        await self.fetch()
+
+        self.assertEqual(self.upstream_hits[0].headers.get("X-Test"), "one")
+        self.assertIsNone(self.upstream_hits[1].headers.get("X-Test"))
+
+    async def test_stream(self) -> None:
+        """Ensure the streaming endpoint sends metadata first and then the raw body."""
+        resp = await self.client.post("/webpage/stream", json={"target": self.target, "headers": {}})
+        meta, body = resp.content.split(b"\n", 1)
+        meta = json.loads(meta)
+
+        self.assertEqual(meta["status"], 200)
+        self.assertEqual(meta["final_url"], self.target)
+        self.assertEqual(meta["encoding"], "utf-8")
+        self.assertIn(["Content-Type", "text/html; charset=utf-8"], meta["headers"])
+        self.assertEqual(body, b"<html><title>stand-in</title></html>")
+
+    async def test_stream_encoding(self) -> None:
+        """Ensure a page without a declared charset gets the same encoding whether streamed or buffered."""
+        streamed = await self.client.post("/webpage/stream", json={"target": self.origin + "/raw", "headers": {}})
+        buffered = await self.fetch(path="/raw")
+        meta = json.loads(streamed.content.split(b"\n", 1)[0])
+
+        self.assertEqual(meta["encoding"], "utf-8")
+        self.assertEqual(buffered.json()["content"], "<p>caf\u00e9</p>")
+
+    async def test_server_side_parse(self) -> None:
+        """Ensure parse mode returns the page's tree in compact form in place of its content, only when asked for."""
+        plain = await self.fetch()
+        parsed = await self.client.post("/webpage/", json={"target": self.target, "headers": {}, "parse": True})
+        document = Document.from_compact(parsed.json()["document"])
+
+        self.assertNotIn("document", plain.json())
+        self.assertNotIn("content", parsed.json())
+        self.assertEqual(parsed.json()["final_url"], plain.json()["final_url"])
+        self.assertEqual(document.to_compact(), parse_html(plain.json()["content"]).to_compact())
+
+    async def test_cache_fresh_hit(self) -> None:
+        """Ensure fresh responses are served from the cache by both endpoints."""
+        first = await self.fetch(path="/cached")
+        second = await self.fetch(path="/cached")
+        streamed = await self.client.post("/webpage/stream", json={"target": self.origin + "/cached", "headers": {}})
+        stats = (await self.client.get("/webpage/cache/stats")).json()
+
+        self.assertEqual(first.json()["content"], "cached")
+        self.assertEqual(second.json()["content"], "cached")
+        self.assertEqual(streamed.content.split(b"\n", 1)[1], b"cached")
+        self.assertEqual(len(self.upstream_hits), 1)
+        self.assertEqual(stats["hits"], 2)
+        self.assertEqual(stats["misses"], 1)
+
+    async def test_cache_key_headers(self) -> None:
+        """Ensure requests with different headers do not share a cache entry."""
+        await self.fetch({"Cookie": "a=1"}, path="/cached")
+        await self.fetch({"Cookie": "a=2"}, path="/cached")
+
+        self.assertEqual(len(self.upstream_hits), 2)
+
+    async def test_cache_revalidation(self) -> None:
+        """Ensure stale entries are revalidated with their ETag and reused on 304."""
+        await self.fetch(path="/etag")
+        second = await self.fetch(path="/etag")
+        stats = (await self.client.get("/webpage/cache/stats")).json()
+
+        self.assertEqual(second.json()["content"], "validated")
+        self.assertEqual(self.upstream_hits[1].headers["If-None-Match"], '"v1"')
+        self.assertEqual(stats["revalidations"], 1)
+        self.assertEqual(stats["not_modified"], 1)
+
+    async def test_uncacheable_not_stored(self) -> None:
+        """Ensure responses without freshness or validators always go upstream."""
+        await self.fetch()
+        await self.fetch()
+        stats = (await self.client.get("/webpage/cache/stats")).json()
+
+        self.assertEqual(len(self.upstream_hits), 2)
+        self.assertEqual(stats["entries"], 0)
+
+    async def test_coalescing(self) -> None:
+        """Ensure concurrent requests for the same page share a single upstream fetch."""
+        responses = await asyncio.gather(*(self.fetch(path="/slow") for _ in range(10)))
+        stats = (await self.client.get("/webpage/cache/stats")).json()
+
+        self.assertEqual([resp.json()["content"] for resp in responses], ["slow"] * 10)
+        self.assertEqual(len(self.upstream_hits), 1)
+        self.assertEqual(stats["coalesced"], 9)
+        self.assertEqual(main.app.state.inflight, {})
+
+    async def test_stream_coalescing(self) -> None:
+        """Ensure concurrent stream and buffered requests for the same page share one streamed upstream fetch."""
+        payload = {"target": self.origin + "/slow", "headers": {}}
+        streamed = [self.client.post("/webpage/stream", json=payload) for _ in range(5)]
+        responses = await asyncio.gather(*streamed, self.fetch(path="/slow"))
+        stats = (await self.client.get("/webpage/cache/stats")).json()
+
+        self.assertEqual([resp.content.split(b"\n", 1)[1] for resp in responses[:-1]], [b"slow"] * 5)
+        self.assertEqual(responses[-1].json()["content"], "slow")
+        self.assertEqual(len(self.upstream_hits), 1)
+        self.assertEqual(stats["coalesced"], 5)
+        self.assertEqual(main.app.state.streams, {})
+
+    async def test_stream_over_entry_limit(self) -> None:
+        """Ensure a streamed page over the cache's entry limit is sent whole but neither kept nor joinable."""
+        main.app.state.response_cache.max_entry_bytes = 4
+        payload = {"target": self.origin + "/cached", "headers": {}}
+        first = await self.client.post("/webpage/stream", json=payload)
+        second = await self.client.post("/webpage/stream", json=payload)
+        stats = (await self.client.get("/webpage/cache/stats")).json()
+
+        self.assertEqual([resp.content.split(b"\n", 1)[1] for resp in (first, second)], [b"cached"] * 2)
+        self.assertEqual(len(self.upstream_hits), 2)
+        self.assertEqual(stats["entries"], 0)
+        self.assertEqual(main.app.state.streams, {})
+
+    async def test_gzip_transport(self) -> None:
+        """Ensure large pages are gzipped on the way to the front end when it accepts gzip."""
+        payload = {"target": self.origin + "/large", "headers": {}}
+        gzip_headers = {"Accept-Encoding": "gzip"}
+        async with self.client.stream("POST", "/webpage/stream", json=payload, headers=gzip_headers) as compressed:
+            wire_size = sum([len(chunk) async for chunk in compressed.aiter_raw()])
+        identity = await self.client.post("/webpage/stream", json=payload, headers={"Accept-Encoding": "identity"})
+
+        self.assertEqual(compressed.headers["Content-Encoding"], "gzip")
+        self.assertNotIn("Content-Encoding", identity.headers)
+        self.assertLess(wire_size, len(identity.content) // 10)
+
+    async def test_batch_prefetch(self) -> None:
+        """Ensure prefetched pages answer the next request for them once, without going upstream."""
+        targets = [self.origin + "/page", self.origin + "/slow", self.origin + "/missing"]
+        batch = await self.client.post("/webpage/batch", json={"targets": targets, "headers": {}})
+        followed = await self.fetch()
+        refetched = await self.fetch()
+        stats = (await self.client.get("/webpage/cache/stats")).json()
+
+        self.assertEqual(batch.json()["results"], dict(zip(targets, [200, 200, 404], strict=True)))
+        self.assertEqual(followed.json()["content"], refetched.json()["content"])
+        self.assertEqual(len(self.upstream_hits), 3)
+        self.assertEqual(stats["prefetch_hits"], 1)
+
+    async def test_prefetch_again(self) -> None:
+        """Ensure prefetching a page again replaces the held copy without counting either as used."""
+        batch = {"targets": [self.target], "headers": {}}
+        await self.client.post("/webpage/batch", json=batch)
+        await self.client.post("/webpage/batch", json=batch)
+        before = (await self.client.get("/webpage/cache/stats")).json()
+        await self.fetch()
+        await self.fetch()
+        after = (await self.client.get("/webpage/cache/stats")).json()
+
+        self.assertEqual((before["prefetched"], before["prefetch_hits"]), (2, 0))
+        self.assertEqual(after["prefetch_hits"], 1)
+        self.assertEqual(len(self.upstream_hits), 3)
+
+    async def test_cookie_sessions(self) -> None:
+        """Ensure a session's cookies are kept by the proxy, sent on redirects and never reach another session."""
+        session = (await self.client.post("/session")).json()["session"]
+        other = (await self.client.post("/session")).json()["session"]
+        whoami = {"target": self.origin + "/whoami", "headers": {}}
+        login = {"target": self.origin + "/login", "headers": {}, "session": session}
+        logged_in = (await self.client.post("/webpage/", json=login)).json()
+        streamed = await self.client.post("/webpage/stream", json=whoami | {"session": session})
+        meta, body = streamed.content.split(b"\n", 1)
+        elsewhere = await self.client.post("/webpage/", json=whoami | {"session": other})
+        anonymous = await self.fetch(path="/whoami")
+        visible = await self.client.get(f"/session/{session}/cookies", params={"url": self.origin + "/"})
+
+        self.assertEqual(sorted(logged_in["content"].split("; ")), ["theme=dark", "token=secret"])
+        self.assertNotIn("set-cookie", [name.lower() for name, _ in logged_in["headers"]])
+        self.assertNotIn("set-cookie", [name.lower() for name, _ in json.loads(meta)["headers"]])
+        self.assertEqual(sorted(body.decode().split("; ")), ["seen=1", "theme=dark", "token=secret"])
+        self.assertEqual(elsewhere.json()["content"], "")
+        self.assertEqual(anonymous.json()["content"], "")
+        self.assertIn(["Set-Cookie", "seen=1"], anonymous.json()["headers"])
+        self.assertEqual(sorted(visible.json()["cookies"].split("; ")), ["seen=1", "theme=dark"])
+
+    async def test_no_shared_cookies(self) -> None:
+        """Ensure cookies set upstream for a request without a session are kept nowhere, so no client gets them."""
+        redirected = await self.client.post("/webpage/", json={"target": self.origin + "/login", "headers": {}})
+        later = await self.client.post("/webpage/", json={"target": self.origin + "/whoami", "headers": {}})
+
+        self.assertEqual(redirected.json()["content"], "")
+        self.assertEqual(later.json()["content"], "")
+        self.assertEqual(main.app.state.cookie_jar.jars, {})
+
+    async def test_unknown_session(self) -> None:
+        """Ensure ids the proxy did not issue are refused instead of getting a jar of their own."""
+        request = {"target": self.origin + "/whoami", "headers": {}, "session": "made-up"}
+        responses = [
+            await self.client.post("/webpage/", json=request),
+            await self.client.post("/webpage/stream", json=request),
+            await self.client.post(
+                "/webpage/batch",
+                json={"targets": [request["target"]], "headers": {}, "session": "made-up"},
+            ),
+            await self.client.get("/session/made-up/cookies", params={"url": self.origin + "/"}),
+        ]
+
+        self.assertEqual([response.status_code for response in responses], [404] * 4)
+        self.assertNotIn("made-up", main.app.state.cookie_jar.jars)
+
+    async def test_index_validators(self) -> None:
+        """Ensure the app shell is served with validators and a matching If-None-Match gets a 304."""
+        first = await self.client.get("/")
+        etag = first.headers["ETag"]
+        revalidated = await self.client.get("/", headers={"If-None-Match": etag})
+        mismatched = await self.client.get("/", headers={"If-None-Match": '"other"'})
+
+        self.assertEqual(first.status_code, 200)
+        self.assertIn(b"<title>pyBrowser</title>", first.content)
+        self.assertIn("Last-Modified", first.headers)
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(revalidated.content, b"")
+        self.assertEqual(mismatched.status_code, 200)
+
+    async def test_index_conditional_requests(self) -> None:
+        """Ensure weak and listed entity tags match, and If-Modified-Since is compared as a date."""
+        first = await self.client.get("/")
+        etag, last_modified = first.headers["ETag"], first.headers["Last-Modified"]
+        cases: dict[str, tuple[dict[str, str], int]] = {
+            "weak": ({"If-None-Match": f"W/{etag}"}, 304),
+            "list": ({"If-None-Match": f'"other", {etag}'}, 304),
+            "any": ({"If-None-Match": "*"}, 304),
+            "same date": ({"If-Modified-Since": last_modified}, 304),
+            "later date": ({"If-Modified-Since": "Fri, 01 Jan 2100 00:00:00 GMT"}, 304),
+            "earlier date": ({"If-Modified-Since": "Thu, 01 Jan 1970 00:00:00 GMT"}, 200),
+            "invalid date": ({"If-Modified-Since": "yesterday"}, 200),
+            "tag wins": ({"If-None-Match": '"other"', "If-Modified-Since": last_modified}, 200),
+        }
+        for name, (headers, status) in cases.items():
+            with self.subTest(name):
+                self.assertEqual((await self.client.get("/", headers=headers)).status_code, status)
@@ -0,0 +1,43 @@
+# Runs the PyScript worker modules in static/python in a process of their own, for tests.
+import asyncio
+from collections.abc import Awaitable, Callable
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Self
+
+from client_modules import CLIENT_PATH, call_export, load_worker
+
+
+class WorkerHarness:
+    """A worker module running in its own process, the way PyScript runs it in a web worker.
+
+    Exported functions are reached as awaitable attributes, like on the proxy that ``pyscript.workers`` hands
+    out, so code written against the worker can be exercised headlessly. Calls are run one at a time in a
+    single process, so module state carries over between calls just as it does in the browser.
+    """
+
+    def __init__(self, module: str, path: Path = CLIENT_PATH) -> None:
+        self.executor: ProcessPoolExecutor = ProcessPoolExecutor(
+            max_workers=1,
+            initializer=load_worker,
+            initargs=(module, str(path)),
+        )
+
+    def __getattr__(self, name: str) -> Callable[..., Awaitable[Any]]:
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        async def call(*args: Any) -> Any:  # noqa: ANN401
+            return await asyncio.get_running_loop().run_in_executor(self.executor, call_export, name, *args)
+
+        return call
+
+    def shutdown(self) -> None:
+        """Stop the worker process."""
+        self.executor.shutdown(cancel_futures=True)
+
+    async def __aenter__(self) -> Self:
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        self.shutdown()